@@ -1,6 +1,8 @@
 # app.py
 import os
-import threading
+import sys
+import atexit
+import signal
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 
@@ -8,12 +10,39 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import handler after env loaded
-from handler import handle_build_request
+from handler import handle_build_request, job_store, resume_unfinished_jobs
+from core.job_store import STATE_DONE, job_key
+from core.worker_pool import PoolClosed, PoolSaturated, WorkerPool
 
 app = Flask(__name__)
 
 REQUIRED_FIELDS = ("email", "secret", "task", "round", "nonce", "brief", "evaluation_url")
 
+# Bounded intake: at most WORKER_POOL_SIZE builds run at once, WORKER_QUEUE_SIZE more may wait
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "2"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "10"))
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "300"))
+CLOSING_RETRY_AFTER = 30
+
+build_pool = WorkerPool(WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, name="build")
+
+
+def drain_pool(*_):
+    """Stop intake and let accepted builds finish (so no push is cut off mid-way)."""
+    build_pool.shutdown(timeout=SHUTDOWN_DRAIN_SECONDS)
+
+
+def handle_sigterm(signum, frame):
+    drain_pool()
+    sys.exit(0)
+
+
+atexit.register(drain_pool)
+signal.signal(signal.SIGTERM, handle_sigterm)
+
+# Jobs cut off by a restart continue from their last completed step
+resume_unfinished_jobs(build_pool.submit)
+
 @app.route('/api-endpoint', methods=['GET', 'POST'])
 def api_endpoint():
     # --- GET request (status check) ---
@@ -22,7 +51,8 @@ def api_endpoint():
             "status": "ok",
             "message": "LLM Code Deployment API is live and ready.",
             "endpoint": "/api-endpoint",
-            "usage": "Send a POST request with JSON payload containing: email, secret, task, round, nonce, brief, evaluation_url"
+            "usage": "Send a POST request with JSON payload containing: email, secret, task, round, nonce, brief, evaluation_url",
+            "queue": build_pool.stats(),
         }), 200
 
 
@@ -49,17 +79,28 @@ def api_endpoint():
         app.logger.warning("Invalid secret attempt for task: %s", data.get('task'))
         return jsonify({"error": "Invalid secret."}), 403
 
-    # Start background processing (daemon so it won't block shutdown)
+    # Retried POSTs attach to the existing (task, round, nonce) job instead of starting a new build
+    job, should_run = job_store.submit(data)
+    if not should_run:
+        if job["state"] == STATE_DONE:
+            return jsonify({"message": "Request already processed.", "result": job["result"]}), 200
+        return jsonify({"message": "Request is already being processed.", "state": job["state"]}), 200
+
+    # Queue for the bounded worker pool; when saturated, tell the caller when to come back
     try:
-        thread = threading.Thread(target=handle_build_request, args=(data,))
-        thread.daemon = True
-        thread.start()
-
-        app.logger.info("Task processing started in background for: %s", data.get('task'))
-        return jsonify({"message": "Request received and is being processed."}), 200
-    except Exception as e:
-        app.logger.exception("Error starting background thread")
-        return jsonify({"error": "Failed to start processing."}), 500
+        build_pool.submit(handle_build_request, data)
+    except PoolSaturated as e:
+        job_store.fail(job_key(data), "Build queue full")
+        app.logger.warning("Build queue full, rejecting task: %s", data.get('task'))
+        response = jsonify({"error": "Too many requests in progress.", "queue": build_pool.stats()})
+        return response, 429, {"Retry-After": str(e.retry_after)}
+    except PoolClosed:
+        job_store.fail(job_key(data), "Server shutting down")
+        response = jsonify({"error": "Server is shutting down."})
+        return response, 503, {"Retry-After": str(CLOSING_RETRY_AFTER)}
+
+    app.logger.info("Task queued for: %s", data.get('task'))
+    return jsonify({"message": "Request received and is being processed.", "queue": build_pool.stats()}), 200
 
 
 if __name__ == '__main__':
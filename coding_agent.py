@@ -4,11 +4,10 @@
 Запуск: python coding_agent.py --issue 1 --repo ваш_логин/репозиторий
 """
 import argparse
+import asyncio
 import sys
 import os
 import time
-import json
-from datetime import datetime
 
 # ==================== 1. ЗАГРУЗКА И ПРОВЕРКА ТОКЕНОВ ====================
 # Поддержка всех вариантов имен переменных
@@ -42,11 +41,20 @@ try:
         create_branch,
         apply_code_changes,
         create_pull_request,
-        get_latest_ai_review_verdict,
+        get_file_content,
         get_repo_files,
+        get_session,
         test_github_connection
     )
-    from core.llm_service import analyze_issue_with_llm, generate_code_changes
+    from core.llm_service import analyze_issue_with_llm, generate_code_changes, generate_full_file
+    from core.edits import EditConflict, apply_search_replace
+    from core.review_events import REVIEW_WAIT_DEADLINE, start_review_receiver, wait_for_review_verdict
+    from core.async_pipeline import analyze_and_generate, fetch_issue_and_files
+    from core.changeset import BlobUploader
+    from core.llm_cache import get_llm_cache
+    from core.llm_client import get_llm_client
+    from core.repo_index import get_repo_index
+    from core.local_repo import get_local_repo
     print("✅ Модули загружены")
 except ImportError as e:
     print(f"❌ Ошибка импорта: {e}")
@@ -56,8 +64,44 @@ except ImportError as e:
     sys.exit(1)
 
 # ==================== 3. ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
-def prepare_files_from_llm_response(llm_response, attempt_number):
-    """Подготавливает файлы для изменения из ответа LLM."""
+def apply_llm_edits(repo_full_name, change, ref=None, prefer_local=True, issue_body="", summary=""):
+    """
+    Применяет правки (edits) из ответа LLM к текущему содержимому файла.
+    При конфликте запрашивает у LLM полный файл; None — файл остается без изменений.
+    """
+    file_path = change["file_path"]
+    base_sha = str(change.get("base_sha") or "")
+    try:
+        edits = [(edit["search"], edit["replace"]) for edit in change["edits"]]
+        # В JSON модель часто теряет завершающий перевод строки у replace
+        edits = [(search, replace + "\n" if search.endswith("\n") and replace and not replace.endswith("\n")
+                  else replace) for search, replace in edits]
+    except (KeyError, TypeError):
+        edits = None
+
+    current, current_sha = get_file_content(repo_full_name, file_path, ref=ref, prefer_local=prefer_local)
+    try:
+        if edits is None:
+            raise EditConflict("правки в неверном формате")
+        if current is None:
+            raise EditConflict("файл не найден")
+        if base_sha and not (current_sha or "").startswith(base_sha):
+            # Правки написаны к другой версии файла, чем в ветке сейчас
+            raise EditConflict(f"правки к {base_sha[:7]}, текущая версия {(current_sha or '')[:7]}")
+        new_content = apply_search_replace(current, edits)
+        print(f"   ✂️ {file_path}: применено правок {len(edits)}")
+        return new_content
+    except EditConflict as e:
+        print(f"   ⚠️ Конфликт правок в {file_path}: {e}. Запрашиваю файл целиком...")
+
+    new_content = change.get("new_content") or generate_full_file(issue_body, summary, file_path, current)
+    if new_content is None:
+        print(f"   ❌ {file_path} пропущен: не удалось получить новое содержимое")
+    return new_content
+
+def prepare_files_from_llm_response(llm_response, attempt_number, repo_full_name=None, ref=None,
+                                    prefer_local=True, issue_body=""):
+    """Подготавливает файлы для изменения из ответа LLM (правки применяются к текущему содержимому)."""
     files_to_change = {}
     changes = llm_response.get("changes", [])
     
@@ -78,25 +122,52 @@ if __name__ == "__main__":
     else:
         for change in changes:
             file_path = change.get("file_path", f"generated_{attempt_number}.py")
-            new_content = change.get("new_content", "# Файл создан агентом")
+            if "edits" in change:
+                # Правка существующего файла: без применимых правок файл не трогаем (никаких заглушек)
+                if change["edits"] and repo_full_name:
+                    new_content = apply_llm_edits(repo_full_name, dict(change, file_path=file_path), ref=ref,
+                                                  prefer_local=prefer_local, issue_body=issue_body,
+                                                  summary=llm_response.get("summary", ""))
+                else:
+                    new_content = change.get("new_content")
+                if new_content is None:
+                    print(f"   ⚠️ {file_path}: нечего применять, файл не изменяется")
+                    continue
+            else:
+                new_content = change.get("new_content", "# Файл создан агентом")
             files_to_change[file_path] = new_content
     
     return files_to_change
 
+def make_change_handler(uploader):
+    """Обработчик файла из потока LLM: проверка синтаксиса и фоновая загрузка blob'а."""
+    def on_change(change):
+        file_path = change.get("file_path")
+        new_content = change.get("new_content")
+        if not file_path or new_content is None:
+            return  # правки (edits) применяются к текущему файлу после генерации
+        if file_path.endswith(".py"):
+            try:
+                compile(new_content, file_path, "exec")
+            except SyntaxError as e:
+                print(f"⚠️ Синтаксическая ошибка в {file_path}: {e}")
+        uploader.submit(new_content)
+        print(f"   📥 Файл готов: {file_path}")
+    return on_change
+
 def create_issue_comment(repo_full_name, issue_number, message):
     """Создает комментарий в Issue."""
     try:
-        from github import Github
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
-        issue = repo.get_issue(number=issue_number)
-        issue.create_comment(message)
+        session = get_session(GITHUB_TOKEN)
+        repo = session.get_repo(repo_full_name)
+        issue = session.call("get_issue", repo.get_issue, number=issue_number)
+        session.call("create_comment", issue.create_comment, message)
         print(f"💬 Комментарий добавлен к Issue #{issue_number}")
     except Exception as e:
         print(f"⚠️ Не удалось добавить комментарий: {e}")
 
 # ==================== 4. ОСНОВНАЯ ЛОГИКА АГЕНТА ====================
-def main(issue_number, repo_full_name):
+def main(issue_number, repo_full_name, review_timeout=REVIEW_WAIT_DEADLINE, use_async=False):
     print(f"\n🚀 Запуск Coding Agent для Issue #{issue_number} в {repo_full_name}")
     print("=" * 50)
 
@@ -107,57 +178,99 @@ def main(issue_number, repo_full_name):
         return None
 
     MAX_ATTEMPTS = 2  # Уменьшим для теста
+    MAX_COMMENT_ROUNDS = 2
     current_attempt = 1
+    comment_rounds = 0
     pr_url = None
     branch_name = f"coding-agent/issue-{issue_number}"
 
+    # Если настроен REVIEW_WEBHOOK_PORT, вердикт придет событием, а не опросом
+    start_review_receiver()
+
+    # Blob'ы файлов загружаются еще во время генерации, коммит потом только собирает дерево
+    # Содержимое, совпадающее с уже существующим blob'ом локальной копии, не загружается повторно
+    local_repo = get_local_repo(repo_full_name)
+    uploader = BlobUploader(get_session(GITHUB_TOKEN), repo_full_name,
+                            known_blob=local_repo.has_blob if local_repo else None)
+    on_change = make_change_handler(uploader)
+
     try:
-        # 1. Получаем задачу из Issue
-        print("📋 Получение задачи из GitHub...")
-        issue_title, issue_body = get_issue_content(repo_full_name, issue_number)
+        if use_async:
+            # 1-2. Issue и структура репозитория параллельно
+            print("📋 Получение задачи и структуры репозитория из GitHub...")
+            issue_title, issue_body, repo_files = asyncio.run(fetch_issue_and_files(repo_full_name, issue_number))
+        else:
+            # 1. Получаем задачу из Issue
+            print("📋 Получение задачи из GitHub...")
+            issue_title, issue_body = get_issue_content(repo_full_name, issue_number)
+
+            # 2. Получаем список файлов в репозитории для контекста
+            print("📁 Получение структуры репозитория...")
+            repo_files = get_repo_files(repo_full_name, query=f"{issue_title} {issue_body}")
+
         print(f"   Заголовок: {issue_title}")
         print(f"   Описание: {issue_body[:200]}...")
-
-        # 2. Получаем список файлов в репозитории для контекста
-        print("📁 Получение структуры репозитория...")
-        repo_files = get_repo_files(repo_full_name)
         if repo_files:
             print(f"   Найдено файлов: {len(repo_files)}")
 
+        # Локальный индекс checkout'а: LLM видит существующий код, а не только имена файлов
+        repo_index = get_repo_index(repo_full_name)
+
         while current_attempt <= MAX_ATTEMPTS:
             print(f"\n🔄 ПОПЫТКА {current_attempt}/{MAX_ATTEMPTS}")
             print("-" * 40)
-
-            if current_attempt > 1:
-                print("👀 Жду вердикт от AI Reviewer...")
-                time.sleep(5)
-
-            # 3. Анализируем задачу с помощью LLM
-            print("🧠 Анализ задачи с помощью AI...")
-            analysis = analyze_issue_with_llm(issue_title, issue_body, repo_files)
-            
-            # 4. Генерируем код
-            print("💻 Генерация кода...")
-            llm_response = generate_code_changes(issue_body, analysis)
+            # PR создается один раз; дальше каждый раунд (и по замечаниям тоже) только обновляет ветку
+            first_round = pr_url is None
+            # Промпты повторного раунда совпадают с первым: ответ из кэша повторил бы отклоненное решение
+            use_cache = first_round
+
+            if use_async:
+                # 3-4. Анализ и генерация; в первом раунде ветка создается одновременно с ними
+                analysis, llm_response, _ = asyncio.run(analyze_and_generate(
+                    issue_title, issue_body, repo_files, repo_full_name,
+                    branch_name=branch_name if first_round else None,
+                    on_change=on_change,
+                    repo_index=repo_index,
+                    use_cache=use_cache
+                ))
+            else:
+                # 3. Анализируем задачу с помощью LLM
+                print("🧠 Анализ задачи с помощью AI...")
+                analysis = analyze_issue_with_llm(issue_title, issue_body, repo_files, repo_index=repo_index,
+                                                  use_cache=use_cache)
+
+                # 4. Генерируем код
+                print("💻 Генерация кода...")
+                llm_response = generate_code_changes(issue_body, analysis, on_change=on_change,
+                                                     repo_index=repo_index, use_cache=use_cache)
             
             print(f"📝 План: {llm_response.get('summary', 'План не указан')}")
             
             # 5. Подготавливаем файлы для изменения
-            files_to_change = prepare_files_from_llm_response(llm_response, current_attempt)
+            # Правки применяются к текущей версии ветки; ее свежие коммиты есть только на GitHub
+            files_to_change = prepare_files_from_llm_response(
+                llm_response, current_attempt, repo_full_name,
+                ref=None if first_round else branch_name,
+                prefer_local=first_round, issue_body=issue_body
+            )
             print(f"📄 Файлов для изменения: {len(files_to_change)}")
             for file_path in files_to_change.keys():
                 print(f"   - {file_path}")
 
             # 6. Создаём/обновляем ветку и PR
             commit_message = f"Fix Issue #{issue_number} (attempt {current_attempt}): {issue_title[:50]}..."
+            # Вердикты, опубликованные до этого момента, относятся к прошлой попытке
+            pushed_at = time.time()
 
-            if current_attempt == 1:
-                # Первая попытка: создаём новую ветку и PR
-                print(f"🌳 Создаю ветку '{branch_name}'...")
-                create_branch(repo_full_name, branch_name)
+            if first_round:
+                # Первый раунд: создаём новую ветку и PR
+                if not use_async:
+                    print(f"🌳 Создаю ветку '{branch_name}'...")
+                    create_branch(repo_full_name, branch_name)
 
                 print(f"📝 Применяю изменения в ветку...")
-                apply_code_changes(repo_full_name, branch_name, files_to_change, commit_message)
+                head_sha = apply_code_changes(repo_full_name, branch_name, files_to_change, commit_message,
+                                              uploader=uploader)
 
                 print(f"🔗 Создаю Pull Request...")
                 pr_url = create_pull_request(repo_full_name, branch_name, issue_title, issue_number)
@@ -167,9 +280,10 @@ def main(issue_number, repo_full_name):
                     print("❌ Не удалось создать PR")
                     break
             else:
-                # Последующие попытки: обновляем существующий PR
+                # Последующие раунды: обновляем существующий PR
                 print(f"✏️ Обновляю существующий PR (попытка {current_attempt})...")
-                apply_code_changes(repo_full_name, branch_name, files_to_change, commit_message)
+                head_sha = apply_code_changes(repo_full_name, branch_name, files_to_change, commit_message,
+                                              uploader=uploader)
                 print(f"✅ Код обновлён в существующем PR: {pr_url}")
 
             # 7. Извлекаем номер PR из URL
@@ -180,15 +294,12 @@ def main(issue_number, repo_full_name):
                 except:
                     pass
 
-            # 8. Ждем и проверяем вердикт Reviewer
-            if current_attempt == 1:
-                print("\n⏳ Жду запуск AI Reviewer... (30 сек)")
-                time.sleep(30)
-
+            # 8. Ждем вердикт Reviewer (событие или адаптивный опрос)
             if pr_number:
-                # Проверяем вердикт Reviewer
-                print("🤖 Проверяю вердикт AI Reviewer...")
-                verdict = get_latest_ai_review_verdict(repo_full_name, pr_number)
+                print(f"⏳ Жду вердикт AI Reviewer (не дольше {review_timeout:.0f} сек)...")
+                # Засчитывается только вердикт для только что запушенного коммита
+                verdict = wait_for_review_verdict(repo_full_name, pr_number, since=pushed_at,
+                                                  deadline=review_timeout, head_sha=head_sha or None)
 
                 print(f"   Вердикт AI Reviewer: {verdict}")
 
@@ -216,9 +327,31 @@ def main(issue_number, repo_full_name):
                     print("⚠️ AI Reviewer запросил исправления. Готовлю новую попытку...")
                     current_attempt += 1
                     continue
+                elif verdict == "PENDING":
+                    # Ревьюер не ответил: это не исчерпание попыток, PR остается ждать ревью
+                    print("=" * 50)
+                    print(f"⌛ AI Reviewer не ответил за {review_timeout:.0f} сек")
+                    print(f"🔗 Pull Request ожидает ревью: {pr_url}")
+                    pending_message = f"""
+## ⌛ Ожидается ревью
+
+Coding Agent подготовил решение Issue #{issue_number}, но AI Reviewer не ответил за {review_timeout:.0f} сек.
+
+- PR: {pr_url}
+- Попытка: {current_attempt}
+
+*Проверьте, что AI Reviewer запустился для этого PR.*
+"""
+                    create_issue_comment(repo_full_name, issue_number, pending_message)
+                    return pr_url
                 else:
-                    print(f"⏳ AI Reviewer: {verdict}. Жду... (20 сек)")
-                    time.sleep(20)
+                    # Незначительные замечания не расходуют попытку, но число таких повторов ограничено
+                    comment_rounds += 1
+                    if comment_rounds > MAX_COMMENT_ROUNDS:
+                        print(f"💬 AI Reviewer: {verdict}. Лимит повторов по замечаниям исчерпан")
+                        current_attempt += 1
+                    else:
+                        print(f"💬 AI Reviewer: {verdict}. Готовлю новую версию...")
                     continue
             else:
                 print("❌ Не удалось получить номер PR")
@@ -264,6 +397,10 @@ def main(issue_number, repo_full_name):
         create_issue_comment(repo_full_name, issue_number, error_message)
         
         raise
+    finally:
+        uploader.close()
+        get_session(GITHUB_TOKEN).report()
+        get_llm_client().report()
 
 # ==================== 5. CLI ИНТЕРФЕЙС ====================
 if __name__ == "__main__":
@@ -295,6 +432,26 @@ if __name__ == "__main__":
         help='Репозиторий в формате "владелец/название"'
     )
 
+    parser.add_argument(
+        '--review-timeout',
+        type=float,
+        default=REVIEW_WAIT_DEADLINE,
+        help='Максимальное время ожидания вердикта AI Reviewer, сек'
+    )
+
+    parser.add_argument(
+        '--async',
+        dest='use_async',
+        action='store_true',
+        help='Асинхронный режим: независимые запросы к GitHub и LLM выполняются параллельно'
+    )
+
+    parser.add_argument(
+        '--no-llm-cache',
+        action='store_true',
+        help='Не использовать кэш ответов LLM (запросы всегда уходят в API)'
+    )
+
     parser.add_argument(
         '--test',
         action='store_true',
@@ -303,6 +460,9 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    if args.no_llm_cache and get_llm_cache():
+        get_llm_cache().bypass = True
+
     if args.test:
         print("🧪 ТЕСТОВЫЙ РЕЖИМ")
         print(f"   Issue: #{args.issue}")
@@ -328,7 +488,7 @@ if __name__ == "__main__":
             traceback.print_exc()
     else:
         # Запускаем главную функцию
-        result = main(args.issue, args.repo)
+        result = main(args.issue, args.repo, review_timeout=args.review_timeout, use_async=args.use_async)
         
         if result:
             print(f"\n✅ Coding Agent завершил работу")
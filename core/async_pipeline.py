@@ -0,0 +1,74 @@
+"""
+Асинхронный режим Coding Agent: независимые шаги выполняются одновременно.
+Клиенты GitHub и LLM вызываются через asyncio.to_thread, поэтому пул соединений,
+HTTP-кэш и планировщик rate limit остаются общими с синхронным режимом,
+а содержимое PR не меняется.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.github_client import (
+    create_branch,
+    filter_repo_files,
+    get_issue_content,
+    get_session,
+    iter_repo_tree,
+    prioritize_repo_files,
+)
+from core.llm_service import analyze_issue_with_llm, generate_code_changes
+from core.rate_limiter import RateLimitError
+
+
+def _list_repo_entries(repo_full_name: str) -> List[Dict]:
+    try:
+        return list(filter_repo_files(iter_repo_tree(repo_full_name, session=get_session())))
+    except RateLimitError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Не удалось получить файлы репозитория: {e}")
+        return []
+
+
+async def fetch_issue_and_files(repo_full_name: str, issue_number: int,
+                                max_files: int = 50) -> Tuple[str, str, List[Dict]]:
+    """Issue и дерево репозитория запрашиваются параллельно, ранжирование — после получения Issue"""
+    started = time.monotonic()
+    (issue_title, issue_body), entries = await asyncio.gather(
+        asyncio.to_thread(get_issue_content, repo_full_name, issue_number),
+        asyncio.to_thread(_list_repo_entries, repo_full_name),
+    )
+    repo_files = prioritize_repo_files(entries, max_files, f"{issue_title} {issue_body}")
+    print(f"⚡ Issue и структура репозитория получены за {time.monotonic() - started:.1f} сек")
+    return issue_title, issue_body, repo_files
+
+
+async def analyze_and_generate(issue_title: str, issue_body: str, repo_files: List[Dict],
+                               repo_full_name: str, branch_name: Optional[str] = None,
+                               on_change: Optional[Callable[[Dict], None]] = None,
+                               repo_index=None, use_cache: bool = True) -> Tuple[Dict, Dict, bool]:
+    """
+    Анализ и генерация кода; если передан branch_name, ветка создается параллельно с LLM.
+    use_cache=False — ответы LLM не берутся из кэша (повторная попытка).
+    Возвращает (analysis, llm_response, branch_ok).
+    """
+    started = time.monotonic()
+    branch_task = None
+    if branch_name:
+        print(f"🌳 Создаю ветку '{branch_name}' (параллельно с генерацией)...")
+        branch_task = asyncio.create_task(asyncio.to_thread(create_branch, repo_full_name, branch_name))
+
+    try:
+        print("🧠 Анализ задачи с помощью AI...")
+        analysis = await asyncio.to_thread(analyze_issue_with_llm, issue_title, issue_body, repo_files, repo_index,
+                                           use_cache)
+
+        print("💻 Генерация кода...")
+        llm_response = await asyncio.to_thread(
+            generate_code_changes, issue_body, analysis, on_change, repo_index=repo_index, use_cache=use_cache
+        )
+    finally:
+        branch_ok = await branch_task if branch_task else True
+
+    print(f"⚡ Анализ и генерация заняли {time.monotonic() - started:.1f} сек")
+    return analysis, llm_response, branch_ok
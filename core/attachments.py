@@ -0,0 +1,179 @@
+"""
+Потоковая обработка вложений-data URL с ограничением памяти.
+base64 декодируется кусками, текст от бинарных данных отличается по первым байтам,
+одинаковые вложения обрабатываются один раз, а объем декодированных данных и текста
+ограничен бюджетами на запрос. Вложения обрабатываются параллельно.
+"""
+import os
+import base64
+import codecs
+import hashlib
+import binascii
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import unquote_to_bytes
+
+from core.context_packer import CHARS_PER_TOKEN
+
+ATTACHMENT_WORKERS = int(os.getenv("ATTACHMENT_WORKERS", "4"))
+# Сколько декодированных байт всех вложений запроса можно прочитать
+ATTACHMENTS_MAX_BYTES = int(os.getenv("ATTACHMENTS_MAX_BYTES", str(4 * 1024 * 1024)))
+# Бюджет токенов на текст всех вложений запроса (делится поровну между уникальными вложениями)
+ATTACHMENTS_MAX_TOKENS = int(os.getenv("ATTACHMENTS_MAX_TOKENS", "60000"))
+MIN_ATTACHMENT_TOKENS = 512
+
+CHUNK_CHARS = 64 * 1024  # кратно 4: кусок base64 декодируется независимо
+SNIFF_BYTES = 4096
+TEXT_MIME_HINTS = ("text", "json", "csv", "xml", "javascript", "html", "svg", "yaml", "markdown")
+BINARY_SIGNATURES = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04", b"RIFF", b"\x00\x00\x01\x00",
+    b"\x1f\x8b", b"OggS", b"ID3", b"wOFF", b"wOF2",
+)
+MAX_CONTROL_RATIO = 0.05
+
+
+class ByteBudget:
+    """Общий на запрос лимит декодированных байт; потокобезопасен"""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self, wanted: int) -> int:
+        with self._lock:
+            granted = max(0, min(wanted, self.remaining))
+            self.remaining -= granted
+            return granted
+
+
+def parse_data_url(url: str):
+    """(mime, base64?, начало полезной нагрузки) без копирования самой нагрузки"""
+    if not url.startswith("data:") or "," not in url[:1024]:
+        raise ValueError("не data URL")
+    comma = url.index(",")
+    header = url[len("data:"):comma].lower()
+    params = header.split(";")
+    return params[0] or "text/plain", "base64" in params[1:], comma + 1
+
+
+def iter_decoded(url: str, start: int, is_base64: bool) -> Iterator[bytes]:
+    """Декодированные байты нагрузки data URL кусками по ~CHUNK_CHARS символов"""
+    carry = ""
+    for offset in range(start, len(url), CHUNK_CHARS):
+        piece = carry + url[offset:offset + CHUNK_CHARS]
+        if is_base64:
+            piece = "".join(piece.split())
+            usable = len(piece) - len(piece) % 4
+        else:
+            # Не разрезать %XX на границе куска
+            percent = piece.rfind("%", max(0, len(piece) - 2))
+            usable = percent if percent != -1 else len(piece)
+        carry = piece[usable:]
+        if usable:
+            yield base64.b64decode(piece[:usable], validate=True) if is_base64 else unquote_to_bytes(piece[:usable])
+    if carry:
+        yield base64.b64decode(carry + "=" * (-len(carry) % 4)) if is_base64 else unquote_to_bytes(carry)
+
+
+def looks_like_text(mime: str, head: bytes) -> bool:
+    """Дешевая проверка по первым байтам: сигнатуры бинарных форматов, NUL, доля управляющих символов"""
+    if head.startswith(BINARY_SIGNATURES) or b"\x00" in head:
+        return False
+    if any(hint in mime for hint in TEXT_MIME_HINTS):
+        return True
+    text = codecs.getincrementaldecoder("utf-8")(errors="strict")
+    try:
+        decoded = text.decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    control = sum(1 for ch in decoded if ord(ch) < 32 and ch not in "\t\n\r\f")
+    return control <= MAX_CONTROL_RATIO * max(1, len(decoded))
+
+
+def content_key(url: str) -> str:
+    """Ключ дедупликации: хэш самого data URL (без декодирования)"""
+    digest = hashlib.sha256()
+    for offset in range(0, len(url), CHUNK_CHARS):
+        digest.update(url[offset:offset + CHUNK_CHARS].encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _process_one(name: str, url: str, max_chars: int, budget: ByteBudget) -> Dict:
+    result = {"name": name, "mime": None, "kind": "invalid", "text": None, "truncated": False, "size": 0,
+              "duplicate_of": None}
+    try:
+        mime, is_base64, start = parse_data_url(url)
+    except ValueError:
+        return result
+    result["mime"] = mime
+    payload_chars = len(url) - start
+    result["size"] = payload_chars * 3 // 4 if is_base64 else payload_chars
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts, chars = [], 0
+    result["kind"] = "text"  # пустое вложение остается пустым текстом
+    try:
+        for index, chunk in enumerate(iter_decoded(url, start, is_base64)):
+            if index == 0 and not looks_like_text(mime, chunk[:SNIFF_BYTES]):
+                result["kind"] = "binary"
+                return result
+
+            granted = budget.take(len(chunk))
+            text = decoder.decode(chunk[:granted])
+            if chars + len(text) > max_chars:
+                text = text[:max_chars - chars]
+            parts.append(text)
+            chars += len(text)
+            if granted < len(chunk) or chars >= max_chars:
+                result["truncated"] = True
+                break
+        else:
+            parts.append(decoder.decode(b"", final=True))
+    except (binascii.Error, ValueError):
+        result["kind"] = "invalid"
+        return result
+
+    result["text"] = "".join(parts)
+    return result
+
+
+def process_attachments(attachments: Optional[List[Dict]], max_tokens: int = ATTACHMENTS_MAX_TOKENS,
+                        max_bytes: int = ATTACHMENTS_MAX_BYTES, provider: str = "gemini",
+                        workers: int = ATTACHMENT_WORKERS) -> List[Dict]:
+    """
+    Вложения в исходном порядке: {name, mime, kind: text|binary|invalid|duplicate,
+    text, truncated, size, duplicate_of}. Для каждого уникального вложения
+    читается не больше его доли токенов, для всех вместе — не больше max_bytes.
+    """
+    if not attachments:
+        return []
+    names = [att.get("name", "unnamed") for att in attachments]
+    urls = [att.get("url") or "" for att in attachments]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(attachments)))) as pool:
+        keys = list(pool.map(content_key, urls))
+
+        first_by_key = {}
+        for index, key in enumerate(keys):
+            first_by_key.setdefault(key, index)
+        unique = sorted(first_by_key.values())
+
+        ascii_ratio, _ = CHARS_PER_TOKEN.get(provider, CHARS_PER_TOKEN["gemini"])
+        share_tokens = max(MIN_ATTACHMENT_TOKENS, max_tokens // len(unique))
+        max_chars = int(share_tokens * ascii_ratio)
+        budget = ByteBudget(max_bytes)
+
+        futures = {index: pool.submit(_process_one, names[index], urls[index], max_chars, budget) for index in unique}
+        processed = {index: future.result() for index, future in futures.items()}
+
+    results = []
+    for index, key in enumerate(keys):
+        first = first_by_key[key]
+        if first == index:
+            results.append(processed[index])
+        else:
+            original = processed[first]
+            results.append({"name": names[index], "mime": original["mime"], "kind": "duplicate", "text": None,
+                            "truncated": False, "size": original["size"], "duplicate_of": original["name"]})
+    return results
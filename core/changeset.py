@@ -0,0 +1,179 @@
+"""
+Атомарная запись нескольких файлов одним коммитом через Git Data API.
+Blob'ы загружаются параллельно, затем строится одно дерево поверх головы ветки
+и ref переносится один раз.
+"""
+import os
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Union
+
+BLOB_UPLOAD_WORKERS = int(os.getenv("BLOB_UPLOAD_WORKERS", "8"))
+REF_UPDATE_RETRIES = 3
+DEFAULT_FILE_MODE = "100644"
+
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA blob'а так, как его считает git"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _to_bytes(content: Union[str, bytes]) -> bytes:
+    return content.encode("utf-8") if isinstance(content, str) else content
+
+
+class BlobUploader:
+    """
+    Фоновая загрузка blob'ов: файлы можно отдавать по мере готовности
+    (например, пока LLM еще генерирует остальные). Одинаковое содержимое загружается один раз,
+    а blob'ы, для которых known_blob(sha) истинно (уже есть на GitHub), не загружаются вовсе.
+    """
+
+    def __init__(self, session, repo_full_name: str, workers: int = BLOB_UPLOAD_WORKERS,
+                 known_blob: Optional[Callable[[str], bool]] = None):
+        self.session = session
+        self.repo_full_name = repo_full_name
+        self.known_blob = known_blob
+        self.skipped = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, content: Union[str, bytes]) -> str:
+        """Поставить содержимое в очередь загрузки; возвращает SHA blob'а"""
+        data = _to_bytes(content)
+        sha = git_blob_sha(data)
+        with self._lock:
+            if sha not in self._futures:
+                if self.known_blob and self.known_blob(sha):
+                    self.skipped += 1
+                    self._futures[sha] = self._pool.submit(lambda: sha)
+                else:
+                    self._futures[sha] = self._pool.submit(self._upload, sha, data)
+        return sha
+
+    def _upload(self, local_sha: str, data: bytes) -> str:
+        response = self.session.request(
+            "POST",
+            f"/repos/{self.repo_full_name}/git/blobs",
+            json={"content": base64.b64encode(data).decode("ascii"), "encoding": "base64"},
+        )
+        response.raise_for_status()
+        remote_sha = response.json()["sha"]
+        if remote_sha != local_sha:
+            raise ValueError(f"SHA blob'а не совпал: {local_sha} != {remote_sha}")
+        return remote_sha
+
+    def wait(self, shas=None):
+        """Дождаться загрузки (всех или указанных blob'ов); пробрасывает первую ошибку"""
+        with self._lock:
+            futures = [self._futures[sha] for sha in shas] if shas is not None else list(self._futures.values())
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def upload_blobs(session, repo_full_name: str, files: Dict[str, Union[str, bytes]],
+                 uploader: Optional[BlobUploader] = None) -> Dict[str, str]:
+    """Параллельная загрузка blob'ов; одинаковое содержимое загружается один раз. Возвращает path -> sha"""
+    own_uploader = uploader is None
+    if own_uploader:
+        uploader = BlobUploader(session, repo_full_name, workers=min(BLOB_UPLOAD_WORKERS, len(files) or 1))
+    try:
+        path_to_sha = {path: uploader.submit(content) for path, content in files.items()}
+        uploader.wait(set(path_to_sha.values()))
+        return path_to_sha
+    finally:
+        if own_uploader:
+            uploader.close()
+
+
+def base_file_modes(session, repo_full_name: str, tree_sha: str, paths) -> Dict[str, str]:
+    """
+    Режимы (100644, 100755, 120000) существующих файлов из paths в дереве tree_sha.
+    Читаются только каталоги, содержащие эти пути; деревья неизменяемы и хорошо кэшируются.
+    """
+    trees = {"": tree_sha}
+    listings = {}
+
+    def listing(directory: str) -> Dict[str, Dict]:
+        if directory not in listings:
+            sha = trees.get(directory)
+            if sha is None:
+                parent, _, name = directory.rpartition("/")
+                entry = listing(parent).get(name)
+                sha = trees[directory] = entry["sha"] if entry and entry["type"] == "tree" else ""
+            data = session.get_json(f"/repos/{repo_full_name}/git/trees/{sha}") if sha else {}
+            listings[directory] = {entry["path"]: entry for entry in data.get("tree", [])}
+        return listings[directory]
+
+    modes = {}
+    for path in paths:
+        directory, _, name = path.rpartition("/")
+        entry = listing(directory).get(name)
+        if entry and entry["type"] == "blob":
+            modes[path] = entry["mode"]
+    return modes
+
+
+def commit_changeset(session, repo_full_name: str, branch_name: str,
+                     files: Dict[str, Optional[Union[str, bytes]]], message: str,
+                     uploader: Optional[BlobUploader] = None) -> str:
+    """
+    Один коммит со всеми изменениями. Значение None в files удаляет файл.
+    Возвращает SHA нового коммита (или текущей головы, если дерево не изменилось).
+    """
+    to_write = {path: content for path, content in files.items() if content is not None}
+    blob_shas = upload_blobs(session, repo_full_name, to_write, uploader)
+
+    for attempt in range(1, REF_UPDATE_RETRIES + 1):
+        branch = session.get_json(f"/repos/{repo_full_name}/branches/{branch_name}")
+        head_sha = branch["commit"]["sha"]
+        base_tree_sha = branch["commit"]["commit"]["tree"]["sha"]
+
+        # Существующие файлы сохраняют режим (например, исполняемый бит), новые создаются как 100644
+        modes = base_file_modes(session, repo_full_name, base_tree_sha, files)
+        tree_entries = [{
+            "path": path,
+            "mode": modes.get(path, DEFAULT_FILE_MODE),
+            "type": "blob",
+            "sha": blob_shas.get(path) if content is not None else None,
+        } for path, content in files.items()]
+
+        response = session.request(
+            "POST",
+            f"/repos/{repo_full_name}/git/trees",
+            json={"base_tree": base_tree_sha, "tree": tree_entries},
+        )
+        response.raise_for_status()
+        tree_sha = response.json()["sha"]
+
+        if tree_sha == base_tree_sha:
+            print("ℹ️ Изменений относительно ветки нет, коммит не создан")
+            return head_sha
+
+        response = session.request(
+            "POST",
+            f"/repos/{repo_full_name}/git/commits",
+            json={"message": message, "tree": tree_sha, "parents": [head_sha]},
+        )
+        response.raise_for_status()
+        commit_sha = response.json()["sha"]
+
+        response = session.request(
+            "PATCH",
+            f"/repos/{repo_full_name}/git/refs/heads/{branch_name}",
+            json={"sha": commit_sha, "force": False},
+        )
+        if response.status_code == 422 and attempt < REF_UPDATE_RETRIES:
+            # Ветку успели сдвинуть — пересобираем коммит поверх новой головы, blob'ы уже загружены
+            print(f"⚠️ Ветка '{branch_name}' изменилась, повтор ({attempt}/{REF_UPDATE_RETRIES})")
+            continue
+        response.raise_for_status()
+        return commit_sha
+
+    raise RuntimeError(f"Не удалось обновить ветку '{branch_name}'")
@@ -0,0 +1,124 @@
+"""
+Упаковка контекста промпта в бюджет токенов.
+Секции ранжируются по релевантности, в бюджет попадают самые важные;
+не поместившиеся обрезаются или отбрасываются, и это попадает в отчет.
+"""
+import re
+from typing import Dict, List
+
+# Среднее число символов на токен: (ASCII, остальные символы, в т.ч. кириллица).
+# Оценка без токенизатора провайдера, с небольшим запасом в меньшую сторону.
+CHARS_PER_TOKEN = {
+    "deepseek": (3.5, 1.5),
+    "gemini": (4.0, 2.0),
+}
+MIN_SECTION_TOKENS = 64
+TRUNCATION_MARKER = "\n... [обрезано: {tokens} токенов]"
+
+WORD_RE = re.compile(r"[a-zA-Zа-яА-ЯёЁ_][a-zA-Zа-яА-ЯёЁ0-9_]{2,}")
+
+
+def count_tokens(text: str, provider: str = "deepseek") -> int:
+    """Оценка числа токенов текста для провайдера"""
+    if not text:
+        return 0
+    ascii_ratio, other_ratio = CHARS_PER_TOKEN.get(provider, CHARS_PER_TOKEN["deepseek"])
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / ascii_ratio + other_chars / other_ratio) + 1
+
+
+def keyword_relevance(text: str, query: str) -> float:
+    """Доля слов запроса, встречающихся в тексте (0..1)"""
+    words = {word.lower() for word in WORD_RE.findall(query or "")}
+    if not words:
+        return 0.0
+    haystack = (text or "").lower()
+    return sum(1 for word in words if word in haystack) / len(words)
+
+
+class ContextPacker:
+    """Заполнение бюджета токенов секциями по убыванию релевантности"""
+
+    def __init__(self, budget_tokens: int, provider: str = "deepseek", name: str = "контекст"):
+        self.budget = budget_tokens
+        self.provider = provider
+        self.name = name
+        self._sections = []
+        self.included: List[Dict] = []
+        self.truncated: List[Dict] = []
+        self.dropped: List[Dict] = []
+        self.used_tokens = 0
+
+    def add(self, key: str, text: str, relevance: float = 1.0, truncatable: bool = True,
+            min_tokens: int = MIN_SECTION_TOKENS):
+        self._sections.append({
+            "key": key,
+            "text": text or "",
+            "relevance": relevance,
+            "truncatable": truncatable,
+            "min_tokens": min_tokens,
+            "order": len(self._sections),
+        })
+
+    def pack(self) -> Dict[str, str]:
+        """Словарь key -> текст для вошедших секций (возможно, обрезанный)"""
+        result = {}
+        remaining = self.budget
+        for section in sorted(self._sections, key=lambda s: (-s["relevance"], s["order"])):
+            text = section["text"]
+            tokens = count_tokens(text, self.provider)
+            if tokens <= remaining:
+                result[section["key"]] = text
+                remaining -= tokens
+                self.included.append({"key": section["key"], "tokens": tokens})
+            elif section["truncatable"] and remaining >= section["min_tokens"]:
+                cut = self._truncate(text, tokens, remaining)
+                cut_tokens = count_tokens(cut, self.provider)
+                result[section["key"]] = cut
+                remaining -= cut_tokens
+                self.truncated.append({"key": section["key"], "tokens": cut_tokens, "original_tokens": tokens})
+            else:
+                self.dropped.append({"key": section["key"], "tokens": tokens})
+
+        self.used_tokens = self.budget - remaining
+        return result
+
+    def _truncate(self, text: str, tokens: int, budget: int) -> str:
+        marker_tokens = count_tokens(TRUNCATION_MARKER.format(tokens=tokens), self.provider)
+        keep_chars = int(len(text) * max(0, budget - marker_tokens) / tokens)
+        cut = text[:keep_chars]
+        # Обрезаем по границе строки, если она недалеко
+        newline = cut.rfind("\n")
+        if newline > keep_chars * 0.8:
+            cut = cut[:newline]
+        return cut + TRUNCATION_MARKER.format(tokens=tokens - count_tokens(cut, self.provider))
+
+    def report(self) -> Dict:
+        summary = {
+            "budget": self.budget,
+            "used": self.used_tokens,
+            "included": self.included,
+            "truncated": self.truncated,
+            "dropped": self.dropped,
+        }
+        line = f"📦 {self.name}: {self.used_tokens}/{self.budget} токенов"
+        if self.truncated:
+            line += f", обрезано: {', '.join(s['key'] for s in self.truncated)}"
+        if self.dropped:
+            line += f", не вошло: {len(self.dropped)} ({', '.join(s['key'] for s in self.dropped[:5])}"
+            line += ", ...)" if len(self.dropped) > 5 else ")"
+        print(line)
+        return summary
+
+
+def pack_sections(sections: List[Dict], budget_tokens: int, provider: str = "deepseek",
+                  name: str = "контекст") -> Dict[str, str]:
+    """Упаковка списка секций {key, text, relevance?, truncatable?} с печатью отчета"""
+    packer = ContextPacker(budget_tokens, provider, name)
+    for section in sections:
+        packer.add(section["key"], section["text"], section.get("relevance", 1.0),
+                   section.get("truncatable", True))
+    packed = packer.pack()
+    packer.report()
+    return packed
@@ -0,0 +1,99 @@
+"""
+Правки файлов в формате SEARCH/REPLACE: модель возвращает только измененные фрагменты,
+а они применяются к текущему содержимому локально. Фрагмент SEARCH должен встречаться
+в файле ровно один раз, иначе правка считается конфликтной.
+
+    <<<<<<< SEARCH
+    старые строки
+    =======
+    новые строки
+    >>>>>>> REPLACE
+"""
+from typing import List, Tuple
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+EDIT_FORMAT_HELP = f"""{SEARCH_MARKER}
+<exact lines copied from the current file>
+{DIVIDER_MARKER}
+<lines that replace them>
+{REPLACE_MARKER}"""
+
+
+class EditConflict(Exception):
+    """Правку нельзя однозначно применить к файлу"""
+
+
+def parse_search_replace(text: str) -> List[Tuple[str, str]]:
+    """Блоки (search, replace) из ответа модели; текст вне блоков игнорируется"""
+    edits = []
+    search, replace, state = [], [], None
+    for line in text.splitlines(keepends=True):
+        marker = line.strip()
+        if state is None and marker == SEARCH_MARKER:
+            search, replace, state = [], [], "search"
+        elif state == "search" and marker == DIVIDER_MARKER:
+            state = "replace"
+        elif state == "replace" and marker == REPLACE_MARKER:
+            edits.append(("".join(search), "".join(replace)))
+            state = None
+        elif state == "search":
+            search.append(line)
+        elif state == "replace":
+            replace.append(line)
+    if state is not None:
+        raise EditConflict("блок SEARCH/REPLACE не закрыт (ответ обрезан?)")
+    return edits
+
+
+def _line_aligned_matches(content: str, search: str) -> List[int]:
+    """Вхождения search, начинающиеся с начала строки (фрагмент — это целые строки файла)"""
+    positions = []
+    start = content.find(search)
+    while start != -1:
+        if start == 0 or content[start - 1] == "\n":
+            positions.append(start)
+        start = content.find(search, start + 1)
+    return positions
+
+
+def _find_lines_ignoring_indent(content: str, search: str) -> Tuple[int, int]:
+    """Позиции (start, end) единственного участка, совпадающего с search построчно без учета отступов"""
+    lines = content.splitlines(keepends=True)
+    wanted = [line.strip() for line in search.splitlines()]
+    while wanted and not wanted[-1]:
+        wanted.pop()
+    if not wanted:
+        raise EditConflict("пустой фрагмент SEARCH")
+
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    matches = [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if all(lines[i + j].strip() == wanted[j] for j in range(len(wanted)))
+    ]
+    if len(matches) != 1:
+        raise EditConflict(f"фрагмент не найден однозначно (совпадений: {len(matches)}): {wanted[0][:60]!r}")
+    return offsets[matches[0]], offsets[matches[0] + len(wanted)]
+
+
+def apply_search_replace(content: str, edits: List[Tuple[str, str]]) -> str:
+    """Применить правки по очереди; EditConflict, если фрагмент не найден или найден несколько раз"""
+    for search, replace in edits:
+        if not search.strip():
+            raise EditConflict("пустой фрагмент SEARCH")
+        matches = _line_aligned_matches(content, search)
+        if len(matches) == 1:
+            content = content[:matches[0]] + replace + content[matches[0] + len(search):]
+            continue
+        if len(matches) > 1:
+            raise EditConflict(f"фрагмент встречается {len(matches)} раз: {search.strip()[:60]!r}")
+        # Модели часто сбивают отступы и концевые пробелы — сверяем строки без них
+        start, end = _find_lines_ignoring_indent(content, search)
+        if replace and not replace.endswith("\n") and content[start:end].endswith("\n"):
+            replace += "\n"
+        content = content[:start] + replace + content[end:]
+    return content
@@ -0,0 +1,134 @@
+"""
+Постоянное локальное bare-зеркало репозитория GitHub.
+Зеркало дообновляется инкрементальным fetch, файлы коммитятся локально
+(без рабочей копии), а раунд изменений отправляется одним git push.
+"""
+import os
+import base64
+import tempfile
+import threading
+from io import BytesIO
+from typing import Dict, Optional
+
+import git
+from gitdb import IStream
+from gitdb.exc import BadName
+
+GIT_MIRROR_DIR = os.getenv("GIT_MIRROR_DIR") or os.path.expanduser("~/.cache/coding-agent/mirrors")
+GITHUB_GIT_URL = "https://github.com"
+PUSH_RETRIES = 2
+NULL_SHA = "0" * 40
+
+
+class GitMirror:
+    """Bare-зеркало одного репозитория; все операции сериализуются блокировкой зеркала"""
+
+    def __init__(self, repo_full_name: str, token: Optional[str], directory: str = GIT_MIRROR_DIR):
+        self.repo_full_name = repo_full_name
+        self.token = token
+        self.path = os.path.join(directory, f"{repo_full_name}.git")
+        self.lock = threading.RLock()
+
+        if os.path.isdir(self.path):
+            self.repo = git.Repo(self.path)
+        else:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.repo = git.Repo.init(self.path, bare=True)
+            self.repo.create_remote("origin", f"{GITHUB_GIT_URL}/{repo_full_name}.git")
+
+    def _remote_git(self):
+        """git с токеном в заголовке запроса: токен не попадает в конфиг и URL зеркала"""
+        if not self.token:
+            return self.repo.git
+        credentials = base64.b64encode(f"x-access-token:{self.token}".encode()).decode("ascii")
+        return self.repo.git(c=f"http.extraHeader=Authorization: Basic {credentials}")
+
+    def fetch(self, branch: str = "main") -> Optional[str]:
+        """Подтянуть ветку с GitHub; SHA головы или None, если ветки (или коммитов) еще нет"""
+        with self.lock:
+            try:
+                self._remote_git().fetch("origin", f"+refs/heads/{branch}:refs/heads/{branch}")
+            except git.GitCommandError as e:
+                if "couldn't find remote ref" not in str(e):
+                    raise
+                return None
+            return self.head(branch)
+
+    def head(self, branch: str = "main") -> Optional[str]:
+        try:
+            return self.repo.commit(f"refs/heads/{branch}").hexsha
+        except (BadName, ValueError):
+            return None
+
+    def read_file(self, path: str, branch: str = "main") -> Optional[str]:
+        """Содержимое файла из последнего полученного состояния ветки (без обращения к сети)"""
+        with self.lock:
+            head = self.head(branch)
+            if head is None:
+                return None
+            try:
+                blob = self.repo.commit(head).tree / path
+            except KeyError:
+                return None
+            return blob.data_stream.read().decode("utf-8", errors="replace")
+
+    def commit(self, files: Dict[str, str], message: str, branch: str = "main",
+               author_name: str = "coding-agent", author_email: str = "coding-agent@users.noreply.github.com") -> str:
+        """Локальный коммит поверх головы ветки; SHA коммита (или головы, если дерево не изменилось)"""
+        with self.lock:
+            head = self.head(branch)
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {"GIT_INDEX_FILE": os.path.join(tmp, "index")}
+                if head:
+                    self.repo.git.read_tree(head, env=env)
+                for path, content in files.items():
+                    data = content.encode("utf-8") if isinstance(content, str) else content
+                    blob = self.repo.odb.store(IStream("blob", len(data), BytesIO(data)))
+                    self.repo.git.update_index("--add", "--cacheinfo", f"100644,{blob.binsha.hex()},{path}", env=env)
+                tree = self.repo.git.write_tree(env=env)
+
+            if head and self.repo.commit(head).tree.hexsha == tree:
+                return head
+
+            identity = {
+                "GIT_AUTHOR_NAME": author_name, "GIT_AUTHOR_EMAIL": author_email,
+                "GIT_COMMITTER_NAME": author_name, "GIT_COMMITTER_EMAIL": author_email,
+            }
+            parents = ["-p", head] if head else []
+            commit_sha = self.repo.git.commit_tree(tree, *parents, "-m", message, env=identity)
+            self.repo.git.update_ref(f"refs/heads/{branch}", commit_sha, head or NULL_SHA)
+            return commit_sha
+
+    def push(self, branch: str = "main"):
+        with self.lock:
+            self._remote_git().push("origin", f"refs/heads/{branch}:refs/heads/{branch}")
+
+    def commit_and_push(self, files: Dict[str, str], message: str, branch: str = "main", **identity) -> str:
+        """fetch + локальный коммит + один push; если ветку успели сдвинуть, коммит пересобирается"""
+        with self.lock:
+            for attempt in range(1, PUSH_RETRIES + 1):
+                head = self.fetch(branch)
+                commit_sha = self.commit(files, message, branch, **identity)
+                if commit_sha == head:
+                    print(f"ℹ️ {self.repo_full_name}: изменений нет, push не нужен")
+                    return commit_sha
+                try:
+                    self.push(branch)
+                    return commit_sha
+                except git.GitCommandError as e:
+                    if attempt == PUSH_RETRIES or "rejected" not in str(e):
+                        raise
+                    print(f"⚠️ {self.repo_full_name}: ветка '{branch}' изменилась, повтор push")
+
+
+_mirrors: Dict[str, GitMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_git_mirror(repo_full_name: str, token: Optional[str] = None) -> GitMirror:
+    """Зеркало репозитория (одно на процесс)"""
+    with _mirrors_lock:
+        mirror = _mirrors.get(repo_full_name)
+        if mirror is None:
+            mirror = _mirrors[repo_full_name] = GitMirror(repo_full_name, token)
+        return mirror
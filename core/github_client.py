@@ -1,144 +1,499 @@
 import os
+import re
+import heapq
+import hashlib
+import posixpath
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
 from github import Github, GithubException
-import git
-import tempfile
-import shutil
+from core.changeset import BlobUploader, commit_changeset
+from core.http_cache import HttpCache, get_http_cache
+from core.local_repo import get_local_repo
+from core.rate_limiter import PRIORITY_LOW, PRIORITY_READ, PRIORITY_WRITE, RateLimitError, get_scheduler
 import base64
 import json
 
 GITHUB_TOKEN = os.getenv("GH_PAT") or os.getenv("GITHUB_PAT") or os.getenv("GITHUB_TOKEN")
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "10"))
+
+RATE_LIMIT_RETRIES = 3
+WRITE_CALL_PREFIXES = ("create", "update", "delete", "edit", "merge")
+
+LISTED_EXTENSIONS = ('.py', '.md', '.txt', '.json', '.yml', '.yaml')
+SKIPPED_DIRS = {'.git', 'node_modules', 'vendor', 'dist', 'build', '__pycache__', '.venv', 'venv'}
+
+
+class GitHubSession:
+    """Сессия GitHub на время запуска: keep-alive соединения, кэш Repository/Branch и счетчики запросов"""
+
+    def __init__(self, token: Optional[str] = None, pool_size: int = GITHUB_POOL_SIZE,
+                 cache: Optional[HttpCache] = None):
+        self.token = token or GITHUB_TOKEN
+        self.pool_size = pool_size
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.headers.update({
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        })
+        if self.token:
+            self.http.headers["Authorization"] = f"Bearer {self.token}"
+
+        self._github = None
+        self._repos = {}
+        self._branches = {}
+        self._lock = threading.Lock()
+        self._rate_start = None
+        self._rate_current = None
+        self.stats = Counter()
+
+        self.cache = get_http_cache() if cache is None else cache
+        self.scheduler = get_scheduler(self.token)
+        self._identity = hashlib.sha256((self.token or "").encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def github(self) -> Github:
+        """PyGithub-клиент, создается один раз на сессию"""
+        with self._lock:
+            if self._github is None:
+                self._github = Github(self.token, per_page=100, pool_size=self.pool_size)
+            return self._github
+
+    def call(self, name: str, func, *args, priority: Optional[int] = None, **kwargs):
+        """Вызов метода PyGithub через планировщик rate limit с учетом в статистике"""
+        if priority is None:
+            priority = PRIORITY_WRITE if name.startswith(WRITE_CALL_PREFIXES) else PRIORITY_READ
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.scheduler.acquire(priority)
+            self._count(f"api:{name}")
+            try:
+                result = func(*args, **kwargs)
+            except GithubException as e:
+                delay = self.scheduler.observe(e.status, e.headers or {}, str(e.data))
+                if delay is None:
+                    raise
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise RateLimitError(f"{name}: лимит GitHub не восстановился") from e
+                print(f"⏳ Лимит GitHub ({name}), повтор через {delay:.0f}с")
+                continue
+
+            if self._github is not None:
+                remaining, limit = self._github.rate_limiting
+                self.scheduler.update_budget(remaining, limit, self._github.rate_limiting_resettime)
+                self._observe_rate(remaining)
+            return result
+
+    def request(self, method: str, path: str, priority: Optional[int] = None, **kwargs) -> requests.Response:
+        """HTTP-запрос к GitHub API через общий пул соединений и планировщик rate limit"""
+        url = path if path.startswith("http") else f"{GITHUB_API_URL}{path}"
+        kwargs.setdefault("timeout", 30)
+        if priority is None:
+            priority = PRIORITY_READ if method.upper() in ("GET", "HEAD") else PRIORITY_WRITE
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.scheduler.acquire(priority)
+            self._count(f"http:{method.upper()}")
+            response = self.http.request(method, url, **kwargs)
+
+            remaining = response.headers.get("X-RateLimit-Remaining")
+            if remaining is not None:
+                self._observe_rate(int(remaining))
+
+            # Тело читается только у возможного срабатывания лимита: потоковые ответы не выкачиваются целиком
+            body = response.text if response.status_code in (403, 429) else ""
+            delay = self.scheduler.observe(response.status_code, response.headers, body)
+            if delay is None:
+                return response
+            if attempt == RATE_LIMIT_RETRIES:
+                raise RateLimitError(f"{method} {url}: лимит GitHub не восстановился")
+            print(f"⏳ Лимит GitHub ({method} {url}), повтор через {delay:.0f}с")
+
+    def get_json(self, path: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                 priority: int = PRIORITY_READ):
+        """GET-запрос с разбором JSON; через HTTP-кэш отправляется условным (If-None-Match)"""
+        return json.loads(self._get_cached(path, params, headers, priority)[0])
+
+    def get_paginated_json(self, path: str, params: Optional[Dict] = None,
+                           priority: int = PRIORITY_READ) -> Iterator[Dict]:
+        """Ленивый обход всех страниц списка; каждая страница кэшируется отдельно"""
+        params = dict(params or {})
+        params.setdefault("per_page", 100)
+        url, page_params = path, params
+        while url:
+            body, link = self._get_cached(url, page_params, priority=priority)
+            for item in json.loads(body):
+                yield item
+            url, page_params = _next_page_url(link), None
+
+    def _get_cached(self, path: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                    priority: int = PRIORITY_READ):
+        """Возвращает (текст тела, заголовок Link), используя 304 из кэша, если возможно"""
+        url = path if path.startswith("http") else f"{GITHUB_API_URL}{path}"
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        headers = dict(headers or {})
+
+        key = None
+        entry = None
+        if self.cache is not None:
+            identity = f"{self._identity}|{headers.get('Accept', '')}"
+            key = self.cache.make_key(full_url, identity)
+            entry = self.cache.get(key)
+            headers.update(self.cache.conditional_headers(entry))
+
+        response = self.request("GET", full_url, headers=headers, priority=priority)
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.record_hit(key)
+            self._count("cache:304")
+            return entry["body"], entry.get("link")
+
+        response.raise_for_status()
+        if self.cache is not None:
+            self.cache.record_miss()
+            self.cache.put(key, full_url, response)
+        return response.text, response.headers.get("Link")
+
+    def get_repo(self, full_name: str):
+        """Repository из кэша сессии или из API"""
+        with self._lock:
+            repo = self._repos.get(full_name)
+        if repo is not None:
+            self._count("reused:repo")
+            return repo
+        repo = self.call("get_repo", self.github.get_repo, full_name)
+        return self.remember_repo(repo, full_name)
+
+    def remember_repo(self, repo, full_name: Optional[str] = None):
+        """Сохранение уже полученного Repository (например, после create_repo)"""
+        with self._lock:
+            return self._repos.setdefault(full_name or repo.full_name, repo)
+
+    def get_branch(self, full_name: str, branch_name: str, refresh: bool = False):
+        """Branch из кэша сессии; refresh=True перечитывает голову ветки"""
+        key = (full_name, branch_name)
+        if not refresh:
+            with self._lock:
+                branch = self._branches.get(key)
+            if branch is not None:
+                self._count("reused:branch")
+                return branch
+        repo = self.get_repo(full_name)
+        branch = self.call("get_branch", repo.get_branch, branch_name)
+        with self._lock:
+            self._branches[key] = branch
+        return branch
+
+    def invalidate_branch(self, full_name: str, branch_name: str):
+        """Сброс кэша ветки после записи в нее"""
+        with self._lock:
+            self._branches.pop((full_name, branch_name), None)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _observe_rate(self, remaining: Optional[int]):
+        if remaining is None or remaining < 0:
+            return
+        with self._lock:
+            if self._rate_start is None:
+                self._rate_start = remaining
+            self._rate_current = remaining
+
+    def snapshot(self) -> Dict:
+        """Текущие значения счетчиков: report(since=snapshot) покажет только запросы после этого момента"""
+        with self._lock:
+            return {
+                "stats": Counter(self.stats),
+                "rate": self._rate_current,
+                "http_cache": self.cache.stats() if self.cache is not None else None,
+                "scheduler": dict(self.scheduler.stats),
+            }
+
+    def report(self, since: Optional[Dict] = None) -> Dict:
+        """
+        Сводка запросов за запуск. Сессия общая для процесса, поэтому долгоживущий сервер
+        передает since=snapshot() начала задания и получает только его долю счетчиков.
+        """
+        current = self.snapshot()
+        if since:
+            stats = current["stats"] - since["stats"]
+            rate_start = since["rate"] if since["rate"] is not None else self._rate_start
+            http_cache = _counters_since(current["http_cache"], since["http_cache"], ("hits", "misses", "evictions"))
+            if http_cache:
+                lookups = http_cache["hits"] + http_cache["misses"]
+                http_cache["hit_rate"] = round(http_cache["hits"] / lookups, 3) if lookups else 0.0
+            scheduler = _counters_since(current["scheduler"], since["scheduler"],
+                                        ("acquired", "waited_seconds", "throttled"))
+        else:
+            stats, rate_start = current["stats"], self._rate_start
+            http_cache, scheduler = current["http_cache"], current["scheduler"]
+
+        api_calls = sum(v for k, v in stats.items() if k.startswith(("api:", "http:")))
+        reused = sum(v for k, v in stats.items() if k.startswith("reused:"))
+        summary = {
+            "requests": api_calls,
+            "reused": reused,
+            "rate_limit_used": (rate_start - current["rate"])
+            if rate_start is not None and current["rate"] is not None else None,
+            "details": dict(stats),
+            "http_cache": http_cache,
+            "scheduler": scheduler,
+        }
+        print(f"📊 GitHub API: запросов {summary['requests']}, сэкономлено повторным использованием {summary['reused']}")
+        if http_cache:
+            print(f"   HTTP-кэш: попаданий (304) {http_cache['hits']}, промахов {http_cache['misses']}")
+        if scheduler["throttled"]:
+            print(f"   Ожидание лимита: {scheduler['waited_seconds']:.1f}с, срабатываний {scheduler['throttled']}")
+        return summary
+
+
+def _counters_since(current: Optional[Dict], before: Optional[Dict], keys) -> Optional[Dict]:
+    """Счетчики current за вычетом значений из снимка before (остальные поля — как в current)"""
+    if current is None:
+        return None
+    return dict(current, **{key: current[key] - (before or {}).get(key, 0) for key in keys})
+
+
+def _next_page_url(link_header: Optional[str]) -> Optional[str]:
+    """URL следующей страницы из заголовка Link"""
+    if not link_header:
+        return None
+    for part in link_header.split(","):
+        match = re.match(r'\s*<([^>]+)>;\s*rel="next"', part)
+        if match:
+            return match.group(1)
+    return None
+
+
+_sessions: Dict[str, GitHubSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(token: Optional[str] = None) -> GitHubSession:
+    """Общая сессия GitHub для токена (одна на процесс)"""
+    token = token or GITHUB_TOKEN
+    with _sessions_lock:
+        session = _sessions.get(token or "")
+        if session is None:
+            session = _sessions[token or ""] = GitHubSession(token)
+        return session
 
 
-def test_github_connection():
+def test_github_connection(session: Optional[GitHubSession] = None):
     """Проверка подключения к GitHub"""
     try:
-        github_client = Github(GITHUB_TOKEN)
-        user = github_client.get_user()
-        print(f"✅ Подключено к GitHub как: {user.login}")
+        session = session or get_session()
+        login = session.call("get_user", lambda: session.github.get_user().login)
+        print(f"✅ Подключено к GitHub как: {login}")
         return True
+    except RateLimitError:
+        raise
     except Exception as e:
         print(f"❌ Ошибка подключения к GitHub: {e}")
         return False
 
 
-def get_issue_content(repo_full_name, issue_number):
+def get_issue_content(repo_full_name, issue_number, session: Optional[GitHubSession] = None):
     """Получение контента Issue"""
     try:
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
-        issue = repo.get_issue(number=issue_number)
-        return issue.title, issue.body or ""
+        session = session or get_session()
+        issue = session.get_json(f"/repos/{repo_full_name}/issues/{issue_number}")
+        return issue["title"], issue.get("body") or ""
+    except RateLimitError:
+        raise
     except Exception as e:
         print(f"❌ Ошибка получения Issue: {e}")
         return "", ""
 
 
-def get_repo_files(repo_full_name, max_files=50):
+def get_file_content(repo_full_name, path, ref: Optional[str] = None,
+                     session: Optional[GitHubSession] = None, prefer_local: bool = True):
+    """
+    Содержимое файла и его blob SHA; (None, None), если файла нет.
+    Читается из локальной копии, если она есть и содержит ref, иначе через REST (с HTTP-кэшем).
+    prefer_local=False — для веток, которые агент сам пушит: локальная копия их не видит.
+    """
+    local = get_local_repo(repo_full_name) if prefer_local else None
+    if local is not None:
+        try:
+            return local.read_file(path, ref)
+        except LookupError:
+            pass
+
+    session = session or get_session()
+    params = {"ref": ref} if ref else None
+    try:
+        data = session.get_json(f"/repos/{repo_full_name}/contents/{path}", params=params)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None, None
+        raise
+    content = base64.b64decode(data.get("content") or "").decode("utf-8", errors="replace")
+    return content, data["sha"]
+
+
+def get_blob(repo_full_name, sha: str, max_bytes: int,
+             session: Optional[GitHubSession] = None) -> Tuple[Optional[bytes], bool]:
+    """
+    Первые max_bytes байт blob'а по SHA и признак обрезки; (None, False), если blob'а нет.
+    Читается из локальной копии или потоком через REST (без загрузки остатка файла).
+    """
+    local = get_local_repo(repo_full_name)
+    if local is not None:
+        try:
+            data = local.read_blob(sha, max_bytes)
+            return data[:max_bytes], len(data) > max_bytes
+        except LookupError:
+            pass
+
+    session = session or get_session()
+    response = session.request("GET", f"/repos/{repo_full_name}/git/blobs/{sha}",
+                               headers={"Accept": "application/vnd.github.raw"}, stream=True)
+    try:
+        if response.status_code == 404:
+            return None, False
+        response.raise_for_status()
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                break
+        data = b"".join(chunks)
+        return data[:max_bytes], size > max_bytes
+    finally:
+        response.close()
+
+
+def iter_repo_tree(repo_full_name, ref: str = "HEAD", session: Optional[GitHubSession] = None) -> Iterator[Dict]:
+    """Ленивый обход всех файлов репозитория: из локальной копии или за один запрос (recursive git tree)"""
+    local = get_local_repo(repo_full_name)
+    if local is not None:
+        try:
+            yield from local.iter_tree(None if ref == "HEAD" else ref)
+            return
+        except LookupError:
+            pass
+
+    session = session or get_session()
+    data = session.get_json(f"/repos/{repo_full_name}/git/trees/{ref}", params={"recursive": "1"})
+    if data.get("truncated"):
+        print(f"⚠️ Дерево {repo_full_name}@{ref} слишком большое, GitHub вернул его не полностью")
+
+    for entry in data.get("tree", []):
+        if entry.get("type") != "blob":
+            continue
+        yield {
+            "path": entry["path"],
+            "name": posixpath.basename(entry["path"]),
+            "size": entry.get("size", 0),
+            "sha": entry["sha"],
+        }
+
+
+def filter_repo_files(entries: Iterable[Dict], extensions=LISTED_EXTENSIONS,
+                      skip_dirs=SKIPPED_DIRS) -> Iterator[Dict]:
+    """Ленивый фильтр по расширениям и служебным каталогам"""
+    for entry in entries:
+        parts = entry["path"].split("/")
+        if any(part in skip_dirs for part in parts[:-1]):
+            continue
+        if extensions and not entry["path"].endswith(extensions):
+            continue
+        yield entry
+
+
+def prioritize_repo_files(entries: Iterable[Dict], max_files: int = 50, query: str = "") -> List[Dict]:
+    """
+    Отбор max_files самых полезных файлов без материализации всего дерева:
+    совпадения со словами задачи, затем мелкая вложенность, затем путь.
+    """
+    keywords = {word for word in re.findall(r"[a-zA-Z_][a-zA-Z0-9_]{2,}", query.lower())}
+
+    def rank(entry):
+        path = entry["path"].lower()
+        hits = sum(1 for word in keywords if word in path)
+        return (-hits, path.count("/"), path)
+
+    return heapq.nsmallest(max_files, entries, key=rank)
+
+
+def get_repo_files(repo_full_name, max_files=50, session: Optional[GitHubSession] = None, query: str = ""):
     """Получение списка файлов в репозитории"""
     try:
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
-
-        contents = repo.get_contents("")
-        files = []
-
-        def traverse_contents(contents, path=""):
-            for content in contents:
-                if content.type == "dir":
-                    try:
-                        sub_contents = repo.get_contents(content.path)
-                        traverse_contents(sub_contents, content.path)
-                    except:
-                        pass
-                else:
-                    if content.path.endswith(('.py', '.md', '.txt', '.json', '.yml', '.yaml')):
-                        files.append({
-                            'path': content.path,
-                            'name': content.name,
-                            'size': content.size
-                        })
-                        if len(files) >= max_files:
-                            return
-
-        traverse_contents(contents)
-        return files[:max_files]
+        entries = filter_repo_files(iter_repo_tree(repo_full_name, session=session))
+        return prioritize_repo_files(entries, max_files, query)
+    except RateLimitError:
+        raise
     except Exception as e:
         print(f"⚠️ Не удалось получить файлы репозитория: {e}")
         return []
 
 
-def create_branch(repo_full_name, branch_name):
+def create_branch(repo_full_name, branch_name, session: Optional[GitHubSession] = None):
     """Создание новой ветки от main"""
+    session = session or get_session()
     try:
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
-
-        main_ref = repo.get_git_ref("heads/main")
-        main_sha = repo.get_branch("main").commit.sha
+        repo = session.get_repo(repo_full_name)
+        main_sha = session.get_branch(repo_full_name, "main").commit.sha
 
-        repo.create_git_ref(f"refs/heads/{branch_name}", main_sha)
+        session.call("create_git_ref", repo.create_git_ref, f"refs/heads/{branch_name}", main_sha)
         print(f"✅ Ветка '{branch_name}' создана")
         return True
+    except RateLimitError:
+        raise
     except Exception as e:
         print(f"❌ Ошибка создания ветки: {e}")
 
         try:
-            repo.get_branch(branch_name)
+            session.get_branch(repo_full_name, branch_name, refresh=True)
             print(f"✅ Ветка '{branch_name}' уже существует")
             return True
-        except:
+        except RateLimitError:
+            raise
+        except Exception:
             return False
 
 
-def apply_code_changes(repo_full_name, branch_name, files_to_change, commit_message):
-    """Применение изменений к коду в репозитории"""
+def apply_code_changes(repo_full_name, branch_name, files_to_change, commit_message,
+                       session: Optional[GitHubSession] = None, uploader: Optional[BlobUploader] = None):
+    """Применение изменений к коду в репозитории одним коммитом; SHA коммита ветки или False при ошибке"""
+    session = session or get_session()
     try:
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
+        commit_sha = commit_changeset(session, repo_full_name, branch_name, files_to_change, commit_message,
+                                      uploader=uploader)
 
-        branch = repo.get_branch(branch_name)
-        base_tree = repo.get_git_tree(branch.commit.sha)
+        for file_path in files_to_change:
+            print(f"✅ Файл '{file_path}' обновлен")
+        print(f"✅ Коммит {commit_sha[:7]} в ветке '{branch_name}' ({len(files_to_change)} файлов)")
 
-        tree_elements = []
-
-        for file_path, new_content in files_to_change.items():
-            try:
-                try:
-                    file_content = repo.get_contents(file_path, ref=branch_name)
-                    repo.update_file(
-                        path=file_path,
-                        message=commit_message,
-                        content=new_content,
-                        sha=file_content.sha,
-                        branch=branch_name
-                    )
-                except:
-                    # Создаем новый файл
-                    repo.create_file(
-                        path=file_path,
-                        message=commit_message,
-                        content=new_content,
-                        branch=branch_name
-                    )
-
-                print(f"✅ Файл '{file_path}' обновлен")
-
-            except Exception as e:
-                print(f"⚠️ Ошибка обновления файла '{file_path}': {e}")
-
-        return True
+        return commit_sha
 
+    except RateLimitError:
+        raise
     except Exception as e:
         print(f"❌ Ошибка применения изменений: {e}")
         return False
+    finally:
+        session.invalidate_branch(repo_full_name, branch_name)
 
 
-def create_pull_request(repo_full_name, branch_name, issue_title, issue_number):
+def create_pull_request(repo_full_name, branch_name, issue_title, issue_number,
+                        session: Optional[GitHubSession] = None):
     """Создание Pull Request"""
     try:
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
-        
+        session = session or get_session()
+        repo = session.get_repo(repo_full_name)
+
         pr_title = f"Fix Issue #{issue_number}: {issue_title}"
         pr_body = f"""
 ## Автоматически созданный Pull Request
@@ -159,53 +514,114 @@ def create_pull_request(repo_full_name, branch_name, issue_title, issue_number):
 *Этот PR создан автоматически системой SDLC.*
 """
 
-        pr = repo.create_pull(
+        pr = session.call(
+            "create_pull",
+            repo.create_pull,
             title=pr_title,
             body=pr_body,
             head=branch_name,
             base="main"
         )
 
-        pr.create_issue_comment(f"Этот PR связан с Issue #{issue_number}")
+        session.call("create_issue_comment", pr.create_issue_comment, f"Этот PR связан с Issue #{issue_number}")
 
         return pr.html_url
 
+    except RateLimitError:
+        raise
     except Exception as e:
         print(f"❌ Ошибка создания PR: {e}")
         return None
 
 
-def get_latest_ai_review_verdict(repo_full_name, pr_number):
-    """Получение вердикта от AI Reviewer"""
-    try:
-        github_client = Github(GITHUB_TOKEN)
-        repo = github_client.get_repo(repo_full_name)
-        pr = repo.get_pull(pr_number)
-
-        comments = pr.get_issue_comments()
-
-        ai_reviewer_comments = []
-        for comment in comments:
-            if "🤖 AI Code Review Report" in comment.body or "AI Reviewer" in comment.body:
-                ai_reviewer_comments.append({
-                    'created_at': comment.created_at,
-                    'body': comment.body,
-                    'user': comment.user.login
-                })
-
-        if not ai_reviewer_comments:
-            return "PENDING"
-
-        latest_comment = sorted(ai_reviewer_comments, 
-                              key=lambda x: x['created_at'])[-1]['body']
-
-        if "✅ Все проверки пройдены" in latest_comment or "APPROVE" in latest_comment:
-            return "APPROVE"
-        elif "❌ Требуются изменения" in latest_comment or "REQUEST_CHANGES" in latest_comment:
-            return "REQUEST_CHANGES"
-        else:
-            return "COMMENT"
+# Машиночитаемая отметка, которую AI Reviewer добавляет в свой комментарий (в Markdown не видна)
+REVIEW_MARKER_RE = re.compile(r"<!--\s*ai-review-verdict:\s*(APPROVE|REQUEST_CHANGES|COMMENT)(?:\s+head=([0-9a-f]+))?\s*-->")
+REVIEW_VERDICT_LINE_RE = re.compile(r"\*\*Вердикт:\*\*\s*(APPROVE|REQUEST_CHANGES|COMMENT)")
+REVIEW_REPORT_TITLE = "🤖 AI Code Review Report"
 
-    except Exception as e:
-        print(f"⚠️ Ошибка получения вердикта ревьюера: {e}")
-        return "PENDING"
+
+def review_marker(verdict: str, head_sha: Optional[str] = None) -> str:
+    """Отметка вердикта для комментария AI Reviewer"""
+    head = f" head={head_sha}" if head_sha else ""
+    return f"<!-- ai-review-verdict: {verdict}{head} -->"
+
+
+def is_ai_review_comment(body: str) -> bool:
+    """Комментарий опубликован AI Reviewer"""
+    return bool(REVIEW_MARKER_RE.search(body)) or REVIEW_REPORT_TITLE in body
+
+
+def head_from_comment(body: str) -> Optional[str]:
+    """SHA коммита, к которому относится вердикт (из отметки); None у комментариев без отметки"""
+    match = REVIEW_MARKER_RE.search(body)
+    return match.group(2) if match else None
+
+
+def verdict_from_comment(body: str) -> str:
+    """Вердикт из комментария AI Reviewer: по отметке, а у старых комментариев — по строке «Вердикт»"""
+    match = REVIEW_MARKER_RE.search(body) or REVIEW_VERDICT_LINE_RE.search(body)
+    if match:
+        return match.group(1)
+    if "✅ Все проверки пройдены" in body:
+        return "APPROVE"
+    elif "❌ Требуются изменения" in body:
+        return "REQUEST_CHANGES"
+    else:
+        return "COMMENT"
+
+
+class ReviewVerdictCursor:
+    """
+    Курсор по комментариям PR: каждый опрос запрашивает только комментарии, обновленные после
+    последнего увиденного (since), и пропускает уже разобранные id. Пока новых комментариев нет,
+    URL не меняется и запрос уходит условным (304 через HTTP-кэш, без расхода лимита).
+    Если задан head_sha, учитываются только вердикты для этого коммита.
+    """
+
+    def __init__(self, repo_full_name, pr_number, since: Optional[str] = None,
+                 session: Optional[GitHubSession] = None, head_sha: Optional[str] = None):
+        self.path = f"/repos/{repo_full_name}/issues/{pr_number}/comments"
+        self.created_after = since
+        self.since = since
+        self.last_id = 0
+        self.verdict = None
+        self.session = session
+        self.head_sha = head_sha
+
+    def poll(self) -> str:
+        """Последний вердикт AI Reviewer или PENDING"""
+        try:
+            session = self.session or get_session()
+            comments = session.get_paginated_json(
+                self.path,
+                params={"since": self.since} if self.since else None,
+                priority=PRIORITY_LOW
+            )
+            for comment in comments:
+                if comment["id"] <= self.last_id:
+                    continue
+                self.last_id = comment["id"]
+                self.since = max(self.since or "", comment.get("updated_at") or comment["created_at"])
+                if self.created_after and comment["created_at"] < self.created_after:
+                    continue
+                body = comment.get("body") or ""
+                if is_ai_review_comment(body):
+                    head = head_from_comment(body)
+                    if self.head_sha and head and not (self.head_sha.startswith(head) or head.startswith(self.head_sha)):
+                        continue  # Поздний вердикт для предыдущего пуша
+                    # Комментарии идут по возрастанию id: последний найденный — самый свежий
+                    self.verdict = verdict_from_comment(body)
+        except RateLimitError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Ошибка получения вердикта ревьюера: {e}")
+        return self.verdict or "PENDING"
+
+
+def get_latest_ai_review_verdict(repo_full_name, pr_number, session: Optional[GitHubSession] = None,
+                                 since: Optional[str] = None, head_sha: Optional[str] = None):
+    """
+    Получение вердикта от AI Reviewer (since — учитывать только комментарии не раньше этого ISO-времени,
+    head_sha — только вердикты для этого коммита)
+    """
+    return ReviewVerdictCursor(repo_full_name, pr_number, since=since, session=session, head_sha=head_sha).poll()
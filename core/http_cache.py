@@ -0,0 +1,152 @@
+"""
+Дисковый кэш ответов GitHub REST для условных запросов (ETag / Last-Modified).
+Ответ 304 не тратит rate limit, а тело берется из кэша.
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+
+HTTP_CACHE_DIR = os.getenv("GITHUB_HTTP_CACHE_DIR") or os.path.expanduser("~/.cache/coding-agent/github-http")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("GITHUB_HTTP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+HTTP_CACHE_ENABLED = os.getenv("GITHUB_HTTP_CACHE", "1") != "0"
+
+
+class HttpCache:
+    """Кэш по URL с ограничением размера (вытесняются давно не использованные записи)"""
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    @staticmethod
+    def make_key(url: str, identity: str = "") -> str:
+        return hashlib.sha256(f"{identity}|{url}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Запись кэша или None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """Заголовки If-None-Match / If-Modified-Since для записи"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record_hit(self, key: str):
+        """304: запись актуальна, отмечаем использование для LRU"""
+        with self._lock:
+            self.hits += 1
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: str, url: str, response) -> None:
+        """Сохранение ответа 200, если у него есть валидаторы"""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "link": response.headers.get("Link"),
+            "body": response.text,
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Не удалось записать HTTP-кэш: {e}")
+            return
+
+        with self._lock:
+            self._size += len(data) - old_size
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _evict(self):
+        """Удаление самых старых записей, пока кэш не станет меньше 90% лимита"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.evictions += 1
+                except OSError:
+                    pass
+            self._size = total
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._size,
+        }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Общий кэш процесса (None, если отключен через GITHUB_HTTP_CACHE=0)"""
+    global _shared_cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = HttpCache()
+            except OSError as e:
+                print(f"⚠️ HTTP-кэш недоступен: {e}")
+                return None
+        return _shared_cache
@@ -0,0 +1,158 @@
+"""
+Постоянное хранилище заданий handler.py (SQLite), ключ — (task, round, nonce).
+Повторный POST того же задания присоединяется к существующему, а результаты стадий
+сохраняются, чтобы прерванное перезапуском задание продолжилось с последней завершенной стадии.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH") or os.path.expanduser("~/.cache/coding-agent/jobs.sqlite3")
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+UNFINISHED_STATES = (STATE_QUEUED, STATE_RUNNING)
+
+# Поля запроса, которые не сохраняются на диск
+SECRET_FIELDS = ("secret",)
+
+JobKey = Tuple[str, str, str]
+
+
+def job_key(request_body: Dict) -> JobKey:
+    return str(request_body["task"]), str(request_body["round"]), str(request_body["nonce"])
+
+
+class JobStore:
+    """Задания, их состояние и результаты стадий"""
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                task TEXT NOT NULL,
+                round TEXT NOT NULL,
+                nonce TEXT NOT NULL,
+                state TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                stages TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (task, round, nonce)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state)")
+        self._conn.commit()
+
+    def submit(self, request_body: Dict) -> Tuple[Dict, bool]:
+        """
+        Задание для запроса и флаг «нужно запустить»: True для нового задания
+        и для повтора упавшего; False, если такое задание уже в работе или выполнено.
+        """
+        key = job_key(request_body)
+        payload = json.dumps({k: v for k, v in request_body.items() if k not in SECRET_FIELDS}, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            created = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (task, round, nonce, state, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, STATE_QUEUED, payload, now, now),
+            ).rowcount == 1
+            retried = not created and self._conn.execute(
+                "UPDATE jobs SET state = ?, error = NULL, updated_at = ? "
+                "WHERE task = ? AND round = ? AND nonce = ? AND state = ?",
+                (STATE_QUEUED, now, *key, STATE_FAILED),
+            ).rowcount == 1
+            self._conn.commit()
+        return self.get(key), created or retried
+
+    def get(self, key: JobKey) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT task, round, nonce, state, payload, stages, result, error, attempts, created_at, updated_at "
+                "FROM jobs WHERE task = ? AND round = ? AND nonce = ?", key,
+            ).fetchone()
+        if row is None:
+            return None
+        task, round_, nonce, state, payload, stages, result, error, attempts, created_at, updated_at = row
+        return {
+            "task": task, "round": round_, "nonce": nonce, "state": state,
+            "payload": json.loads(payload), "stages": json.loads(stages),
+            "result": json.loads(result) if result else None, "error": error,
+            "attempts": attempts, "created_at": created_at, "updated_at": updated_at,
+        }
+
+    def _update(self, key: JobKey, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE task = ? AND round = ? AND nonce = ?",
+                (*fields.values(), *key),
+            )
+            self._conn.commit()
+
+    def start(self, key: JobKey):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE task = ? AND round = ? AND nonce = ?",
+                (STATE_RUNNING, time.time(), *key),
+            )
+            self._conn.commit()
+
+    def save_stage(self, key: JobKey, stage: str, result):
+        """Сохранить результат завершенной стадии"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stages FROM jobs WHERE task = ? AND round = ? AND nonce = ?", key
+            ).fetchone()
+            stages = json.loads(row[0]) if row else {}
+            stages[stage] = result
+            self._conn.execute(
+                "UPDATE jobs SET stages = ?, updated_at = ? WHERE task = ? AND round = ? AND nonce = ?",
+                (json.dumps(stages, ensure_ascii=False), time.time(), *key),
+            )
+            self._conn.commit()
+
+    def finish(self, key: JobKey, result: Dict):
+        self._update(key, state=STATE_DONE, result=json.dumps(result, ensure_ascii=False), error=None)
+
+    def fail(self, key: JobKey, error: str):
+        self._update(key, state=STATE_FAILED, error=error)
+
+    def unfinished(self) -> List[Dict]:
+        """Задания, прерванные остановкой процесса (в очереди или в работе)"""
+        with self._lock:
+            keys = self._conn.execute(
+                f"SELECT task, round, nonce FROM jobs WHERE state IN ({','.join('?' * len(UNFINISHED_STATES))}) "
+                "ORDER BY created_at",
+                UNFINISHED_STATES,
+            ).fetchall()
+        return [self.get(tuple(key)) for key in keys]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Общее хранилище заданий процесса"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
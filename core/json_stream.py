@@ -0,0 +1,70 @@
+"""
+Инкрементальный разбор JSON-ответа LLM: элементы массива (например, "changes")
+отдаются по одному, как только закрывается соответствующий объект.
+"""
+import json
+from typing import Any, List, Optional
+
+
+class JsonArrayStreamParser:
+    """Потоковый разбор элементов-объектов массива по ключу key в объекте верхнего уровня"""
+
+    def __init__(self, key: str = "changes"):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Добавить фрагмент текста; вернуть элементы, закрывшиеся в нем"""
+        self.text += chunk
+        items = []
+        text = self.text
+
+        while self._pos < len(text):
+            ch = text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_string = text[self._string_start + 1:self._pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch == ":" and len(self._stack) == 1:
+                self._current_key = self._last_string
+            elif ch == "," and len(self._stack) == 1:
+                self._current_key = None
+            elif ch in "{[":
+                if ch == "[" and len(self._stack) == 1 and self._array_depth is None and self._current_key == self.key:
+                    self._array_depth = len(self._stack) + 1
+                elif ch == "{" and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._item_start = self._pos
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._item_start is not None and len(self._stack) == self._array_depth:
+                    try:
+                        items.append(json.loads(text[self._item_start:self._pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                elif ch == "]" and self._array_depth is not None and len(self._stack) == self._array_depth - 1:
+                    self._array_depth = None
+
+            self._pos += 1
+
+        return items
@@ -0,0 +1,150 @@
+"""
+Постоянный кэш ответов LLM (SQLite), адресуемый по содержимому запроса:
+ключ — хэш модели, сообщений и параметров сэмплирования.
+Записи живут LLM_CACHE_TTL секунд, при переполнении вытесняются давно не использованные.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Dict, Optional
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH") or os.path.expanduser("~/.cache/coding-agent/llm-cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+
+# Параметры, не влияющие на содержимое ответа
+NON_SEMANTIC_PARAMS = ("stream", "timeout")
+
+
+class LLMCache:
+    """Кэш ответов LLM с TTL, LRU-вытеснением и статистикой попаданий"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, bypass: bool = LLM_CACHE_BYPASS):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(provider: str, request: Dict) -> str:
+        """Ключ по модели, сообщениям и параметрам сэмплирования"""
+        semantic = {k: v for k, v in request.items() if k not in NON_SEMANTIC_PARAMS}
+        payload = json.dumps({"provider": provider, "request": semantic}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, provider: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, provider, response, now, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        if stats["hits"] or stats["misses"]:
+            print(f"📊 LLM-кэш: попаданий {stats['hits']}, промахов {stats['misses']} "
+                  f"(hit rate {stats['hit_rate']:.0%})")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Общий кэш процесса (None, если SQLite-файл недоступен)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = LLMCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️ LLM-кэш недоступен: {e}")
+                return None
+        return _shared_cache
+
+
+def cached_completion(provider: str, request: Dict, compute: Callable[[], str],
+                      on_hit: Optional[Callable[[str], None]] = None,
+                      bypass: Optional[bool] = None) -> str:
+    """
+    Ответ из кэша или результат compute(). Кэшируются только успешные ответы:
+    исключение из compute() пробрасывается и ничего не записывает.
+    """
+    cache = get_llm_cache()
+    if cache is None or (cache.bypass if bypass is None else bypass):
+        return compute()
+
+    key = cache.make_key(provider, request)
+    try:
+        cached = cache.get(key)
+    except sqlite3.Error as e:
+        print(f"⚠️ Ошибка чтения LLM-кэша: {e}")
+        cached = None
+
+    if cached is not None:
+        print(f"♻️ Ответ {provider} взят из кэша")
+        if on_hit:
+            on_hit(cached)
+        return cached
+
+    response = compute()
+    try:
+        cache.put(key, provider, response)
+    except sqlite3.Error as e:
+        print(f"⚠️ Ошибка записи LLM-кэша: {e}")
+    return response
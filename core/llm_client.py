@@ -0,0 +1,238 @@
+"""
+Единый клиент LLM для DeepSeek и Gemini.
+Пул keep-alive соединений, повтор с джиттером на временных ошибках (429/5xx, таймауты),
+ограничение параллельных запросов на провайдера, гистограммы задержек и кэш ответов.
+"""
+import os
+import json
+import time
+import random
+import threading
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.llm_cache import cached_completion, get_llm_cache
+
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY") or os.getenv("DEEPSEEK_KEY")
+DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "20.0"))
+PROVIDER_CONCURRENCY = {
+    "deepseek": int(os.getenv("LLM_MAX_CONCURRENCY_DEEPSEEK", "4")),
+    "gemini": int(os.getenv("LLM_MAX_CONCURRENCY_GEMINI", "4")),
+}
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Временные ошибки google-api-core сравниваются по имени класса, чтобы не тянуть зависимость
+TRANSIENT_GEMINI_ERRORS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                           "InternalServerError", "DeadlineExceeded"}
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, float("inf"))
+
+
+class LLMAPIError(Exception):
+    """LLM API вернул код, отличный от 200"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"API error: {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными границами корзин"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def percentile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает q-й перцентиль"""
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return self.buckets[-1]
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "buckets": {f"<={bound}": count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+class LLMClient:
+    """Клиент LLM, общий для процесса"""
+
+    def __init__(self, pool_size: int = 10):
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+
+        self._limits = {name: threading.BoundedSemaphore(limit) for name, limit in PROVIDER_CONCURRENCY.items()}
+        self._histograms = {name: LatencyHistogram() for name in PROVIDER_CONCURRENCY}
+        self._gemini_models = {}
+        self._lock = threading.Lock()
+
+    def chat(self, provider: str, request: Dict, timeout: float = 60, stream: bool = False,
+             on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True) -> str:
+        """
+        Текст ответа модели. request — тело запроса провайдера
+        (для DeepSeek: model/messages/temperature/max_tokens, для Gemini: model/prompt).
+        При stream=True фрагменты текста передаются в on_delta; ответ из кэша передается одним фрагментом.
+        """
+        if provider not in self._limits:
+            raise ValueError(f"Неизвестный провайдер LLM: {provider}")
+
+        def compute():
+            return self._call_with_retries(provider, request, timeout, stream, on_delta)
+
+        def on_hit(cached):
+            if on_delta:
+                on_delta(cached)
+
+        if not use_cache:
+            return compute()
+        return cached_completion(provider, request, compute, on_hit=on_hit)
+
+    def _call_with_retries(self, provider: str, request: Dict, timeout: float, stream: bool,
+                           on_delta: Optional[Callable[[str], None]]) -> str:
+        histogram = self._histograms[provider]
+        delivered = []
+
+        def tracking_delta(delta):
+            delivered.append(True)
+            if on_delta:
+                on_delta(delta)
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            started = time.monotonic()
+            try:
+                with self._limits[provider]:
+                    if provider == "deepseek":
+                        text = self._deepseek(request, timeout, stream, tracking_delta)
+                    else:
+                        text = self._gemini(request)
+                with self._lock:
+                    histogram.observe(time.monotonic() - started)
+                return text
+            except Exception as e:
+                with self._lock:
+                    histogram.errors += 1
+                # После начала потока повтор продублировал бы уже отданные фрагменты
+                if delivered or attempt == LLM_MAX_RETRIES or not self._is_transient(e):
+                    raise
+                delay = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt))
+                if isinstance(e, LLMAPIError) and e.retry_after:
+                    delay = max(delay, e.retry_after)
+                with self._lock:
+                    histogram.retries += 1
+                print(f"⏳ {provider}: временная ошибка ({e}), повтор через {delay:.1f}с")
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        if isinstance(error, LLMAPIError):
+            return error.status_code in TRANSIENT_STATUS_CODES
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        return type(error).__name__ in TRANSIENT_GEMINI_ERRORS
+
+    def _deepseek(self, request: Dict, timeout: float, stream: bool,
+                  on_delta: Callable[[str], None]) -> str:
+        headers = {
+            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        body = {**request, "stream": True} if stream else request
+
+        with self.http.post(DEEPSEEK_API_URL, headers=headers, json=body, timeout=timeout, stream=stream) as response:
+            if response.status_code != 200:
+                raise LLMAPIError(response.status_code, _retry_after(response.headers.get("Retry-After")))
+
+            if not stream:
+                return response.json()['choices'][0]['message']['content']
+
+            parts = []
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                delta = json.loads(payload)["choices"][0].get("delta", {}).get("content") or ""
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+            return "".join(parts)
+
+    def _gemini(self, request: Dict) -> str:
+        import google.generativeai as genai
+
+        model_name = request["model"]
+        with self._lock:
+            model = self._gemini_models.get(model_name)
+            if model is None:
+                model = self._gemini_models[model_name] = genai.GenerativeModel(model_name)
+
+        response = model.generate_content(request["prompt"])
+        # prefer .text, but tolerate other shapes
+        return getattr(response, "text", None) or getattr(response, "content", None) or str(response)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+    def report(self):
+        for name, summary in self.stats().items():
+            if summary["count"] or summary["errors"]:
+                print(f"📊 LLM {name}: вызовов {summary['count']}, ошибок {summary['errors']}, "
+                      f"повторов {summary['retries']}, среднее {summary['avg']}с, "
+                      f"p50 ≤{summary['p50']}с, p95 ≤{summary['p95']}с")
+        llm_cache = get_llm_cache()
+        if llm_cache:
+            llm_cache.report()
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Общий клиент LLM процесса"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
@@ -1,20 +1,106 @@
 import os
 import json
-import requests
-from typing import Dict, List, Any
+import time
+from typing import Callable, Dict, List, Any, Optional
 
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY") or os.getenv("DEEPSEEK_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
+from core.context_packer import keyword_relevance, pack_sections
+from core.json_stream import JsonArrayStreamParser
+from core.llm_client import LLMAPIError, get_llm_client
 
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
+ANALYSIS_FILES_TOKENS = int(os.getenv("ANALYSIS_FILES_TOKENS", "1500"))
+ANALYSIS_CODE_TOKENS = int(os.getenv("ANALYSIS_CODE_TOKENS", "2000"))
+GENERATION_CODE_TOKENS = int(os.getenv("GENERATION_CODE_TOKENS", "6000"))
+RETRIEVED_CHUNKS = 20
+GENERATION_MAX_TOKENS = int(os.getenv("GENERATION_MAX_TOKENS", "4000"))
+# Полный файл (запасной путь для конфликтующих правок) может быть длиннее ответа с правками
+FULL_FILE_MAX_TOKENS = int(os.getenv("FULL_FILE_MAX_TOKENS", "8000"))
+# Сколько символов SHA показывать модели: короче — меньше шансов, что она его исказит
+BLOB_SHA_CHARS = 12
 
-def analyze_issue_with_llm(issue_title: str, issue_body: str, repo_files: List[Dict] = None) -> Dict[str, Any]:
-    """Анализ Issue с помощью LLM"""
+
+def stream_code_changes(data: Dict, timeout: int,
+                        on_change: Optional[Callable[[Dict], None]] = None, use_cache: bool = True) -> str:
+    """
+    Потоковая генерация: каждый закрывшийся элемент changes[i] передается в on_change сразу,
+    не дожидаясь конца ответа. Возвращает полный текст ответа.
+    """
+    started = time.monotonic()
+    timings = {}
+    parser = JsonArrayStreamParser("changes")
+
+    def on_delta(delta):
+        timings.setdefault("first_byte", time.monotonic() - started)
+        for change in parser.feed(delta):
+            timings.setdefault("first_change", time.monotonic() - started)
+            if on_change:
+                on_change(change)
+
+    content = get_llm_client().chat("deepseek", data, timeout=timeout, stream=True, on_delta=on_delta,
+                                    use_cache=use_cache)
+
+    total = time.monotonic() - started
+    print(f"⏱️ LLM stream: первый байт {timings.get('first_byte', 0):.1f}с, "
+          f"первый файл {timings.get('first_change', 0):.1f}с, всего {total:.1f}с")
+    return content
+
+
+def relevant_code_context(repo_index, query: str, budget_tokens: int, name: str = "Код из индекса") -> str:
+    """Релевантные запросу фрагменты кода из локального индекса, упакованные в бюджет токенов"""
+    if repo_index is None or budget_tokens <= 0:
+        return ""
+    try:
+        hits = repo_index.search(query, limit=RETRIEVED_CHUNKS)
+    except Exception as e:
+        print(f"⚠️ Ошибка поиска по индексу: {e}")
+        return ""
+    if not hits:
+        return ""
+
+    def header(hit):
+        blob = f" @ {hit['blob_sha'][:BLOB_SHA_CHARS]}" if hit.get("blob_sha") else ""
+        return f"--- {hit['path']}{blob} (строки {hit['start_line']}-{hit['end_line']}) ---"
+
+    sections = [
+        {
+            "key": f"{hit['path']}:{hit['start_line']}",
+            "text": f"{header(hit)}\n{hit['text']}\n",
+            "relevance": hit["score"],
+        }
+        for hit in hits
+    ]
+    packed = pack_sections(sections, budget_tokens, name=name)
+    # Фрагменты одного файла идут подряд и по порядку строк
+    ordered = sorted(hits, key=lambda hit: (hit["path"], hit["start_line"]))
+    return "".join(packed[key] for key in (f"{hit['path']}:{hit['start_line']}" for hit in ordered) if key in packed)
+
+
+def analyze_issue_with_llm(issue_title: str, issue_body: str, repo_files: List[Dict] = None,
+                           repo_index=None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Анализ Issue с помощью LLM; если передан repo_index, в промпт добавляется релевантный код.
+    use_cache=False — для повторных попыток: тот же промпт не должен вернуть отклоненный ответ.
+    """
 
     files_context = ""
     if repo_files:
+        issue_text = f"{issue_title} {issue_body}"
+        packed = pack_sections([
+            {
+                "key": file['path'],
+                "text": f"- {file['path']} ({file['size']} bytes)\n",
+                "relevance": keyword_relevance(file['path'], issue_text),
+                "truncatable": False,
+            }
+            for file in repo_files
+        ], ANALYSIS_FILES_TOKENS, name="Файлы для анализа")
         files_context = "Файлы в репозитории:\n"
-        for file in repo_files[:20]:
-            files_context += f"- {file['path']} ({file['size']} bytes)\n"
+        for file in repo_files:
+            files_context += packed.get(file['path'], "")
+
+    code_context = relevant_code_context(repo_index, f"{issue_title} {issue_body}", ANALYSIS_CODE_TOKENS)
+    if code_context:
+        files_context += f"\n**Релевантный код:**\n{code_context}"
 
     prompt = f"""
 Ты - опытный разработчик. Проанализируй задачу и создай план реализации.
@@ -44,11 +130,6 @@ def analyze_issue_with_llm(issue_title: str, issue_body: str, repo_files: List[D
 """
 
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
         data = {
             "model": "deepseek-chat",
             "messages": [
@@ -59,35 +140,39 @@ def analyze_issue_with_llm(issue_title: str, issue_body: str, repo_files: List[D
             "max_tokens": 2000
         }
 
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-
-            try:
-                content = content.replace('```json', '').replace('```', '').strip()
-                analysis = json.loads(content)
-                return analysis
-            except json.JSONDecodeError:
-                return {
-                    "summary": content[:200],
-                    "estimated_complexity": "средняя",
-                    "files_to_create": ["solution.py"],
-                    "files_to_modify": [],
-                    "steps": ["Создать файл solution.py"]
-                }
-        else:
-            print(f"❌ Ошибка DeepSeek API: {response.status_code}")
-            return {"error": f"API error: {response.status_code}"}
+        content = get_llm_client().chat("deepseek", data, timeout=30, use_cache=use_cache)
+
+        try:
+            content = content.replace('```json', '').replace('```', '').strip()
+            analysis = json.loads(content)
+            return analysis
+        except json.JSONDecodeError:
+            return {
+                "summary": content[:200],
+                "estimated_complexity": "средняя",
+                "files_to_create": ["solution.py"],
+                "files_to_modify": [],
+                "steps": ["Создать файл solution.py"]
+            }
 
+    except LLMAPIError as e:
+        print(f"❌ Ошибка DeepSeek API: {e.status_code}")
+        return {"error": str(e)}
     except Exception as e:
         print(f"❌ Ошибка анализа Issue: {e}")
         return {"error": str(e)}
 
 
-def generate_code_changes(issue_body: str, analysis: Dict) -> Dict[str, Any]:
-    """Генерация изменений кода на основе анализа"""
+def generate_code_changes(issue_body: str, analysis: Dict,
+                          on_change: Optional[Callable[[Dict], None]] = None,
+                          stream: bool = LLM_STREAM, repo_index=None, use_cache: bool = True) -> Dict[str, Any]:
+    """Генерация изменений кода на основе анализа; при stream=True файлы отдаются в on_change по мере генерации"""
+
+    query = " ".join(map(str, [issue_body, analysis.get("summary", ""),
+                               *analysis.get("files_to_modify", []), *analysis.get("steps", [])]))
+    code_context = relevant_code_context(repo_index, query, GENERATION_CODE_TOKENS)
+    if code_context:
+        code_context = f"\n**Существующий код (релевантные фрагменты):**\n{code_context}\n"
 
     prompt = f"""
 Ты - опытный разработчик. Создай или измени код для решения задачи.
@@ -97,19 +182,30 @@ def generate_code_changes(issue_body: str, analysis: Dict) -> Dict[str, Any]:
 
 **Анализ задачи:**
 {json.dumps(analysis, ensure_ascii=False, indent=2)}
-
+{code_context}
 **Требования:**
 1. Создай полный, рабочий код
 2. Добавь комментарии
 3. Следуй PEP8
 4. Учитывай контекст задачи
+5. Существующие файлы меняй правками (edits), а не целиком: "search" — точные строки
+   из показанного фрагмента (встречаются в файле ровно один раз), "replace" — строки на их место.
+   "base_sha" — SHA из заголовка фрагмента (после @)
+6. "new_content" (полный код) — только для новых файлов
 
 Верни ответ в формате JSON:
 {{
     "summary": "Что было сделано",
     "changes": [
         {{
-            "file_path": "путь/к/файлу.py",
+            "file_path": "путь/к/существующему_файлу.py",
+            "base_sha": "SHA из заголовка фрагмента",
+            "edits": [
+                {{"search": "строки из текущего файла", "replace": "новые строки"}}
+            ]
+        }},
+        {{
+            "file_path": "путь/к/новому_файлу.py",
             "new_content": "полный код файла"
         }}
     ]
@@ -117,11 +213,6 @@ def generate_code_changes(issue_body: str, analysis: Dict) -> Dict[str, Any]:
 """
 
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
         data = {
             "model": "deepseek-chat",
             "messages": [
@@ -129,25 +220,24 @@ def generate_code_changes(issue_body: str, analysis: Dict) -> Dict[str, Any]:
                 {"role": "user", "content": prompt}
             ],
             "temperature": 0.1,
-            "max_tokens": 4000
+            "max_tokens": GENERATION_MAX_TOKENS
         }
 
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=60)
-
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+        if stream:
+            content = stream_code_changes(data, timeout=60, on_change=on_change, use_cache=use_cache)
+        else:
+            content = get_llm_client().chat("deepseek", data, timeout=60, use_cache=use_cache)
 
-            try:
-                content = content.replace('```json', '').replace('```', '').strip()
-                code_changes = json.loads(content)
-                return code_changes
-            except json.JSONDecodeError:
-                return {
-                    "summary": "Создан базовый файл решения",
-                    "changes": [{
-                        "file_path": "solution.py",
-                        "new_content": f'''# Решение для: {issue_body[:100]}
+        try:
+            content = content.replace('```json', '').replace('```', '').strip()
+            code_changes = json.loads(content)
+            return code_changes
+        except json.JSONDecodeError:
+            return {
+                "summary": "Создан базовый файл решения",
+                "changes": [{
+                    "file_path": "solution.py",
+                    "new_content": f'''# Решение для: {issue_body[:100]}
 
 def solve_issue():
     """
@@ -158,13 +248,54 @@ def solve_issue():
 
 if __name__ == "__main__":
     result = solve_issue()
-    print(f"Результат: {result}")'''
-                    }]
-                }
-        else:
-            print(f"❌ Ошибка генерации кода: {response.status_code}")
-            return {"error": f"API error: {response.status_code}"}
+    print(f"Результат: {{result}}")'''
+                }]
+            }
 
+    except LLMAPIError as e:
+        print(f"❌ Ошибка генерации кода: {e.status_code}")
+        return {"error": str(e)}
     except Exception as e:
         print(f"❌ Ошибка генерации кода: {e}")
         return {"error": str(e)}
+
+
+def generate_full_file(issue_body: str, summary: str, file_path: str,
+                       current_content: Optional[str]) -> Optional[str]:
+    """
+    Полное содержимое одного файла — запасной путь, когда правки к нему не применились.
+    Возвращает None, если модель не ответила.
+    """
+    current = f"**Текущее содержимое {file_path}:**\n{current_content}\n" if current_content else ""
+    prompt = f"""
+Ты - опытный разработчик. Правки к файлу {file_path} не удалось применить, нужен весь файл.
+
+**Задача:**
+{issue_body}
+
+**Что должно быть сделано:**
+{summary}
+
+{current}
+Верни только полный новый код файла {file_path}, без пояснений и без markdown.
+"""
+    data = {
+        "model": "deepseek-chat",
+        "messages": [
+            {"role": "system", "content": "Ты опытный разработчик Python. Отвечай только кодом."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.1,
+        "max_tokens": FULL_FILE_MAX_TOKENS
+    }
+    try:
+        content = get_llm_client().chat("deepseek", data, timeout=120)
+    except Exception as e:
+        print(f"❌ Ошибка генерации {file_path}: {e}")
+        return None
+
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else ""
+        content = content.rsplit("```", 1)[0]
+    return content.rstrip() + "\n" if content.strip() else None
@@ -0,0 +1,130 @@
+"""
+Локальная копия целевого репозитория (checkout в GitHub Actions).
+Путь берется из REPO_PATH, GITHUB_WORKSPACE или текущего каталога;
+копия используется, только если ее origin указывает на нужный репозиторий.
+Чтение файлов и деревьев идет из объектов git, без REST API; LOCAL_REPO=0 отключает режим.
+"""
+import os
+import posixpath
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+import git
+from gitdb.exc import BadName, BadObject
+
+LOCAL_REPO_ENABLED = os.getenv("LOCAL_REPO", "1") != "0"
+
+
+def _matches_remote(repo: git.Repo, repo_full_name: str) -> bool:
+    """
+    origin указывает именно на repo_full_name: owner/repo должен идти целиком после "/" или ":"
+    (https://github.com/owner/repo, git@github.com:owner/repo), а не быть хвостом чужого имени
+    """
+    wanted = repo_full_name.lower().strip("/")
+    for remote in repo.remotes:
+        for url in remote.urls:
+            url = url.lower().rstrip("/")
+            if url.endswith(".git"):
+                url = url[:-4]
+            if url.endswith(("/" + wanted, ":" + wanted)):
+                return True
+    return False
+
+
+def find_local_checkout(repo_full_name: Optional[str] = None) -> Optional[git.Repo]:
+    """git.Repo локальной копии repo_full_name или None, если подходящей копии нет"""
+    candidates = [os.getenv("REPO_PATH"), os.getenv("GITHUB_WORKSPACE"), os.getcwd()]
+    for path in candidates:
+        if not path or not os.path.isdir(path):
+            continue
+        try:
+            repo = git.Repo(path, search_parent_directories=True)
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            continue
+        if repo.bare or not repo.head.is_valid():
+            continue
+        if repo_full_name and not _matches_remote(repo, repo_full_name):
+            continue
+        return repo
+    return None
+
+
+class LocalRepo:
+    """Чтение содержимого репозитория из локального хранилища объектов git"""
+
+    def __init__(self, repo: git.Repo):
+        self.repo = repo
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def resolve(self, ref: Optional[str] = None):
+        """Коммит по SHA, ветке или тегу (сначала origin/<ref>); LookupError, если его нет локально"""
+        candidates = [f"origin/{ref}", ref] if ref else ["HEAD"]
+        for candidate in candidates:
+            try:
+                return self.repo.commit(candidate)
+            except (BadName, BadObject, ValueError, git.GitCommandError):
+                continue
+        raise LookupError(f"ref '{ref}' отсутствует в локальной копии")
+
+    def read_file(self, path: str, ref: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """(текст, blob SHA) файла; (None, None), если файла в коммите нет"""
+        with self._lock:
+            commit = self.resolve(ref)
+            try:
+                blob = commit.tree / path
+            except KeyError:
+                return None, None
+            self.reads += 1
+            return blob.data_stream.read().decode("utf-8", errors="replace"), blob.hexsha
+
+    def read_blob(self, sha: str, max_bytes: int) -> bytes:
+        """Не больше max_bytes (+1, чтобы было видно обрезку) байт blob'а; LookupError, если его нет локально"""
+        with self._lock:
+            try:
+                stream = self.repo.odb.stream(bytes.fromhex(sha))
+            except (BadObject, BadName, ValueError) as e:
+                raise LookupError(f"blob {sha[:7]} отсутствует в локальной копии") from e
+            self.reads += 1
+            data = stream.read(max_bytes + 1)
+            # Поток читается из общего процесса git cat-file --batch: остаток нужно вычитать
+            # под блокировкой, иначе следующий запрос получит чужие байты
+            while stream.read(64 * 1024):
+                pass
+            return data
+
+    def iter_tree(self, ref: Optional[str] = None) -> Iterator[Dict]:
+        """Все файлы коммита в формате iter_repo_tree"""
+        with self._lock:
+            commit = self.resolve(ref)
+            entries = [
+                {"path": item.path, "name": posixpath.basename(item.path), "size": item.size, "sha": item.hexsha}
+                for item in commit.tree.traverse()
+                if item.type == "blob"
+            ]
+        return iter(entries)
+
+    def has_blob(self, sha: str) -> bool:
+        """Blob есть в локальной копии, а значит, и на GitHub, откуда копия получена"""
+        with self._lock:
+            try:
+                return self.repo.odb.info(bytes.fromhex(sha)).type == b"blob"
+            except (BadObject, BadName, ValueError):
+                return False
+
+
+_local_repos: Dict[str, Optional[LocalRepo]] = {}
+_local_repos_lock = threading.Lock()
+
+
+def get_local_repo(repo_full_name: str) -> Optional[LocalRepo]:
+    """Локальная копия repo_full_name (одна на процесс) или None, если режим выключен или копии нет"""
+    if not LOCAL_REPO_ENABLED:
+        return None
+    with _local_repos_lock:
+        if repo_full_name not in _local_repos:
+            repo = find_local_checkout(repo_full_name)
+            _local_repos[repo_full_name] = LocalRepo(repo) if repo is not None else None
+            if repo is not None:
+                print(f"📂 Чтение {repo_full_name} из локальной копии: {repo.working_tree_dir}")
+        return _local_repos[repo_full_name]
@@ -0,0 +1,85 @@
+"""
+Ожидание публикации GitHub Pages вместо фиксированной паузы.
+Опрашивается статус последней сборки Pages для запушенного коммита (с растущим интервалом
+и общим дедлайном); при необходимости проверяется, что pages_url уже отдает новое содержимое.
+"""
+import os
+import time
+import random
+from typing import Dict, Optional
+
+import requests
+
+from core.rate_limiter import PRIORITY_LOW
+
+PAGES_DEPLOY_DEADLINE = float(os.getenv("PAGES_DEPLOY_DEADLINE", "300"))
+PAGES_VERIFY_CONTENT = os.getenv("PAGES_VERIFY_CONTENT", "1") != "0"
+
+POLL_INITIAL_INTERVAL = 2.0
+POLL_MAX_INTERVAL = 15.0
+POLL_BACKOFF = 1.5
+
+
+class PagesBuildError(Exception):
+    """Сборка Pages для коммита завершилась ошибкой"""
+
+
+def _latest_build(session, owner: str, repo_name: str) -> Optional[Dict]:
+    # Условный запрос через HTTP-кэш: неизменившийся статус отвечает 304 и не тратит лимит
+    try:
+        return session.get_json(f"/repos/{owner}/{repo_name}/pages/builds/latest", priority=PRIORITY_LOW)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None  # Первая сборка еще не поставлена в очередь
+        raise
+
+
+def _serves_content(pages_url: str, commit_sha: str, expected_content: str) -> bool:
+    # Без авторизации: токен не должен уходить на github.io; параметр обходит кэш CDN
+    try:
+        response = requests.get(pages_url, params={"v": commit_sha[:12]}, timeout=10)
+    except requests.RequestException:
+        return False
+    return response.status_code == 200 and response.text.strip() == expected_content.strip()
+
+
+def wait_for_pages_deploy(session, owner: str, repo_name: str, commit_sha: str, pages_url: str,
+                          expected_content: Optional[str] = None,
+                          deadline: float = PAGES_DEPLOY_DEADLINE) -> Dict:
+    """
+    Ожидание, пока Pages соберет commit_sha (и, если передан expected_content, начнет его отдавать).
+    Возвращает {"ready", "status", "built_seconds", "live_seconds"}; по дедлайну ready=False.
+    """
+    started = time.monotonic()
+    give_up_at = started + deadline
+    interval = POLL_INITIAL_INTERVAL
+    result = {"ready": False, "status": "unknown", "built_seconds": None, "live_seconds": None}
+    verify = PAGES_VERIFY_CONTENT and expected_content is not None
+
+    while True:
+        if result["built_seconds"] is None:
+            build = _latest_build(session, owner, repo_name)
+            if build and build.get("commit") == commit_sha:
+                result["status"] = build.get("status", "unknown")
+                if result["status"] == "errored":
+                    message = (build.get("error") or {}).get("message") or "причина неизвестна"
+                    raise PagesBuildError(f"Сборка Pages для {commit_sha[:7]} завершилась ошибкой: {message}")
+                if result["status"] == "built":
+                    result["built_seconds"] = round(time.monotonic() - started, 1)
+                    print(f"🏗️ Pages собрал {commit_sha[:7]} за {result['built_seconds']}с")
+
+        if result["built_seconds"] is not None:
+            if not verify or _serves_content(pages_url, commit_sha, expected_content):
+                result["ready"] = True
+                result["live_seconds"] = round(time.monotonic() - started, 1)
+                print(f"✅ Pages отдает {commit_sha[:7]} через {result['live_seconds']}с")
+                return result
+
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            print(f"⚠️ Публикация {commit_sha[:7]} не подтверждена за {deadline:.0f}с "
+                  f"(последний статус: {result['status']})")
+            return result
+
+        time.sleep(min(interval * random.uniform(0.8, 1.2), remaining))
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
@@ -0,0 +1,194 @@
+"""
+Планировщик запросов к GitHub с учетом rate limit.
+Один экземпляр на токен, общий для всех потоков процесса: читает X-RateLimit-* и Retry-After,
+выдерживает темп записей (secondary limit) и пропускает записи вперед чтений.
+"""
+import os
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+from typing import Dict, Mapping, Optional
+
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_LOW = 2
+
+# GitHub рекомендует не более ~80 запросов на создание контента в минуту
+WRITES_PER_MINUTE = float(os.getenv("GITHUB_WRITES_PER_MINUTE", "60"))
+WRITE_BURST = int(os.getenv("GITHUB_WRITE_BURST", "10"))
+# Доля лимита, ниже которой чтения растягиваются до момента сброса
+LOW_BUDGET_RATIO = 0.2
+MAX_WAIT_SECONDS = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "900"))
+
+
+class RateLimitError(Exception):
+    """Лимит GitHub исчерпан, а ожидание превышает допустимое"""
+
+
+class RateLimitScheduler:
+    """Token bucket для записей + бюджет X-RateLimit-Remaining + очередь с приоритетами"""
+
+    def __init__(self, writes_per_minute: float = WRITES_PER_MINUTE, write_burst: int = WRITE_BURST):
+        self.write_rate = writes_per_minute / 60.0
+        self.write_burst = write_burst
+        self._write_tokens = float(write_burst)
+        self._last_refill = time.monotonic()
+
+        self._remaining = None
+        self._limit = None
+        self._reset_at = 0.0
+        self._blocked_until = 0.0
+        self._next_read_at = 0.0
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self.stats = {"acquired": 0, "waited_seconds": 0.0, "throttled": 0}
+
+    def acquire(self, priority: int = PRIORITY_READ):
+        """Блокирует поток, пока запрос с этим приоритетом не может быть отправлен"""
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self._delay(priority, now)
+                    if delay > MAX_WAIT_SECONDS:
+                        raise RateLimitError(f"Лимит GitHub: ожидание {delay:.0f}с превышает {MAX_WAIT_SECONDS:.0f}с")
+                    turn = self._is_turn(ticket, now)
+                    if turn and delay <= 0:
+                        self._consume(priority, now)
+                        break
+                    self._cond.wait(timeout=delay if turn else 1.0)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self.stats["acquired"] += 1
+            self.stats["waited_seconds"] += waited
+
+    def _refill(self, now: float):
+        self._write_tokens = min(self.write_burst, self._write_tokens + (now - self._last_refill) * self.write_rate)
+        self._last_refill = now
+
+    def _is_turn(self, ticket, now: float) -> bool:
+        """
+        Очередь дошла до ticket. Записи, которые ждут только token bucket записей, чтения не задерживают:
+        иначе одна запись в голове очереди блокировала бы все чтения при достаточном общем лимите.
+        """
+        writes_only_wait_for_bucket = self._write_tokens < 1 and self._shared_delay(now) <= 0
+        for ahead in sorted(self._queue):
+            if ahead == ticket:
+                return True
+            if ticket[0] != PRIORITY_WRITE and ahead[0] == PRIORITY_WRITE and writes_only_wait_for_bucket:
+                continue
+            return False
+        return False
+
+    def _shared_delay(self, now: float) -> float:
+        """Задержка, общая для всех запросов: Retry-After и исчерпанный лимит"""
+        delays = [self._blocked_until - now]
+        if self._remaining is not None and self._remaining <= 0:
+            delays.append(self._reset_at - time.time())
+        return max(delays)
+
+    def _delay(self, priority: int, now: float) -> float:
+        delays = [self._shared_delay(now)]
+
+        if priority == PRIORITY_WRITE:
+            if self._write_tokens < 1:
+                delays.append((1 - self._write_tokens) / self.write_rate)
+        else:
+            delays.append(self._next_read_at - now)
+
+        return max(delays)
+
+    def _consume(self, priority: int, now: float):
+        if self._remaining is not None:
+            self._remaining -= 1
+
+        if priority == PRIORITY_WRITE:
+            self._write_tokens -= 1
+            return
+
+        # При малом остатке равномерно распределяем чтения до момента сброса лимита
+        if self._remaining is not None and self._limit and self._remaining < self._limit * LOW_BUDGET_RATIO:
+            window = max(0.0, self._reset_at - time.time())
+            interval = window / max(1, self._remaining)
+            if priority == PRIORITY_LOW:
+                interval *= 2
+            self._next_read_at = now + interval
+
+    def update_budget(self, remaining: Optional[int], limit: Optional[int] = None, reset_at: Optional[float] = None):
+        """Обновление остатка лимита (из заголовков или из PyGithub)"""
+        with self._cond:
+            if remaining is not None and remaining >= 0:
+                self._remaining = remaining
+            if limit:
+                self._limit = limit
+            if reset_at:
+                self._reset_at = float(reset_at)
+            self._cond.notify_all()
+
+    def observe(self, status_code: int, headers: Mapping[str, str], body: str = "") -> Optional[float]:
+        """
+        Учет ответа. Возвращает задержку перед повтором, если ответ — срабатывание rate limit,
+        иначе None.
+        """
+        headers = headers or {}
+        remaining = _int_header(headers, "X-RateLimit-Remaining")
+        limit = _int_header(headers, "X-RateLimit-Limit")
+        reset_at = _int_header(headers, "X-RateLimit-Reset")
+        self.update_budget(remaining, limit, reset_at)
+
+        if status_code not in (403, 429):
+            return None
+
+        retry_after = _int_header(headers, "Retry-After")
+        if retry_after is not None:
+            delay = float(retry_after)
+        elif remaining == 0 and reset_at:
+            delay = max(1.0, reset_at - time.time())
+        elif status_code == 429 or "rate limit" in (body or "").lower():
+            # Secondary limit без Retry-After: GitHub советует ждать не меньше минуты
+            delay = 60.0
+        else:
+            return None
+
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self.stats["throttled"] += 1
+            self._cond.notify_all()
+        return delay
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+_schedulers: Dict[str, RateLimitScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(token: Optional[str]) -> RateLimitScheduler:
+    """Общий планировщик для токена"""
+    key = hashlib.sha256((token or "").encode("utf-8")).hexdigest()
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = _schedulers[key] = RateLimitScheduler()
+        return scheduler
@@ -0,0 +1,274 @@
+"""
+Локальный поисковый индекс по целевому репозиторию: BM25 по фрагментам кода и таблица символов.
+Индекс хранится в SQLite и обновляется инкрементально: переиндексируются только файлы
+из git diff между проиндексированным коммитом и HEAD.
+"""
+import os
+import re
+import math
+import time
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import git
+
+from core.github_client import SKIPPED_DIRS, filter_repo_files
+from core.local_repo import find_local_checkout
+
+REPO_INDEX_DIR = os.getenv("REPO_INDEX_DIR") or os.path.expanduser("~/.cache/coding-agent/repo-index")
+INDEXED_EXTENSIONS = ('.py', '.js', '.jsx', '.ts', '.tsx', '.go', '.java', '.rb', '.rs', '.php',
+                      '.c', '.h', '.cpp', '.cs', '.sh', '.html', '.css', '.md', '.txt', '.json',
+                      '.yml', '.yaml', '.toml', '.cfg', '.ini')
+MAX_INDEXED_FILE_BYTES = 256 * 1024
+# Границы фрагментов: новый фрагмент начинается на определении верхнего уровня
+MIN_CHUNK_LINES = 20
+MAX_CHUNK_LINES = 80
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SYMBOL_BOOST = 2.0
+
+WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]+|[а-яА-ЯёЁ]{2,}")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+SYMBOL_RE = re.compile(
+    r"^(\s*)(?:export\s+)?(?:async\s+)?(def|class|function|func)\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Термы текста: идентификаторы целиком и их части (snake_case и camelCase)"""
+    terms = []
+    for word in WORD_RE.findall(text):
+        lower = word.lower()
+        terms.append(lower)
+        parts = [part.lower() for piece in word.split("_") for part in CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+def extract_symbols(lines: List[str]) -> List[Tuple[str, str, int, bool]]:
+    """Определения (name, kind, line, top_level); строки нумеруются с 1"""
+    symbols = []
+    for number, line in enumerate(lines, 1):
+        match = SYMBOL_RE.match(line)
+        if match:
+            indent, kind, name = match.groups()
+            symbols.append((name, kind, number, not indent))
+    return symbols
+
+
+def chunk_lines(lines: List[str], symbols: List[Tuple[str, str, int, bool]]) -> Iterator[Tuple[int, int]]:
+    """Диапазоны строк фрагментов (start, end), включительно, с 1"""
+    boundaries = {line for _, _, line, top_level in symbols if top_level}
+    start = 1
+    for number in range(1, len(lines) + 1):
+        size = number - start
+        if (number in boundaries and size >= MIN_CHUNK_LINES) or size >= MAX_CHUNK_LINES:
+            yield start, number - 1
+            start = number
+    if start <= len(lines):
+        yield start, len(lines)
+
+
+class RepoIndex:
+    """Индекс одного репозитория; обновление — update(), поиск — search()"""
+
+    def __init__(self, repo: git.Repo, path: str):
+        self.repo = repo
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_path ON chunks(path);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, chunk_id INTEGER NOT NULL, tf INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings(term);
+            CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id);
+            CREATE TABLE IF NOT EXISTS symbols (
+                name TEXT NOT NULL,
+                name_lower TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                line INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS symbols_name ON symbols(name_lower);
+            CREATE INDEX IF NOT EXISTS symbols_path ON symbols(path);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, blob_sha TEXT NOT NULL);
+        """)
+        self._conn.commit()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def indexed_sha(self) -> Optional[str]:
+        return self._meta("indexed_sha")
+
+    def update(self) -> Dict:
+        """Привести индекс к HEAD; возвращает статистику обновления"""
+        started = time.monotonic()
+        commit = self.repo.head.commit
+        with self._lock:
+            indexed_sha = self.indexed_sha
+            if indexed_sha == commit.hexsha:
+                changed, mode = [], "актуален"
+            else:
+                changed = self._changed_paths(indexed_sha, commit) if indexed_sha else None
+                mode = "инкрементально" if changed is not None else "полная сборка"
+                if changed is None:
+                    self._clear()
+                    changed = [blob.path for blob in commit.tree.traverse() if blob.type == "blob"]
+                for path in changed:
+                    self._remove_file(path)
+                    self._add_file(commit, path)
+                self._set_meta("indexed_sha", commit.hexsha)
+                self._conn.commit()
+
+        stats = {"mode": mode, "files": len(changed), "seconds": round(time.monotonic() - started, 3)}
+        print(f"🗂️ Индекс репозитория ({mode}): файлов {stats['files']}, {stats['seconds']}с")
+        return stats
+
+    def _changed_paths(self, indexed_sha: str, commit) -> Optional[List[str]]:
+        """Пути, измененные после indexed_sha; None, если коммит недоступен (shallow clone, force push)"""
+        try:
+            output = self.repo.git.diff("--name-only", "--no-renames", indexed_sha, commit.hexsha)
+        except git.GitCommandError:
+            return None
+        return [line for line in output.splitlines() if line]
+
+    def _clear(self):
+        for table in ("chunks", "postings", "symbols", "files"):
+            self._conn.execute(f"DELETE FROM {table}")
+
+    def _remove_file(self, path: str):
+        self._conn.execute("DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE path = ?)", (path,))
+        self._conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        self._conn.execute("DELETE FROM symbols WHERE path = ?", (path,))
+        self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _add_file(self, commit, path: str):
+        if not any(filter_repo_files([{"path": path}], INDEXED_EXTENSIONS, SKIPPED_DIRS)):
+            return
+        try:
+            blob = commit.tree / path
+        except KeyError:
+            return  # файл удален
+        if blob.size > MAX_INDEXED_FILE_BYTES:
+            return
+        try:
+            text = blob.data_stream.read().decode("utf-8")
+        except UnicodeDecodeError:
+            return
+
+        # SHA содержимого, по которому построены фрагменты: правки модели привязываются к нему
+        self._conn.execute("INSERT OR REPLACE INTO files (path, blob_sha) VALUES (?, ?)", (path, blob.hexsha))
+        lines = text.splitlines()
+        symbols = extract_symbols(lines)
+        self._conn.executemany(
+            "INSERT INTO symbols (name, name_lower, kind, path, line) VALUES (?, ?, ?, ?, ?)",
+            [(name, name.lower(), kind, path, line) for name, kind, line, _ in symbols],
+        )
+        for start, end in chunk_lines(lines, symbols):
+            chunk = "\n".join(lines[start - 1:end])
+            # Путь тоже участвует в поиске: запросы часто упоминают модуль по имени
+            terms = Counter(tokenize(path) + tokenize(chunk))
+            cursor = self._conn.execute(
+                "INSERT INTO chunks (path, start_line, end_line, length, text) VALUES (?, ?, ?, ?, ?)",
+                (path, start, end, sum(terms.values()), chunk),
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                [(term, cursor.lastrowid, tf) for term, tf in terms.items()],
+            )
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Фрагменты, релевантные запросу, по убыванию BM25 (с бонусом за определения символов)"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            total_chunks, total_length = self._conn.execute("SELECT COUNT(*), SUM(length) FROM chunks").fetchone()
+            if not total_chunks:
+                return []
+            avg_length = total_length / total_chunks
+
+            scores = Counter()
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id "
+                    "WHERE p.term = ?", (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total_chunks - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+
+            placeholders = ",".join("?" * len(terms))
+            for (chunk_id,) in self._conn.execute(
+                f"SELECT c.id FROM symbols s JOIN chunks c ON c.path = s.path "
+                f"AND s.line BETWEEN c.start_line AND c.end_line WHERE s.name_lower IN ({placeholders})",
+                list(terms),
+            ):
+                scores[chunk_id] += SYMBOL_BOOST
+
+            results = []
+            for chunk_id, score in scores.most_common(limit):
+                path, start, end, text, blob_sha = self._conn.execute(
+                    "SELECT c.path, c.start_line, c.end_line, c.text, f.blob_sha "
+                    "FROM chunks c LEFT JOIN files f ON f.path = c.path WHERE c.id = ?", (chunk_id,)
+                ).fetchone()
+                results.append({"path": path, "start_line": start, "end_line": end,
+                                "text": text, "blob_sha": blob_sha, "score": round(score, 3)})
+            return results
+
+    def find_symbol(self, name: str) -> List[Dict]:
+        """Определения символа по имени (без учета регистра)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, kind, path, line FROM symbols WHERE name_lower = ? ORDER BY path, line",
+                (name.lower(),),
+            ).fetchall()
+        return [{"name": n, "kind": kind, "path": path, "line": line} for n, kind, path, line in rows]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_repo_index(repo_full_name: str) -> Optional[RepoIndex]:
+    """Актуальный индекс локальной копии репозитория (None, если копии нет или индекс недоступен)"""
+    with _indexes_lock:
+        if repo_full_name in _indexes:
+            return _indexes[repo_full_name]
+        index = None
+        repo = find_local_checkout(repo_full_name)
+        if repo is not None:
+            path = os.path.join(REPO_INDEX_DIR, repo_full_name.replace("/", "__") + ".sqlite3")
+            try:
+                index = RepoIndex(repo, path)
+                index.update()
+            except (OSError, sqlite3.Error, git.GitCommandError, ValueError) as e:
+                print(f"⚠️ Индекс репозитория недоступен: {e}")
+                index = None
+        _indexes[repo_full_name] = index
+        return index
@@ -0,0 +1,118 @@
+"""
+Постоянный кэш результатов ревью по файлам (SQLite).
+Ключ — (репозиторий, путь, blob SHA, версия промпта): файл с тем же содержимым повторно не ревьюится,
+поэтому повторный пуш того же дерева не стоит ни одного запроса к LLM.
+Для каждого PR запоминается последний проверенный head и резюме ревью.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH") or os.path.expanduser("~/.cache/coding-agent/review-cache.sqlite3")
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", str(30 * 24 * 3600)))
+REVIEW_CACHE_BYPASS = os.getenv("REVIEW_CACHE_BYPASS", "0") == "1"
+
+
+class ReviewCache:
+    """Находки ревью по файлам и последний проверенный head каждого PR"""
+
+    def __init__(self, path: str = REVIEW_CACHE_PATH, ttl: int = REVIEW_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS file_reviews (
+                repo TEXT NOT NULL,
+                path TEXT NOT NULL,
+                blob_sha TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                findings TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (repo, path, blob_sha, prompt_version)
+            );
+            CREATE TABLE IF NOT EXISTS pr_reviews (
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                head_sha TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                reviewed_at REAL NOT NULL,
+                PRIMARY KEY (repo, pr_number)
+            );
+        """)
+        self._conn.commit()
+
+    def get(self, repo: str, path: str, blob_sha: str, prompt_version: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT findings FROM file_reviews WHERE repo = ? AND path = ? AND blob_sha = ? "
+                "AND prompt_version = ? AND created_at >= ?",
+                (repo, path, blob_sha, prompt_version, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, repo: str, path: str, blob_sha: str, prompt_version: str, findings: Dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_reviews (repo, path, blob_sha, prompt_version, findings, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (repo, path, blob_sha, prompt_version, json.dumps(findings, ensure_ascii=False), now),
+            )
+            self._conn.execute("DELETE FROM file_reviews WHERE created_at < ?", (now - self.ttl,))
+            self._conn.commit()
+
+    def last_review(self, repo: str, pr_number: int) -> Optional[Dict]:
+        """{"head_sha", "summary", "reviewed_at"} последнего ревью PR"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT head_sha, summary, reviewed_at FROM pr_reviews WHERE repo = ? AND pr_number = ?",
+                (repo, pr_number),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"head_sha": row[0], "summary": row[1], "reviewed_at": row[2]}
+
+    def record_review(self, repo: str, pr_number: int, head_sha: str, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pr_reviews (repo, pr_number, head_sha, summary, reviewed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (repo, pr_number, head_sha, summary, time.time()),
+            )
+            self._conn.commit()
+
+    def report(self):
+        if self.hits or self.misses:
+            print(f"📊 Кэш ревью: файлов из кэша {self.hits}, на ревью {self.misses}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_review_cache() -> Optional[ReviewCache]:
+    """Общий кэш процесса (None, если отключен или SQLite-файл недоступен)"""
+    global _shared_cache
+    if REVIEW_CACHE_BYPASS:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = ReviewCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️ Кэш ревью недоступен: {e}")
+                return None
+        return _shared_cache
@@ -0,0 +1,245 @@
+"""
+Ожидание вердикта AI Reviewer по событиям вместо фиксированных пауз.
+Если задан REVIEW_WEBHOOK_PORT, поднимается локальный приемник webhook'ов
+(события reviewer_agent или GitHub pull_request_review / issue_comment);
+иначе используется опрос с экспоненциально растущим интервалом.
+"""
+import os
+import hmac
+import json
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+from core.github_client import ReviewVerdictCursor, head_from_comment, is_ai_review_comment, verdict_from_comment
+
+REVIEW_WEBHOOK_PORT = os.getenv("REVIEW_WEBHOOK_PORT")
+REVIEW_WEBHOOK_URL = os.getenv("REVIEW_WEBHOOK_URL")
+REVIEW_WEBHOOK_SECRET = os.getenv("REVIEW_WEBHOOK_SECRET")
+REVIEW_WAIT_DEADLINE = float(os.getenv("REVIEW_WAIT_DEADLINE", "600"))
+# Логины, от имени которых публикует AI Reviewer (в Actions — встроенный GITHUB_TOKEN)
+REVIEW_BOT_LOGINS = {login.strip() for login in os.getenv("REVIEW_BOT_LOGINS", "github-actions[bot]").split(",")
+                     if login.strip()}
+
+POLL_INITIAL_INTERVAL = 2.0
+POLL_MAX_INTERVAL = 30.0
+# При работающем приемнике опрос нужен только как страховка от потерянного события
+POLL_INTERVAL_WITH_WEBHOOK = 60.0
+# Запас на расхождение локальных часов и времени GitHub при фильтрации по since
+CLOCK_SKEW_SECONDS = 5.0
+
+GITHUB_REVIEW_STATES = {
+    "approved": "APPROVE",
+    "changes_requested": "REQUEST_CHANGES",
+    "commented": "COMMENT",
+}
+
+
+def same_commit(expected: Optional[str], actual: Optional[str]) -> bool:
+    """SHA совпадают (допускается сокращенная запись); неизвестный SHA события не отбрасывается"""
+    if not expected or not actual:
+        return True
+    return expected.startswith(actual) or actual.startswith(expected)
+
+
+def to_github_time(timestamp: float) -> str:
+    """Unix-время в формате created_at GitHub (для параметра since)"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ReviewEventReceiver:
+    """Локальный HTTP-приемник событий о завершении ревью"""
+
+    def __init__(self, port: int, secret: Optional[str] = REVIEW_WEBHOOK_SECRET):
+        self.port = port
+        self.secret = secret
+        # (repo, pr, head_sha) -> (время, вердикт); head_sha=None — событие без указания коммита
+        self._verdicts: Dict[Tuple[str, int, Optional[str]], Tuple[float, str]] = {}
+        self._cond = threading.Condition()
+        self._server = None
+
+    def start(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not receiver.verify_signature(body, self.headers.get("X-Hub-Signature-256")):
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                receiver.handle_event(self.headers.get("X-GitHub-Event", ""), payload)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        # Без секрета события нельзя проверить, поэтому приемник доступен только локально
+        host = "0.0.0.0" if self.secret else "127.0.0.1"
+        self._server = ThreadingHTTPServer((host, self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📡 Приемник событий ревью слушает {host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def verify_signature(self, body: bytes, signature: Optional[str]) -> bool:
+        if not self.secret:
+            return True
+        expected = "sha256=" + hmac.new(self.secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        return bool(signature) and hmac.compare_digest(expected, signature)
+
+    def handle_event(self, github_event: str, payload: Dict):
+        """Разбор события reviewer_agent или GitHub webhook (учитываются только публикации AI Reviewer)"""
+        repo = (payload.get("repository") or {}).get("full_name") or payload.get("repo")
+
+        if github_event == "pull_request_review":
+            review = payload.get("review") or {}
+            if (review.get("user") or {}).get("login") not in REVIEW_BOT_LOGINS:
+                return
+            verdict = GITHUB_REVIEW_STATES.get((review.get("state") or "").lower())
+            pr_number = (payload.get("pull_request") or {}).get("number")
+            head_sha = review.get("commit_id")
+        elif github_event == "issue_comment":
+            comment = payload.get("comment") or {}
+            body = comment.get("body") or ""
+            if payload.get("action") != "created" or not is_ai_review_comment(body):
+                return
+            if (comment.get("user") or {}).get("login") not in REVIEW_BOT_LOGINS:
+                return
+            verdict = verdict_from_comment(body)
+            pr_number = (payload.get("issue") or {}).get("number")
+            head_sha = head_from_comment(body)
+        elif github_event:
+            return  # Прочие события GitHub вердиктов не содержат
+        else:
+            verdict = payload.get("verdict")
+            pr_number = payload.get("pr_number")
+            head_sha = payload.get("head_sha")
+
+        if repo and pr_number and verdict:
+            self.record(repo, int(pr_number), verdict, head_sha)
+
+    def record(self, repo_full_name: str, pr_number: int, verdict: str, head_sha: Optional[str] = None):
+        with self._cond:
+            self._verdicts[(repo_full_name, pr_number, head_sha)] = (time.time(), verdict)
+            self._cond.notify_all()
+
+    def latest(self, repo_full_name: str, pr_number: int, since: float,
+               head_sha: Optional[str] = None) -> Optional[str]:
+        """Самый свежий вердикт, полученный не раньше since и относящийся к head_sha (если он задан)"""
+        with self._cond:
+            entries = [
+                entry for (repo, number, event_sha), entry in self._verdicts.items()
+                if repo == repo_full_name and number == pr_number and same_commit(head_sha, event_sha)
+            ]
+        entries = [entry for entry in entries if entry[0] >= since]
+        return max(entries)[1] if entries else None
+
+    def wait(self, repo_full_name: str, pr_number: int, since: float, timeout: float,
+             head_sha: Optional[str] = None) -> Optional[str]:
+        """Ожидание события для PR не дольше timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.latest(repo_full_name, pr_number, since, head_sha) is not None,
+                                timeout)
+        return self.latest(repo_full_name, pr_number, since, head_sha)
+
+
+_receiver: Optional[ReviewEventReceiver] = None
+_receiver_lock = threading.Lock()
+
+
+def start_review_receiver(port=REVIEW_WEBHOOK_PORT) -> Optional[ReviewEventReceiver]:
+    """Запуск приемника (один на процесс); None, если порт не настроен"""
+    global _receiver
+    if not port:
+        return None
+    with _receiver_lock:
+        if _receiver is None:
+            try:
+                _receiver = ReviewEventReceiver(int(port)).start()
+            except OSError as e:
+                print(f"⚠️ Не удалось запустить приемник событий ревью: {e}")
+                return None
+        return _receiver
+
+
+def publish_review_event(repo_full_name: str, pr_number: int, verdict: str, head_sha: Optional[str] = None):
+    """Сообщить ожидающим агентам, что ревью опубликовано"""
+    if _receiver is not None:
+        _receiver.record(repo_full_name, pr_number, verdict, head_sha)
+
+    if not REVIEW_WEBHOOK_URL:
+        return
+    body = json.dumps({
+        "event": "review_completed",
+        "repo": repo_full_name,
+        "pr_number": pr_number,
+        "verdict": verdict,
+        "head_sha": head_sha,
+    }).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if REVIEW_WEBHOOK_SECRET:
+        digest = hmac.new(REVIEW_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        headers["X-Hub-Signature-256"] = f"sha256={digest}"
+    try:
+        requests.post(REVIEW_WEBHOOK_URL, data=body, headers=headers, timeout=5)
+    except requests.RequestException as e:
+        print(f"⚠️ Не удалось отправить событие ревью: {e}")
+
+
+def wait_for_review_verdict(repo_full_name: str, pr_number: int, since: float,
+                            deadline: float = REVIEW_WAIT_DEADLINE,
+                            poll: Optional[Callable[[], str]] = None,
+                            head_sha: Optional[str] = None) -> str:
+    """
+    Ожидание вердикта, опубликованного после since (unix-время); если задан head_sha —
+    только вердикта для этого коммита (поздний вердикт прошлого пуша не засчитывается).
+    Возвращает APPROVE / REQUEST_CHANGES / COMMENT, либо PENDING по истечении deadline секунд.
+    """
+    receiver = _receiver
+    if poll is None:
+        since_iso = to_github_time(since - CLOCK_SKEW_SECONDS)
+        # Курсор помнит последний увиденный комментарий: каждый опрос получает только новые
+        poll = ReviewVerdictCursor(repo_full_name, pr_number, since=since_iso, head_sha=head_sha).poll
+
+    give_up_at = time.monotonic() + deadline
+    interval = POLL_INTERVAL_WITH_WEBHOOK if receiver else POLL_INITIAL_INTERVAL
+
+    while True:
+        verdict = receiver.latest(repo_full_name, pr_number, since, head_sha) if receiver else None
+        if verdict:
+            return verdict
+
+        verdict = poll()
+        if verdict != "PENDING":
+            return verdict
+
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            return "PENDING"
+
+        timeout = min(interval * random.uniform(0.8, 1.2), remaining)
+        if receiver:
+            verdict = receiver.wait(repo_full_name, pr_number, since, timeout, head_sha)
+            if verdict:
+                return verdict
+        else:
+            time.sleep(timeout)
+            interval = min(interval * 2, POLL_MAX_INTERVAL)
@@ -3,74 +3,155 @@ AI Reviewer Agent для автоматического code review.
 Запуск из GitHub Actions при создании/обновлении PR.
 """
 import os
+import re
 import sys
 import json
-import requests
-from github import Github
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.github_client import SKIPPED_DIRS, get_blob, get_file_content, get_session, review_marker
+from core.review_events import publish_review_event
+from core.llm_client import LLMAPIError, get_llm_client
+from core.context_packer import count_tokens, keyword_relevance, pack_sections
+from core.review_cache import get_review_cache
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN") or os.getenv("GH_PAT")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY") or os.getenv("DEEPSEEK_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
+REVIEW_CONTEXT_TOKENS = int(os.getenv("REVIEW_CONTEXT_TOKENS", "12000"))
+# Защита памяти от огромных файлов; в промпт попадает то, что поместится в бюджет токенов
+MAX_FILE_CHARS = 200_000
+MAX_FILE_BYTES = 200_000
+REVIEW_FETCH_WORKERS = int(os.getenv("REVIEW_FETCH_WORKERS", "8"))
+REVIEW_MAX_FILES = int(os.getenv("REVIEW_MAX_FILES", "100"))
+# Большой PR делится на части по бюджету токенов, части ревьюятся параллельно
+REVIEW_SHARD_TOKENS = int(os.getenv("REVIEW_SHARD_TOKENS", str(REVIEW_CONTEXT_TOKENS)))
+REVIEW_SHARD_WORKERS = int(os.getenv("REVIEW_SHARD_WORKERS", "4"))
+VENDORED_SUFFIXES = ('.min.js', '.min.css', '.map', '.lock', 'package-lock.json', 'pnpm-lock.yaml', '.pb.go',
+                     '_pb2.py')
+BINARY_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.ico', '.webp', '.bmp', '.pdf', '.zip', '.gz', '.tar',
+                     '.jar', '.whl', '.so', '.dll', '.exe', '.bin', '.pyc', '.woff', '.woff2', '.ttf', '.eot',
+                     '.mp3', '.mp4', '.wav', '.sqlite3', '.db')
+NOT_PACKED = "[не вошло в бюджет контекста]"
+# Меняется при любом изменении промпта ревью: старые находки из кэша перестают подходить
+REVIEW_PROMPT_VERSION = "1"
+VERDICT_SEVERITY = {"APPROVE": 0, "COMMENT": 1, "REQUEST_CHANGES": 2}
+
+
+def review_skip_reason(filename: str) -> Optional[str]:
+    """Причина не загружать файл: сторонний/сгенерированный код или бинарный формат (по пути)"""
+    lower = filename.lower()
+    if any(part in SKIPPED_DIRS for part in filename.split("/")[:-1]) or lower.endswith(VENDORED_SUFFIXES):
+        return "vendored"
+    if lower.endswith(BINARY_EXTENSIONS):
+        return "binary"
+    return None
+
+
+def _read_blob_text(session, repo_full_name: str, sha: str) -> Optional[str]:
+    """Начало blob'а как текст (не больше MAX_FILE_BYTES); None для бинарного содержимого"""
+    data, _ = get_blob(repo_full_name, sha, MAX_FILE_BYTES, session=session)
+    if data is None or b"\x00" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _read_old_text(session, repo_full_name: str, path: str, ref: str) -> str:
+    return (get_file_content(repo_full_name, path, ref=ref, session=session)[0] or "")[:MAX_FILE_BYTES]
 
 
 def get_pr_context(repo_full_name: str, pr_number: int) -> Dict:
-    """Получение контекста PR"""
-    github_client = Github(GITHUB_TOKEN)
-    repo = github_client.get_repo(repo_full_name)
-    pr = repo.get_pull(pr_number)
-
-    diff_url = pr.diff_url
-    diff_response = requests.get(diff_url)
-    diff_content = diff_response.text if diff_response.status_code == 200 else ""
+    """
+    Получение контекста PR. Blob'ы файлов берутся по SHA из списка файлов PR и читаются
+    параллельно, каждый уникальный blob — один раз и не больше MAX_FILE_BYTES.
+    Сторонний код и бинарные файлы отсекаются до загрузки.
+    """
+    session = get_session(GITHUB_TOKEN)
+    pr = session.get_json(f"/repos/{repo_full_name}/pulls/{pr_number}")
 
     issue_number = None
-    issue_content = ""
-    if pr.body:
-        import re
-        issue_match = re.search(r'Issue.*?#(\d+)', pr.body)
+    if pr.get("body"):
+        issue_match = re.search(r'Issue.*?#(\d+)', pr["body"])
         if issue_match:
             issue_number = int(issue_match.group(1))
+
+    with ThreadPoolExecutor(max_workers=REVIEW_FETCH_WORKERS) as pool:
+        issue_future = None
+        if issue_number is not None:
+            issue_future = pool.submit(session.get_json, f"/repos/{repo_full_name}/issues/{issue_number}")
+
+        files = list(session.get_paginated_json(f"/repos/{repo_full_name}/pulls/{pr_number}/files"))
+        reviewable, skipped = [], []
+        for file in files:
+            reason = review_skip_reason(file["filename"])
+            if reason:
+                skipped.append(f"{file['filename']} ({reason})")
+            else:
+                reviewable.append(file)
+
+        blobs, old_texts = {}, {}
+        if len(reviewable) > REVIEW_MAX_FILES:
+            skipped.extend(f"{file['filename']} (limit)" for file in reviewable[REVIEW_MAX_FILES:])
+            reviewable = reviewable[:REVIEW_MAX_FILES]
+
+        for file in reviewable:
+            if file["status"] != "removed" and file.get("sha"):
+                if file["sha"] not in blobs:
+                    blobs[file["sha"]] = pool.submit(_read_blob_text, session, repo_full_name, file["sha"])
+            if file.get("previous_filename"):
+                if not file.get("changes") and file.get("sha"):
+                    continue  # Переименование без изменений: старое содержимое совпадает с новым blob'ом
+                old_texts[file["filename"]] = pool.submit(
+                    _read_old_text, session, repo_full_name, file["previous_filename"], pr["base"]["sha"]
+                )
+
+        file_changes = []
+        for file in reviewable:
+            try:
+                new_content = ""
+                if file["status"] != "removed" and file.get("sha") in blobs:
+                    new_content = blobs[file["sha"]].result()
+                    if new_content is None:
+                        skipped.append(f"{file['filename']} (binary)")
+                        continue
+                old_content = ""
+                if file["filename"] in old_texts:
+                    old_content = old_texts[file["filename"]].result()
+                elif file.get("previous_filename"):
+                    old_content = new_content
+
+                file_changes.append({
+                    "filename": file["filename"],
+                    "status": file["status"],
+                    "sha": file.get("sha"),
+                    "additions": file["additions"],
+                    "deletions": file["deletions"],
+                    "patch": (file.get("patch") or "")[:MAX_FILE_CHARS],
+                    "old_content": old_content,
+                    "new_content": new_content
+                })
+            except Exception as e:
+                print(f"⚠️ Ошибка обработки файла {file['filename']}: {e}")
+
+        issue_content = ""
+        if issue_future is not None:
             try:
-                issue = repo.get_issue(issue_number)
-                issue_content = f"{issue.title}\n\n{issue.body}"
-            except:
+                issue = issue_future.result()
+                issue_content = f"{issue['title']}\n\n{issue.get('body')}"
+            except Exception:
                 issue_content = "Issue не найдена"
 
-    files = list(pr.get_files())
-    file_changes = []
-
-    for file in files[:10]:
-        try:
-            old_content = ""
-            new_content = ""
-
-            if file.previous_filename:
-                try:
-                    old_content = repo.get_contents(file.previous_filename, ref=pr.base.ref).decoded_content.decode()
-                except:
-                    pass
-
-            try:
-                new_content = repo.get_contents(file.filename, ref=pr.head.ref).decoded_content.decode()
-            except:
-                pass
-
-            file_changes.append({
-                "filename": file.filename,
-                "status": file.status,
-                "additions": file.additions,
-                "deletions": file.deletions,
-                "patch": file.patch[:1000] if file.patch else "",
-                "old_content": old_content[:2000],
-                "new_content": new_content[:2000]
-            })
-        except Exception as e:
-            print(f"⚠️ Ошибка обработки файла {file.filename}: {e}")
+    if skipped:
+        print(f"   Пропущено файлов: {len(skipped)} — {', '.join(skipped[:10])}")
 
     return {
-        "pr_title": pr.title,
-        "pr_body": pr.body or "",
-        "pr_author": pr.user.login,
+        "pr_title": pr["title"],
+        "pr_body": pr.get("body") or "",
+        "pr_author": pr["user"]["login"],
+        "head_sha": pr["head"]["sha"],
         "issue_number": issue_number,
         "issue_content": issue_content,
         "file_changes": file_changes,
@@ -78,8 +159,28 @@ def get_pr_context(repo_full_name: str, pr_number: int) -> Dict:
     }
 
 
-def analyze_pr_with_ai(pr_context: Dict) -> Dict:
-    """Анализ PR с помощью AI"""
+def analyze_pr_with_ai(pr_context: Dict, unchanged_files: Optional[List[str]] = None,
+                       other_files: Optional[List[str]] = None, stats: Optional[Dict] = None) -> Dict:
+    """
+    Анализ PR с помощью AI: {"summary", "files": [находки по каждому файлу]}.
+    unchanged_files — файлы PR, уже проверенные в прошлых ревью, other_files — файлы,
+    которые проверяются в других частях (и те и другие упоминаются только по имени).
+    В stats записываются оценки токенов промпта и ответа.
+    При ошибке возвращается готовый вердикт без "files".
+    """
+
+    # Diff важнее нового содержимого, новое — важнее старого; файлы, упомянутые в задаче, — выше
+    query = f"{pr_context['pr_title']} {pr_context['issue_content']}"
+    sections = []
+    for i, change in enumerate(pr_context["file_changes"], 1):
+        weight = keyword_relevance(change['filename'], query)
+        for part, base in (("patch", 3), ("new_content", 2), ("old_content", 1)):
+            if change[part]:
+                sections.append({"key": f"{i}:{part}", "text": change[part], "relevance": base + weight})
+    packed = pack_sections(sections, REVIEW_CONTEXT_TOKENS, name="Контекст ревью")
+
+    def section(i, change, part):
+        return packed.get(f"{i}:{part}", NOT_PACKED) if change[part] else ""
 
     file_changes_str = ""
     for i, change in enumerate(pr_context["file_changes"], 1):
@@ -89,13 +190,23 @@ def analyze_pr_with_ai(pr_context: Dict) -> Dict:
    Добавлено строк: {change['additions']}
    Удалено строк: {change['deletions']}
 
-   Старое содержимое (первые 1000 символов):
-   {change['old_content'][:1000]}
+   Изменения (diff):
+   {section(i, change, 'patch')}
 
-   Новое содержимое (первые 1000 символов):
-   {change['new_content'][:1000]}
+   Новое содержимое:
+   {section(i, change, 'new_content')}
+
+   Старое содержимое:
+   {section(i, change, 'old_content')}
    """
 
+    unchanged_str = ""
+    if unchanged_files:
+        unchanged_str = ("**Файлы PR без изменений с прошлого ревью (уже проверены):** "
+                         + ", ".join(unchanged_files) + "\n")
+    if other_files:
+        unchanged_str += "**Файлы PR, которые проверяются отдельно:** " + ", ".join(other_files) + "\n"
+
     prompt = f"""
 Ты - опытный code reviewer. Проведи анализ Pull Request.
 
@@ -109,7 +220,7 @@ def analyze_pr_with_ai(pr_context: Dict) -> Dict:
 
 **Изменения в файлах:**
 {file_changes_str}
-
+{unchanged_str}
 **Проверь следующие аспекты:**
 1. Соответствие кода требованиям Issue
 2. Качество кода (PEP8, читаемость, структура)
@@ -117,27 +228,27 @@ def analyze_pr_with_ai(pr_context: Dict) -> Dict:
 4. Полнота реализации
 5. Корректность тестов (если есть)
 
-**Критерии оценки:**
+**Критерии оценки (для каждого файла):**
 - APPROVE: код соответствует всем требованиям, нет критических замечаний
 - REQUEST_CHANGES: есть существенные проблемы, требующие исправления
 - COMMENT: есть незначительные замечания, но код в целом рабочий
 
-Верни ответ в формате JSON:
+Верни ответ в формате JSON, по элементу "files" на каждый файл из списка изменений:
 {{
-    "verdict": "APPROVE | REQUEST_CHANGES | COMMENT",
     "summary": "Краткое резюме ревью",
-    "issues_found": ["список найденных проблем"],
-    "suggestions": ["предложения по улучшению"],
-    "score": 1-10
+    "files": [
+        {{
+            "filename": "путь/к/файлу",
+            "verdict": "APPROVE | REQUEST_CHANGES | COMMENT",
+            "issues_found": ["список найденных проблем"],
+            "suggestions": ["предложения по улучшению"],
+            "score": 1-10
+        }}
+    ]
 }}
 """
 
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
         data = {
             "model": "deepseek-chat",
             "messages": [
@@ -148,35 +259,36 @@ def analyze_pr_with_ai(pr_context: Dict) -> Dict:
             "max_tokens": 3000
         }
 
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=60)
+        if stats is not None:
+            stats["prompt_tokens"] = count_tokens(prompt)
+        content = get_llm_client().chat("deepseek", data, timeout=60)
+        if stats is not None:
+            stats["response_tokens"] = count_tokens(content)
 
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-
-            try:
-                content = content.replace('```json', '').replace('```', '').strip()
-                review = json.loads(content)
-                return review
-            except json.JSONDecodeError:
-                # Фоллбэк
-                return {
-                    "verdict": "COMMENT",
-                    "summary": "Не удалось полностью проанализировать изменения",
-                    "issues_found": ["Проблема с парсингом AI-ответа"],
-                    "suggestions": ["Проверьте код вручную"],
-                    "score": 5
-                }
-        else:
-            print(f"❌ Ошибка DeepSeek API: {response.status_code}")
+        try:
+            content = content.replace('```json', '').replace('```', '').strip()
+            review = json.loads(content)
+            return review
+        except json.JSONDecodeError:
+            # Фоллбэк
             return {
                 "verdict": "COMMENT",
-                "summary": f"Ошибка AI анализа: {response.status_code}",
-                "issues_found": [],
-                "suggestions": [],
+                "summary": "Не удалось полностью проанализировать изменения",
+                "issues_found": ["Проблема с парсингом AI-ответа"],
+                "suggestions": ["Проверьте код вручную"],
                 "score": 5
             }
 
+    except LLMAPIError as e:
+        print(f"❌ Ошибка DeepSeek API: {e.status_code}")
+        return {
+            "verdict": "COMMENT",
+            "summary": f"Ошибка AI анализа: {e.status_code}",
+            "issues_found": [],
+            "suggestions": [],
+            "score": 5
+        }
+
     except Exception as e:
         print(f"❌ Ошибка анализа PR: {e}")
         return {
@@ -188,11 +300,149 @@ def analyze_pr_with_ai(pr_context: Dict) -> Dict:
         }
 
 
-def post_review_comment(repo_full_name: str, pr_number: int, review_result: Dict):
-    """Публикация результата ревью в PR"""
-    github_client = Github(GITHUB_TOKEN)
-    repo = github_client.get_repo(repo_full_name)
-    pr = repo.get_pull(pr_number)
+def review_prompt_version(pr_context: Dict) -> str:
+    """Версия промпта для ключа кэша: шаблон и текст Issue, относительно которой проверяется код"""
+    issue_hash = hashlib.sha256(pr_context["issue_content"].encode("utf-8")).hexdigest()[:12]
+    return f"{REVIEW_PROMPT_VERSION}:{issue_hash}"
+
+
+def combine_file_reviews(file_reviews: Dict[str, Dict], summary: str) -> Dict:
+    """Вердикт PR из находок по файлам: самый строгий вердикт, худшая оценка, все замечания"""
+    verdicts = [review.get("verdict") if review.get("verdict") in VERDICT_SEVERITY else "COMMENT"
+                for review in file_reviews.values()]
+    scores = [review["score"] for review in file_reviews.values() if isinstance(review.get("score"), (int, float))]
+    issues, suggestions = [], []
+    for filename, review in file_reviews.items():
+        issues.extend(f"{filename}: {issue}" for issue in review.get("issues_found") or [])
+        suggestions.extend(f"{filename}: {suggestion}" for suggestion in review.get("suggestions") or [])
+    return {
+        "verdict": max(verdicts, key=VERDICT_SEVERITY.get) if verdicts else "COMMENT",
+        "summary": summary,
+        "issues_found": list(dict.fromkeys(issues)),
+        "suggestions": list(dict.fromkeys(suggestions)),
+        "score": min(scores) if scores else 5
+    }
+
+
+def change_tokens(change: Dict) -> int:
+    """Оценка токенов файла в промпте ревью (не больше бюджета одной части: лишнее обрежет упаковщик)"""
+    tokens = sum(count_tokens(change[part]) for part in ("patch", "new_content", "old_content"))
+    return min(tokens, REVIEW_SHARD_TOKENS)
+
+
+def split_into_shards(file_changes: List[Dict], budget: int = REVIEW_SHARD_TOKENS) -> List[List[Dict]]:
+    """Группы файлов, каждая из которых помещается в бюджет токенов (файлы не делятся)"""
+    shards, current, used = [], [], 0
+    for change in file_changes:
+        tokens = change_tokens(change)
+        if current and used + tokens > budget:
+            shards.append(current)
+            current, used = [], 0
+        current.append(change)
+        used += tokens
+    if current:
+        shards.append(current)
+    return shards
+
+
+def review_shards(pr_context: Dict, shards: List[List[Dict]], unchanged_files: List[str]) -> List[Dict]:
+    """Map: параллельное ревью частей; для каждой части — ответ AI и статистика"""
+    all_files = [change["filename"] for shard in shards for change in shard]
+
+    def review_shard(index: int, shard: List[Dict]) -> Dict:
+        names = {change["filename"] for change in shard}
+        stats = {"files": len(shard)}
+        started = time.monotonic()
+        review = analyze_pr_with_ai(dict(pr_context, file_changes=shard), unchanged_files=unchanged_files,
+                                    other_files=[name for name in all_files if name not in names], stats=stats)
+        stats["seconds"] = round(time.monotonic() - started, 1)
+        print(f"   🧩 Часть {index}/{len(shards)}: файлов {stats['files']}, "
+              f"~{stats.get('prompt_tokens', 0)} ток. промпта, ~{stats.get('response_tokens', 0)} ток. ответа, "
+              f"{stats['seconds']}с")
+        return {"shard": shard, "review": review, "stats": stats}
+
+    if len(shards) == 1:
+        return [review_shard(1, shards[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(REVIEW_SHARD_WORKERS, len(shards)))) as pool:
+        futures = [pool.submit(review_shard, index, shard) for index, shard in enumerate(shards, 1)]
+        return [future.result() for future in futures]
+
+
+def reduce_summaries(summaries: List[str]) -> str:
+    """Reduce без LLM: одна часть — ее резюме, несколько — список резюме частей"""
+    summaries = list(dict.fromkeys(summary.strip() for summary in summaries if summary and summary.strip()))
+    if len(summaries) <= 1:
+        return summaries[0] if summaries else "Ревью завершено"
+    return "\n".join(f"- {summary}" for summary in summaries)
+
+
+def review_pull_request(repo_full_name: str, pr_number: int, pr_context: Dict) -> Dict:
+    """
+    Инкрементальное ревью: на AI уходят только файлы, чьих blob'ов нет в кэше ревью
+    (большой PR — частями параллельно), вердикт пересчитывается из находок из кэша и новых.
+    """
+    cache = get_review_cache()
+    version = review_prompt_version(pr_context)
+    last = cache.last_review(repo_full_name, pr_number) if cache else None
+    if last:
+        print(f"   Последний проверенный head: {last['head_sha'][:7]}")
+
+    file_reviews, fresh = {}, []
+    for change in pr_context["file_changes"]:
+        cached = None
+        if cache and change.get("sha"):
+            cached = cache.get(repo_full_name, change["filename"], change["sha"], version)
+        if cached is None:
+            fresh.append(change)
+        else:
+            file_reviews[change["filename"]] = cached
+    print(f"   Файлов из кэша ревью: {len(file_reviews)}, на ревью: {len(fresh)}")
+
+    if fresh:
+        shards = split_into_shards(fresh)
+        if len(shards) > 1:
+            print(f"   Большой PR: {len(fresh)} файлов в {len(shards)} частях")
+        results = review_shards(pr_context, shards, list(file_reviews))
+        summaries = []
+        for result in results:
+            review = result["review"]
+            items = review.get("files") if isinstance(review.get("files"), list) else []
+            by_name = {item.get("filename"): item for item in items if isinstance(item, dict)}
+            for change in result["shard"]:
+                findings = by_name.get(change["filename"])
+                if findings is None:
+                    # Модель пропустила файл или часть не проверена: не кэшируем, в следующий раз проверим снова
+                    file_reviews[change["filename"]] = {"verdict": "COMMENT",
+                                                        "issues_found": ["Файл не был проверен AI"]}
+                    continue
+                file_reviews[change["filename"]] = findings
+                if cache and change.get("sha"):
+                    cache.put(repo_full_name, change["filename"], change["sha"], version, findings)
+            summaries.append(review.get("summary"))
+
+        if len(shards) > 1:
+            stats = [result["stats"] for result in results]
+            print(f"   Части: ~{sum(s.get('prompt_tokens', 0) for s in stats)} ток. промптов, "
+                  f"~{sum(s.get('response_tokens', 0) for s in stats)} ток. ответов, "
+                  f"самая долгая {max(s['seconds'] for s in stats)}с")
+        summary = reduce_summaries(summaries)
+    else:
+        summary = last["summary"] if last else "Файлы не изменились с прошлого ревью"
+
+    result = combine_file_reviews(file_reviews, summary)
+    if cache:
+        cache.record_review(repo_full_name, pr_number, pr_context["head_sha"], summary)
+    return result
+
+
+def post_review_comment(repo_full_name: str, pr_number: int, review_result: Dict, head_sha: str):
+    """
+    Публикация результата ревью в PR. head_sha — проверенный коммит (из get_pr_context),
+    а не текущая голова PR: агент мог запушить новую версию, пока шло ревью.
+    """
+    session = get_session(GITHUB_TOKEN)
+    repo = session.get_repo(repo_full_name)
+    pr = session.call("get_pull", repo.get_pull, pr_number)
 
     emoji = "✅" if review_result["verdict"] == "APPROVE" else "⚠️" if review_result["verdict"] == "REQUEST_CHANGES" else "💬"
 
@@ -221,12 +471,13 @@ def post_review_comment(repo_full_name: str, pr_number: int, review_result: Dict
         for suggestion in review_result['suggestions'][:10]:
             comment += f"- {suggestion}\n"
 
-    comment += """
+    comment += f"""
 ---
 *Это автоматический review от AI Reviewer Agent.*
+{review_marker(review_result["verdict"], head_sha)}
 """
 
-    pr.create_issue_comment(comment)
+    session.call("create_issue_comment", pr.create_issue_comment, comment)
 
     if review_result["verdict"] == "APPROVE":
         event = "APPROVE"
@@ -235,13 +486,16 @@ def post_review_comment(repo_full_name: str, pr_number: int, review_result: Dict
     else:
         event = "COMMENT"
 
-    pr.create_review(
+    session.call(
+        "create_review",
+        pr.create_review,
         body=review_result["summary"],
         event=event,
         comments=[]
     )
 
     print(f"✅ Review опубликован. Вердикт: {review_result['verdict']}")
+    publish_review_event(repo_full_name, pr_number, review_result["verdict"], head_sha)
 
 
 def main():
@@ -276,17 +530,21 @@ def main():
     print(f"   Изменено файлов: {len(pr_context['file_changes'])}")
 
     print("🧠 Анализ изменений AI...")
-    review_result = analyze_pr_with_ai(pr_context)
+    review_result = review_pull_request(repo_full_name, pr_number, pr_context)
 
     print(f"   Вердикт: {review_result['verdict']}")
     print(f"   Оценка: {review_result.get('score', 'N/A')}/10")
 
     print("💬 Публикация review...")
-    post_review_comment(repo_full_name, pr_number, review_result)
+    post_review_comment(repo_full_name, pr_number, review_result, pr_context["head_sha"])
 
     print("=" * 50)
     print(f"✅ AI Reviewer завершил работу")
     print(f"   Результат: {review_result['verdict']}")
+    get_session(GITHUB_TOKEN).report()
+    get_llm_client().report()
+    if get_review_cache():
+        get_review_cache().report()
 
 
 if __name__ == "__main__":
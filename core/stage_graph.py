@@ -0,0 +1,134 @@
+"""
+Небольшой исполнитель графа стадий: стадия запускается, как только готовы ее зависимости,
+независимые стадии выполняются параллельно. Упавшая стадия повторяется отдельно от остальных,
+время каждой стадии записывается.
+"""
+import time
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+STAGE_RETRY_BACKOFF = 2.0
+
+
+class StageFailed(Exception):
+    """Стадия не выполнилась и после повторов"""
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(f"стадия '{stage}' завершилась ошибкой: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (),
+                 retries: int = 0, checkpoint: bool = True):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.retries = retries
+        # checkpoint=False: результат не сохраняется и стадия выполняется, только если нужна незавершенной
+        self.checkpoint = checkpoint
+
+
+class StageGraph:
+    """Граф стадий; func стадии получает словарь результатов ее зависимостей"""
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: Dict[str, Stage] = {}
+        self.timings: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (),
+            retries: int = 0, checkpoint: bool = True) -> "StageGraph":
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"стадия '{name}' зависит от неизвестной стадии '{dep}'")
+        self.stages[name] = Stage(name, func, deps, retries, checkpoint)
+        return self
+
+    def _needed(self, done: Dict[str, Any]) -> List[str]:
+        """Стадии, которые нужно выполнить (в порядке добавления, он же топологический)"""
+        needed = set()
+        for name in reversed(list(self.stages)):
+            stage = self.stages[name]
+            if name in done:
+                continue
+            dependents = [other for other in needed if name in self.stages[other].deps]
+            if stage.checkpoint or dependents:
+                needed.add(name)
+        return [name for name in self.stages if name in needed]
+
+    def _run_stage(self, stage: Stage, results: Dict[str, Any]) -> Any:
+        inputs = {dep: results[dep] for dep in stage.deps}
+        started = time.monotonic()
+        for attempt in range(1, stage.retries + 2):
+            try:
+                result = stage.func(inputs)
+                with self._lock:
+                    self.timings[stage.name] = {"seconds": round(time.monotonic() - started, 2), "attempts": attempt}
+                return result
+            except Exception as e:
+                if attempt > stage.retries:
+                    with self._lock:
+                        self.timings[stage.name] = {"seconds": round(time.monotonic() - started, 2),
+                                                    "attempts": attempt, "error": str(e)}
+                    raise StageFailed(stage.name, e) from e
+                delay = STAGE_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                print(f"⚠️ {self.name}: стадия '{stage.name}' упала ({e}), повтор через {delay:.1f}с")
+                time.sleep(delay)
+
+    def run(self, done: Optional[Dict[str, Any]] = None,
+            on_complete: Optional[Callable[[str, Any], None]] = None,
+            max_workers: int = 4) -> Dict[str, Any]:
+        """
+        Выполнить граф. done — уже готовые результаты (например, восстановленные после перезапуска);
+        on_complete(name, result) вызывается для каждой завершенной стадии с checkpoint=True.
+        При ошибке дожидается уже запущенных стадий и пробрасывает StageFailed.
+        """
+        results = dict(done or {})
+        pending = self._needed(results)
+        running = {}
+        failure = None
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name) as pool:
+            while pending or running:
+                if failure is None:
+                    for name in [n for n in pending if all(dep in results for dep in self.stages[n].deps)]:
+                        pending.remove(name)
+                        running[pool.submit(self._run_stage, self.stages[name], results)] = name
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except StageFailed as e:
+                        failure = failure or e
+                        continue
+                    if on_complete and self.stages[name].checkpoint:
+                        on_complete(name, results[name])
+
+        self.report(time.monotonic() - started)
+        if failure:
+            raise failure
+        return results
+
+    def report(self, total_seconds: float):
+        parts = []
+        for name in self.stages:
+            timing = self.timings.get(name)
+            if timing is None:
+                continue
+            part = f"{name} {timing['seconds']}с"
+            if timing["attempts"] > 1:
+                part += f" (попыток: {timing['attempts']})"
+            if "error" in timing:
+                part += " ❌"
+            parts.append(part)
+        print(f"⏱️ {self.name}: {total_seconds:.1f}с — " + (", ".join(parts) or "все стадии уже выполнены"))
@@ -0,0 +1,131 @@
+"""
+Ограниченный пул обработчиков с очередью фиксированной длины.
+Переполненная очередь отклоняет задачу сразу (backpressure), а при остановке
+пул перестает принимать задачи и дожидается уже принятых.
+"""
+import time
+import queue
+import threading
+import traceback
+from typing import Callable, Dict, Optional
+
+# Сглаживание средней длительности задачи для оценки Retry-After
+DURATION_SMOOTHING = 0.3
+DEFAULT_TASK_SECONDS = 60.0
+
+
+class PoolClosed(Exception):
+    """Пул останавливается и новые задачи не принимает"""
+
+
+class PoolSaturated(Exception):
+    """Очередь заполнена"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"очередь заполнена, повторите через {retry_after}с")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """Пул из workers потоков; задачи ждут в очереди длиной не больше queue_size"""
+
+    def __init__(self, workers: int, queue_size: int, name: str = "worker"):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._closing = False
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._avg_seconds = DEFAULT_TASK_SECONDS
+
+        # daemon: по истечении таймаута shutdown() процесс может завершиться, не дожидаясь зависшей задачи
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs):
+        """Поставить задачу в очередь; PoolClosed при остановке, PoolSaturated при переполнении"""
+        with self._lock:
+            if self._closing:
+                raise PoolClosed("пул останавливается")
+            try:
+                self._queue.put_nowait((func, args, kwargs))
+            except queue.Full:
+                self._rejected += 1
+                raise PoolSaturated(self._retry_after())
+
+    def _retry_after(self) -> int:
+        # Столько ждать, пока каждый поток разберет свою долю очереди
+        waves = (self._queue.qsize() + self._in_flight) / self.workers
+        return max(1, int(waves * self._avg_seconds))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            func, args, kwargs = item
+            with self._lock:
+                self._in_flight += 1
+            started = time.monotonic()
+            failed = False
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                failed = True
+                traceback.print_exc()
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+                    self._failed += failed
+                    self._avg_seconds += DURATION_SMOOTHING * (elapsed - self._avg_seconds)
+                self._queue.task_done()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self._queue.qsize(),
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "closing": self._closing,
+                "avg_task_seconds": round(self._avg_seconds, 1),
+            }
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Перестать принимать задачи и дождаться принятых; True, если все успели завершиться"""
+        with self._lock:
+            if self._closing:
+                return not any(thread.is_alive() for thread in self._threads)
+            self._closing = True
+        pending = self._queue.qsize() + self._in_flight
+        print(f"⏳ Остановка пула: ожидаю {pending} задач(и)")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        try:
+            for _ in self._threads:
+                # Маркеры остановки встают в конец очереди, после всех принятых задач
+                self._queue.put(None, timeout=remaining())
+        except queue.Full:
+            pass
+        for thread in self._threads:
+            thread.join(remaining())
+
+        drained = not any(thread.is_alive() for thread in self._threads)
+        print("✅ Пул остановлен" if drained else "⚠️ Пул остановлен по таймауту, часть задач не завершена")
+        return drained
@@ -1,18 +1,37 @@
 # handler.py
 import os
 import time
-import base64
 import traceback 
 import requests
-import base64
 from typing import List, Dict, Optional
-from github import Github, UnknownObjectException, ContentFile
+from github import UnknownObjectException
 import google.generativeai as genai
+from core.github_client import get_session
+from core.git_mirror import get_git_mirror
+from core.job_store import STATE_DONE, get_job_store, job_key
+from core.pages_watcher import wait_for_pages_deploy
+from core.stage_graph import StageGraph
+from core.llm_client import get_llm_client
+from core.context_packer import count_tokens, keyword_relevance, pack_sections
+from core.attachments import process_attachments
+from core.edits import EDIT_FORMAT_HELP, EditConflict, apply_search_replace, parse_search_replace
+
+GEMINI_MODEL = "models/gemini-pro-latest"
+GEMINI_CONTEXT_TOKENS = int(os.getenv("GEMINI_CONTEXT_TOKENS", "120000"))
+# Round 2+: ask Gemini for SEARCH/REPLACE edits instead of the whole rewritten file
+GEMINI_EDIT_MODE = os.getenv("GEMINI_EDIT_MODE", "1") != "0"
+# Network steps (repo, Pages, push) are retried on their own before the job fails
+STAGE_RETRIES = int(os.getenv("STAGE_RETRIES", "2"))
+
+# Jobs are keyed by (task, round, nonce): evaluator retries attach to the same job
+job_store = get_job_store()
 
 # --- 1. INITIALIZE API CLIENTS ---
 try:
     genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    github_client = Github(os.getenv('GITHUB_PAT'))
+    # One pooled session per process, shared by all request threads
+    github_session = get_session(os.getenv('GITHUB_PAT'))
+    github_client = github_session.github
     github_user = github_client.get_user()
 except Exception as e:
     print(f"Error initializing API clients: {e}")
@@ -22,54 +41,104 @@ except Exception as e:
 # PASTE THIS IN handler.py
 
 def handle_build_request(request_body):
-    """Orchestrates the process, now with special logic for Round 2."""
+    """
+    Orchestrates the process, now with special logic for Round 2.
+    Any failure, including a malformed request or a GitHub error during setup,
+    is recorded on the job (when its key can be derived) and reported.
+    """
+    task_details = request_body
+    key = None
     try:
-        task_details = request_body
+        # The session is shared by all jobs of the server; report only this job's requests
+        github_usage = github_session.snapshot()
+        key = job_key(task_details)
+        job, _ = job_store.submit(task_details)
+        if job["state"] == STATE_DONE:
+            print(f"Task {key} already completed, skipping.")
+            return job["result"]
+        job_store.start(key)
+
         print(f"Processing Task: {task_details['task']}, Round: {task_details['round']}")
-        
-        existing_code = None
+        if job["stages"]:
+            print(f"Resuming after completed steps: {', '.join(job['stages'])}")
+
+        payload = run_build_stages(task_details, key, job["stages"])
+        job_store.finish(key, payload)
+
+        print(f"✅ Successfully completed task: {task_details['task']}")
+        github_session.report(since=github_usage)
+        get_llm_client().report()
+        return payload
+
+    except Exception as e:
+        if key is not None:
+            job_store.fail(key, f"{type(e).__name__}: {e}")
+        # This will catch ANY error and print a detailed report
+        print("\n" + "="*50)
+        print("🚨 A FATAL ERROR occurred in the background thread! 🚨")
+        print(f"Error Type: {type(e).__name__}")
+        print(f"Error Details: {e}")
+        print("\n--- Full Traceback ---")
+        traceback.print_exc()
+        print("="*50 + "\n")
+
+
+def run_build_stages(task_details, key, stages):
+    """
+    The steps form a small dependency graph: repo setup and Pages enablement run while
+    Gemini is still generating. Each completed step is checkpointed in the job store under
+    (task, round, nonce), so a retried or resumed job reruns only the steps it has not done.
+    Returns the payload sent to the evaluation URL.
+    """
+    full_name = f"{github_user.login}/{task_details['task']}"
+
+    def fetch_existing_code(_):
         # --- LOGIC FOR ROUND 2 ---
         # If it's Round 2 or later, try to fetch the previous code.
-        if int(task_details['round']) > 1:
-            try:
-                repo = github_user.get_repo(task_details['task'])
-                content_file = repo.get_contents("index.html")
-                existing_code = content_file.decoded_content.decode('utf-8')
-                print("Found existing code from Round 1 to modify.")
-            except Exception as e:
-                print(f"Could not fetch existing code for Round 2, will generate from scratch. Error: {e}")
-        # --- END OF ROUND 2 LOGIC ---
-
-        # Step 1: Generate all necessary files using Gemini
-        print("Step 1: Generating code with Gemini...")
-        generated_files = generate_code_with_gemini(
+        if int(task_details['round']) <= 1:
+            return None
+        try:
+            # Incremental fetch into the local mirror; the same mirror is committed to by the push step
+            mirror = get_git_mirror(full_name, os.getenv('GITHUB_PAT'))
+            mirror.fetch()
+            existing_code = mirror.read_file("index.html")
+            if existing_code is None:
+                raise FileNotFoundError("index.html not found")
+            print("Found existing code from Round 1 to modify.")
+            return existing_code
+        except Exception as e:
+            print(f"Could not fetch existing code for Round 2, will generate from scratch. Error: {e}")
+            return None
+
+    def generate(inputs):
+        print("Generating code with Gemini...")
+        return generate_code_with_gemini(
             task_details['brief'],
             task_details.get('attachments', []),
-            existing_code  # Pass the old code (or None) to the LLM
+            inputs["existing_code"]  # Pass the old code (or None) to the LLM
         )
-        print("Step 1 complete.")
-
-        # Step 2: Create a new repo or update an existing one
-        print("Step 2: Creating/updating GitHub repo...")
-        repo_info = create_or_update_repo(
-            task_details['task'],
-            generated_files,
-            task_details['round']
+
+    def push(inputs):
+        print("Pushing files to GitHub repo...")
+        return push_round_files(inputs["repo"], inputs["generate"], task_details['round'])
+
+    def pages(inputs):
+        print("Enabling GitHub Pages...")
+        enable_github_pages(inputs["repo"]['owner'], inputs["repo"]['repo_name'])
+        return True
+
+    def deploy(inputs):
+        # IMPORTANT: Wait until Pages has built this commit and serves the new index.html
+        print("Waiting for GitHub Pages to deploy...")
+        repo_info = inputs["push"]
+        return wait_for_pages_deploy(
+            github_session, repo_info['owner'], repo_info['repo_name'], repo_info['commit_sha'],
+            pages_url_for(repo_info), expected_content=inputs["generate"].get("index.html"),
         )
-        print("Step 2 complete.")
-
-        # Step 3: Enable GitHub Pages for the repository
-        print("Step 3: Enabling GitHub Pages...")
-        enable_github_pages(repo_info['owner'], repo_info['repo_name'])
-        print("Step 3 complete.")
-        
-        # IMPORTANT: Wait for GitHub Pages to build and deploy
-        print("Waiting 20 seconds for GitHub Pages to deploy...")
-        time.sleep(20)
-
-        # Step 4: Notify the evaluation server with the results
-        print("Step 4: Notifying evaluation URL...")
-        pages_url = f"https://{repo_info['owner']}.github.io/{repo_info['repo_name']}/"
+
+    def notify(inputs):
+        print("Notifying evaluation URL...")
+        repo_info = inputs["push"]
         payload = {
             "email": task_details['email'],
             "task": task_details['task'],
@@ -77,22 +146,41 @@ def handle_build_request(request_body):
             "nonce": task_details['nonce'],
             "repo_url": repo_info['repo_url'],
             "commit_sha": repo_info['commit_sha'],
-            "pages_url": pages_url,
+            "pages_url": pages_url_for(repo_info),
         }
         notify_evaluation_url(task_details['evaluation_url'], payload)
-        print("Step 4 complete.")
-        
-        print(f"✅ Successfully completed task: {task_details['task']}")
+        return payload
+
+    graph = (
+        StageGraph(f"build {task_details['task']}#{task_details['round']}")
+        .add("existing_code", fetch_existing_code, checkpoint=False)
+        .add("repo", lambda _: ensure_repo(task_details['task']), retries=STAGE_RETRIES)
+        .add("generate", generate, deps=["existing_code"])
+        .add("pages_enabled", pages, deps=["repo"], retries=STAGE_RETRIES)
+        .add("push", push, deps=["repo", "generate"], retries=STAGE_RETRIES)
+        .add("pages", deploy, deps=["push", "pages_enabled", "generate"])
+        .add("notify", notify, deps=["push", "pages"])
+    )
+
+    results = graph.run(done=stages, on_complete=lambda name, result: job_store.save_stage(key, name, result))
+    return results["notify"]
 
-    except Exception as e:
-        # This will catch ANY error and print a detailed report
-        print("\n" + "="*50)
-        print("🚨 A FATAL ERROR occurred in the background thread! 🚨")
-        print(f"Error Type: {type(e).__name__}")
-        print(f"Error Details: {e}")
-        print("\n--- Full Traceback ---")
-        traceback.print_exc()
-        print("="*50 + "\n")
+
+def pages_url_for(repo_info):
+    return f"https://{repo_info['owner']}.github.io/{repo_info['repo_name']}/"
+
+
+def resume_unfinished_jobs(submit):
+    """Re-submit jobs that were queued or running when the process stopped."""
+    jobs = job_store.unfinished()
+    for job in jobs:
+        print(f"Resuming interrupted job: {job['task']} round {job['round']}")
+        try:
+            submit(handle_build_request, job["payload"])
+        except Exception as e:
+            # Failed jobs are picked up again when the evaluator retries the POST
+            job_store.fail(job_key(job), f"Could not resume: {e}")
+    return len(jobs)
 
 
 # --- 3. HELPER FUNCTIONS ---
@@ -111,51 +199,54 @@ def generate_code_with_gemini(brief: str,
     The function is defensive: any errors contacting the model will fall back to a minimal HTML
     file containing an error message (so the function never raises due to LLM issues).
     """
+    # Edits are applied to the full file even if the prompt only shows a budget-trimmed copy
+    original_code = existing_code
+
     # --- Process attachments ---
+    # Streamed, deduplicated and budgeted in parallel; only a bounded prefix of each text is decoded
     attachment_content = "No attachments provided."
-    if attachments:
-        content_parts = []
-        for att in attachments:
-            # Basic validation for expected keys
-            name = att.get("name", "unnamed")
-            url = att.get("url", "")
-            try:
-                header, encoded = url.split(",", 1)
-            except Exception:
-                # Malformed or missing data URL — describe as binary
-                content_parts.append(
-                    f"File name: {name}\nFile content:\n[Attachment present but could not be parsed ({name}).]"
-                )
-                continue
-
-            # Decide if file is text-like (we treat many common text MIME types as text)
-            header_lower = header.lower()
-            is_text_like = any(tok in header_lower for tok in ("text", "json", "csv", "xml", "javascript", "html"))
-            is_base64 = "base64" in header_lower
-
-            if is_text_like and is_base64:
-                # try decode as utf-8, fallback to latin1 if necessary
-                try:
-                    decoded_bytes = base64.b64decode(encoded)
-                    try:
-                        decoded_content = decoded_bytes.decode("utf-8")
-                    except UnicodeDecodeError:
-                        decoded_content = decoded_bytes.decode("latin-1")
-                    content_parts.append(
-                        f"File name: {name}\nFile content:\n```\n{decoded_content}\n```"
-                    )
-                except Exception:
-                    # If decoding fails, fall back to describing the attachment
-                    content_parts.append(
-                        f"File name: {name}\nFile content:\n[Attachment could not be decoded as text ({name}).]"
-                    )
-            else:
-                # For binary files (images, pdfs, etc.) or non-base64 text, describe them
-                content_parts.append(
-                    f"File name: {name}\nFile content:\n[Content of binary or non-text file ({name}) is attached but not displayed here.]"
-                )
-
-        attachment_content = "\n\n".join(content_parts) if content_parts else attachment_content
+    content_parts = []
+    for att in process_attachments(attachments):
+        name = att["name"]
+        if att["kind"] == "text":
+            note = "\n[Truncated: attachment exceeds the size budget.]" if att["truncated"] else ""
+            content_parts.append((
+                name, f"File name: {name}\nFile content:\n```\n{att['text']}\n```{note}"
+            ))
+        elif att["kind"] == "duplicate":
+            content_parts.append((
+                name, f"File name: {name}\nFile content:\n[Same content as attachment {att['duplicate_of']}.]"
+            ))
+        elif att["kind"] == "binary":
+            # For binary files (images, pdfs, etc.), describe them
+            content_parts.append((
+                name, f"File name: {name}\nFile content:\n[Content of binary or non-text file ({name}, "
+                      f"{att['mime']}, ~{att['size']} bytes) is attached but not displayed here.]"
+            ))
+        else:
+            # Malformed or missing data URL
+            content_parts.append((
+                name, f"File name: {name}\nFile content:\n[Attachment present but could not be parsed ({name}).]"
+            ))
+
+    # --- Fit existing code and attachments into the model's context budget ---
+    # The existing code ranks first (the model rewrites it); attachments are ranked by overlap with the brief.
+    sections = []
+    if existing_code:
+        sections.append({"key": "index.html", "text": existing_code, "relevance": 2.0})
+    for i, (name, part) in enumerate(content_parts):
+        sections.append({"key": f"{i}:{name}", "text": part, "relevance": keyword_relevance(part, brief)})
+    if sections:
+        budget = max(0, GEMINI_CONTEXT_TOKENS - count_tokens(brief, "gemini"))
+        packed = pack_sections(sections, budget, provider="gemini", name="Gemini context")
+        if existing_code:
+            existing_code = packed.get("index.html", "")
+        parts = [packed[f"{i}:{name}"] for i, (name, _) in enumerate(content_parts) if f"{i}:{name}" in packed]
+        skipped = len(content_parts) - len(parts)
+        if skipped:
+            parts.append(f"[{skipped} attachment(s) omitted: context budget exceeded.]")
+        if parts:
+            attachment_content = "\n\n".join(parts)
 
     # --- Build prompt (dynamic based on whether we're updating existing code) ---
     # We ask the model to output ONLY the raw index.html contents (no markdown/explanations).
@@ -204,20 +295,28 @@ INSTRUCTIONS:
     # --- Call the Gemini model and handle possible failures gracefully ---
     code = None
     try:
-        model = genai.GenerativeModel("models/gemini-pro-latest")
-        response = model.generate_content(prompt)
-        # prefer .text, but tolerate other shapes
-        code = getattr(response, "text", None) or getattr(response, "content", None) or str(response)
-        # Some LLM outputs may include accidental surrounding fences; strip them if present
-        if code.strip().startswith("```") and "html" in code.splitlines()[0].lower():
-            # remove first fence line and last fence if present
-            lines = code.splitlines()
-            # drop first line
-            lines = lines[1:]
-            # if final line is fence, drop it
-            if lines and lines[-1].strip().startswith("```"):
-                lines = lines[:-1]
-            code = "\n".join(lines)
+        # Edit mode: output size tracks the change, not the page; full rewrite only if the edits don't apply
+        if original_code and GEMINI_EDIT_MODE:
+            try:
+                code = edit_code_with_gemini(original_code, existing_code, brief, attachment_content)
+            except Exception as e:
+                # An API error in edit mode shouldn't replace a working page with the placeholder
+                print(f"Edit mode failed ({e}); falling back to full regeneration.")
+                code = None
+
+        if code is None:
+            # Shared client: cached model object, retries on 429/5xx, response cache for retried POSTs
+            code = get_llm_client().chat("gemini", {"model": GEMINI_MODEL, "prompt": prompt})
+            # Some LLM outputs may include accidental surrounding fences; strip them if present
+            if code.strip().startswith("```") and "html" in code.splitlines()[0].lower():
+                # remove first fence line and last fence if present
+                lines = code.splitlines()
+                # drop first line
+                lines = lines[1:]
+                # if final line is fence, drop it
+                if lines and lines[-1].strip().startswith("```"):
+                    lines = lines[:-1]
+                code = "\n".join(lines)
     except Exception as e:
         # Fail-safe: produce a minimal but valid index.html that includes an HTML comment about the error.
         safe_error_html = (
@@ -278,65 +377,100 @@ This project is licensed under the MIT License. See the LICENSE file for details
         "LICENSE": license_content,
     }
 
-def create_or_update_repo(task_name, files, round_num):
-    """Manages GitHub repository creation and file updates robustly."""
+def edit_code_with_gemini(original_code: str, shown_code: str, brief: str, attachment_content: str) -> Optional[str]:
+    """
+    Asks Gemini for SEARCH/REPLACE edits to `index.html` and applies them locally.
+    Returns the updated file, or None when the edits are missing, truncated or don't apply
+    cleanly (the caller then falls back to a full rewrite).
+    """
+    prompt = f"""
+You are an expert web developer who modifies single-file web apps.
+Change the CURRENT CODE of `index.html` to implement the NEW BRIEF while preserving ALL existing
+functionality unless the brief explicitly says to remove or replace it.
+
+--- CURRENT CODE (index.html) START ---
+{shown_code}
+--- CURRENT CODE (index.html) END ---
+
+BRIEF:
+{brief}
+
+ATTACHMENTS:
+{attachment_content}
+
+INSTRUCTIONS:
+- Return ONLY edit blocks in exactly this format, one block per change:
+{EDIT_FORMAT_HELP}
+- The SEARCH part must be whole lines copied character-for-character from the CURRENT CODE and must
+  occur exactly once in it; include a few surrounding lines if needed to make it unique.
+- Keep each block small: do not repeat unchanged parts of the file.
+- Blocks are applied in order. Do NOT return the whole file, explanations or Markdown fences.
+"""
+    response = get_llm_client().chat("gemini", {"model": GEMINI_MODEL, "prompt": prompt})
+    try:
+        edits = parse_search_replace(response)
+        if not edits:
+            raise EditConflict("no edit blocks in the response")
+        code = apply_search_replace(original_code, edits)
+    except EditConflict as e:
+        print(f"Edit mode failed ({e}); falling back to full regeneration.")
+        return None
+
+    # Verify the result is still a complete page before trusting it
+    lowered = code.lower()
+    if "<html" in original_code.lower() and ("<html" not in lowered or "</html>" not in lowered):
+        print("Edited file is no longer a complete HTML document; falling back to full regeneration.")
+        return None
+
+    print(f"Applied {len(edits)} edit(s): {len(response)} chars generated for a {len(code)}-char file.")
+    return code
+
+
+def ensure_repo(task_name):
+    """Returns the task repo, creating it if needed."""
     repo_name = task_name
-    is_new_repo = False # A flag to track if we just created the repo
+
+    full_name = f"{github_user.login}/{repo_name}"
 
     try:
-        repo = github_user.get_repo(repo_name)
-        print(f"Repo '{repo_name}' already exists. Updating files.")
+        repo = github_session.get_repo(full_name)
+        print(f"Repo '{repo_name}' already exists.")
     except UnknownObjectException:
         print(f"Repo '{repo_name}' not found. Creating a new public repo.")
-        repo = github_user.create_repo(repo_name, private=False)
-        is_new_repo = True # Set the flag to true since we just made it
+        # auto_init creates 'main' right away, so Pages can be enabled while code is still generating
+        repo = github_session.call("create_repo", github_user.create_repo, repo_name, private=False, auto_init=True)
+        github_session.remember_repo(repo, full_name)
 
-    commit_message = f"feat: Round {round_num} update"
-    
-    # --- THIS IS THE FIX ---
-    # For a brand new repo, we MUST create the first file to initialize the main branch.
-    # We can't update a file that doesn't exist yet.
-    if is_new_repo:
-        first_file_path = list(files.keys())[0]
-        first_file_content = files.pop(first_file_path) # Remove it from the dictionary
-        print(f"Creating initial file: {first_file_path}")
-        repo.create_file(first_file_path, f"{commit_message} for {first_file_path}", first_file_content)
-
-    # Now, update the rest of the files (or all of them if the repo wasn't new)
-    for path, content in files.items():
-        try:
-            existing_file = repo.get_contents(path)
-            print(f"Updating existing file: {path}")
-            repo.update_file(path, f"{commit_message} for {path}", content, existing_file.sha)
-        except UnknownObjectException:
-            print(f"Creating new file: {path}")
-            repo.create_file(path, f"{commit_message} for {path}", content)
-    # --- END OF FIX ---
-
-    latest_commit_sha = repo.get_branch('main').commit.sha
-    print(f"Pushed files to repo. Commit SHA: {latest_commit_sha}")
-    
     return {
         "owner": github_user.login,
         "repo_name": repo_name,
         "repo_url": repo.html_url,
-        "commit_sha": latest_commit_sha,
     }
 
+def push_round_files(repo_info, files, round_num):
+    """Pushes all files of the round as one commit."""
+    full_name = f"{repo_info['owner']}/{repo_info['repo_name']}"
+    commit_message = f"feat: Round {round_num} update"
+
+    # All files of the round go out as one local commit and a single push through the mirror
+    mirror = get_git_mirror(full_name, os.getenv('GITHUB_PAT'))
+    latest_commit_sha = mirror.commit_and_push(
+        files, commit_message,
+        author_name=github_user.login,
+        author_email=f"{github_user.login}@users.noreply.github.com",
+    )
+    github_session.invalidate_branch(full_name, 'main')
+    print(f"Pushed {len(files)} files to repo in one commit. Commit SHA: {latest_commit_sha}")
+    
+    return {**repo_info, "commit_sha": latest_commit_sha}
+
 def enable_github_pages(owner, repo_name):
     """Activates the GitHub Pages site for the repo."""
-    # --- THIS IS THE FIX ---
-    # The URL must be a clean f-string without any markdown formatting.
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/pages"
-    # --- END OF FIX ---
-
-    headers = {
-        "Authorization": f"token {os.getenv('GITHUB_PAT')}",
-        "Accept": "application/vnd.github.v3+json",
-    }
+    # Goes through the shared session: pooled connection, same token and request accounting
+    url = f"/repos/{owner}/{repo_name}/pages"
     payload = {"source": {"branch": "main", "path": "/"}}
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = github_session.request("POST", url, json=payload)
 
     if 200 <= response.status_code < 300:
         print(f"Successfully enabled GitHub Pages for {owner}/{repo_name}")
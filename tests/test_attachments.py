@@ -0,0 +1,45 @@
+import base64
+
+from core.attachments import CHUNK_CHARS, content_key, process_attachments
+
+
+def data_url(payload: bytes, mime="text/plain"):
+    return f"data:{mime};base64,{base64.b64encode(payload).decode('ascii')}"
+
+
+def test_content_key_distinguishes_non_ascii_urls():
+    assert content_key("data:,привет") != content_key("data:,пока")
+    assert content_key("data:,привет") == content_key("data:,привет")
+
+
+def test_content_key_covers_every_chunk_of_long_urls():
+    url = "data:," + "ж" * (CHUNK_CHARS * 2 + 5)
+    assert content_key(url) != content_key(url[:-1])
+
+
+def test_text_is_decoded_and_duplicates_are_processed_once():
+    text = "строка с кириллицей\n" * 10
+    results = process_attachments([
+        {"name": "a.txt", "url": data_url(text.encode("utf-8"))},
+        {"name": "copy.txt", "url": data_url(text.encode("utf-8"))},
+        {"name": "plain.txt", "url": "data:,hello%20world"},
+    ])
+
+    assert [r["kind"] for r in results] == ["text", "duplicate", "text"]
+    assert results[0]["text"] == text
+    assert results[1]["duplicate_of"] == "a.txt"
+    assert results[2]["text"] == "hello world"
+
+
+def test_binary_and_invalid_attachments_have_no_text():
+    results = process_attachments([
+        {"name": "image.png", "url": data_url(b"\x89PNG\r\n\x1a\n" + bytes(100), "image/png")},
+        {"name": "broken", "url": "https://example.com/file"},
+    ])
+    assert [(r["kind"], r["text"]) for r in results] == [("binary", None), ("invalid", None)]
+
+
+def test_byte_budget_truncates_text():
+    results = process_attachments([{"name": "big.txt", "url": data_url(b"x" * 10000)}], max_bytes=1000)
+    assert results[0]["truncated"]
+    assert len(results[0]["text"]) == 1000
@@ -0,0 +1,69 @@
+import base64
+
+from core.changeset import commit_changeset, git_blob_sha
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=201):
+        self._data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeGitHub:
+    """Ветка с деревом: run.sh (исполняемый), README.md, scripts/tool (исполняемый)"""
+
+    TREES = {
+        "root": [
+            {"path": "run.sh", "mode": "100755", "type": "blob", "sha": "1"},
+            {"path": "README.md", "mode": "100644", "type": "blob", "sha": "2"},
+            {"path": "scripts", "mode": "040000", "type": "tree", "sha": "scripts-tree"},
+        ],
+        "scripts-tree": [{"path": "tool", "mode": "100755", "type": "blob", "sha": "3"}],
+    }
+
+    def __init__(self):
+        self.posted_trees = []
+        self.tree_reads = []
+
+    def get_json(self, path, params=None):
+        if path.endswith("/branches/main"):
+            return {"commit": {"sha": "head", "commit": {"tree": {"sha": "root"}}}}
+        sha = path.rsplit("/", 1)[-1]
+        self.tree_reads.append(sha)
+        return {"tree": self.TREES[sha]}
+
+    def request(self, method, path, json=None):
+        if path.endswith("/git/blobs"):
+            return FakeResponse({"sha": git_blob_sha(base64.b64decode(json["content"]))})
+        if path.endswith("/git/trees"):
+            self.posted_trees.append(json["tree"])
+            return FakeResponse({"sha": "new-tree"})
+        if path.endswith("/git/commits"):
+            return FakeResponse({"sha": "new-commit"})
+        return FakeResponse({}, status_code=200)
+
+
+def test_existing_files_keep_their_mode():
+    github = FakeGitHub()
+    files = {"run.sh": "#!/bin/sh\necho hi\n", "README.md": "docs\n", "scripts/tool": "#!/bin/sh\n",
+             "new.py": "print(1)\n", "other/new.sh": "#!/bin/sh\n"}
+
+    assert commit_changeset(github, "o/r", "main", files, "msg") == "new-commit"
+
+    modes = {entry["path"]: entry["mode"] for entry in github.posted_trees[0]}
+    assert modes == {"run.sh": "100755", "README.md": "100644", "scripts/tool": "100755",
+                     "new.py": "100644", "other/new.sh": "100644"}
+    # Читаются только каталоги изменённых файлов, каждый один раз
+    assert github.tree_reads == ["root", "scripts-tree"]
+
+
+def test_deleted_files_are_sent_without_blob():
+    github = FakeGitHub()
+    commit_changeset(github, "o/r", "main", {"run.sh": None}, "msg")
+    assert github.posted_trees[0] == [{"path": "run.sh", "mode": "100755", "type": "blob", "sha": None}]
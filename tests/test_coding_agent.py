@@ -0,0 +1,67 @@
+import importlib
+
+import pytest
+
+from core.changeset import git_blob_sha
+
+CURRENT = "def total(items):\n    return sum(items)\n\nx = 1\nx = 1\n"
+CURRENT_SHA = git_blob_sha(CURRENT.encode("utf-8"))
+
+
+@pytest.fixture(scope="module")
+def coding_agent():
+    # Скрипт завершает процесс при импорте, если токены не заданы
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("GH_PAT", "test-github-token")
+        env.setenv("DEEPSEEK_API_KEY", "test-deepseek-key")
+        return importlib.import_module("coding_agent")
+
+
+@pytest.fixture
+def repo(coding_agent, monkeypatch):
+    """Файл app.py в ветке и LLM, который на запрос полного файла отвечает FULL"""
+    regenerated = []
+    monkeypatch.setattr(coding_agent, "get_file_content", lambda *args, **kwargs: (CURRENT, CURRENT_SHA))
+
+    def full_file(issue_body, summary, file_path, current_content):
+        regenerated.append(file_path)
+        return "FULL\n"
+
+    monkeypatch.setattr(coding_agent, "generate_full_file", full_file)
+    return regenerated
+
+
+def edit(search, replace, base_sha=CURRENT_SHA[:12]):
+    return {"file_path": "app.py", "base_sha": base_sha, "edits": [{"search": search, "replace": replace}]}
+
+
+def test_edits_apply_to_the_known_blob(coding_agent, repo):
+    change = edit("    return sum(items)\n", "    return sum(items, 0)\n")
+    assert coding_agent.apply_llm_edits("o/r", change) == CURRENT.replace("sum(items)", "sum(items, 0)")
+    assert repo == []
+
+
+def test_base_sha_mismatch_falls_back_to_the_full_file(coding_agent, repo):
+    change = edit("    return sum(items)\n", "    return 0\n", base_sha="0123456789ab")
+    assert coding_agent.apply_llm_edits("o/r", change) == "FULL\n"
+    assert repo == ["app.py"]
+
+
+def test_non_unique_search_falls_back_to_the_full_file(coding_agent, repo):
+    assert coding_agent.apply_llm_edits("o/r", edit("x = 1\n", "x = 2\n")) == "FULL\n"
+    assert repo == ["app.py"]
+
+
+def test_trailing_newline_is_preserved(coding_agent, repo):
+    result = coding_agent.apply_llm_edits("o/r", edit("def total(items):\n", "def total(items, start=0):"))
+    assert result.startswith("def total(items, start=0):\n    return sum(items)\n")
+
+
+def test_files_without_applicable_edits_are_left_alone(coding_agent, repo):
+    response = {"summary": "s", "changes": [
+        {"file_path": "app.py", "edits": []},
+        dict(edit("    return sum(items)\n", "    return 0\n"), file_path="app.py"),
+        {"file_path": "new.py", "new_content": "print(1)\n"},
+    ]}
+    files = coding_agent.prepare_files_from_llm_response(response, 1, "o/r")
+    assert files == {"app.py": CURRENT.replace("sum(items)", "0"), "new.py": "print(1)\n"}
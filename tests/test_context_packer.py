@@ -0,0 +1,52 @@
+from core.context_packer import ContextPacker, count_tokens, keyword_relevance, pack_sections
+
+
+def test_cyrillic_costs_more_tokens_than_ascii():
+    assert count_tokens("") == 0
+    assert count_tokens("привет мир" * 10) > count_tokens("hello mir!" * 10)
+
+
+def test_keyword_relevance():
+    assert keyword_relevance("def parse_config(path)", "parse_config path") == 1.0
+    assert keyword_relevance("anything", "") == 0.0
+
+
+def test_most_relevant_sections_fill_the_budget_first():
+    packer = ContextPacker(100)
+    packer.add("low", "a" * 200, relevance=0.1, truncatable=False)
+    packer.add("high", "b" * 200, relevance=0.9, truncatable=False)
+    packed = packer.pack()
+
+    assert list(packed) == ["high"]
+    assert [s["key"] for s in packer.dropped] == ["low"]
+    assert packer.used_tokens == count_tokens("b" * 200) <= packer.budget
+
+
+def test_large_sections_are_truncated_within_the_budget():
+    text = "\n".join(f"line {i}: some code here" for i in range(500))
+    packer = ContextPacker(300)
+    packer.add("file", text)
+    packed = packer.pack()
+
+    assert packed["file"].startswith("line 0:")
+    assert "[обрезано:" in packed["file"]
+    assert packer.truncated[0]["original_tokens"] == count_tokens(text)
+    assert packer.used_tokens <= 300
+
+
+def test_sections_are_not_truncated_below_min_tokens():
+    packer = ContextPacker(100)
+    packer.add("first", "a" * 170, relevance=1.0)
+    packer.add("second", "b" * 3000, relevance=0.5, min_tokens=64)
+    packed = packer.pack()
+
+    # После первой секции остается меньше min_tokens — вторая не обрезается, а отбрасывается
+    assert list(packed) == ["first"]
+    assert [s["key"] for s in packer.dropped] == ["second"]
+    assert packer.truncated == []
+
+
+def test_pack_sections_keeps_everything_that_fits(capsys):
+    sections = [{"key": "a", "text": "short"}, {"key": "b", "text": "also short", "relevance": 0.2}]
+    assert pack_sections(sections, 1000, name="тест") == {"a": "short", "b": "also short"}
+    assert "тест" in capsys.readouterr().out
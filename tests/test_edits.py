@@ -0,0 +1,60 @@
+import pytest
+
+from core.edits import EditConflict, apply_search_replace, parse_search_replace
+
+SOURCE = """def add(a, b):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
+"""
+
+
+def test_parse_ignores_text_outside_blocks():
+    text = (
+        "Меняем sub:\n"
+        "<<<<<<< SEARCH\n"
+        "    return a - b\n"
+        "=======\n"
+        "    return b - a\n"
+        ">>>>>>> REPLACE\n"
+        "готово\n"
+    )
+    assert parse_search_replace(text) == [("    return a - b\n", "    return b - a\n")]
+
+
+def test_parse_rejects_unclosed_block():
+    with pytest.raises(EditConflict):
+        parse_search_replace("<<<<<<< SEARCH\nx = 1\n=======\nx = 2\n")
+
+
+def test_edits_are_applied_in_order():
+    edits = [("def add(a, b):\n", "def plus(a, b):\n"), ("    return a - b\n", "    return b - a\n")]
+    assert apply_search_replace(SOURCE, edits) == SOURCE.replace("def add", "def plus").replace("a - b", "b - a")
+
+
+def test_ambiguous_search_is_a_conflict():
+    with pytest.raises(EditConflict):
+        apply_search_replace("x = 1\nx = 1\n", [("x = 1\n", "x = 2\n")])
+
+
+def test_missing_search_is_a_conflict():
+    with pytest.raises(EditConflict):
+        apply_search_replace(SOURCE, [("    return a * b\n", "    return 0\n")])
+
+
+def test_empty_search_is_a_conflict():
+    with pytest.raises(EditConflict):
+        apply_search_replace(SOURCE, [("\n", "x = 1\n")])
+
+
+def test_search_only_matches_whole_lines():
+    # "a + b" есть внутри строки, но фрагмент SEARCH — это целые строки
+    with pytest.raises(EditConflict):
+        apply_search_replace(SOURCE, [("a + b\n", "a * b\n")])
+
+
+def test_indentation_mismatch_is_tolerated():
+    result = apply_search_replace(SOURCE, [("return a + b", "    return b + a")])
+    assert "    return b + a\n\n\ndef sub" in result
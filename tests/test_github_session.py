@@ -0,0 +1,24 @@
+from core.github_client import GitHubSession
+from core.http_cache import HttpCache
+
+
+def test_report_since_snapshot_counts_only_later_requests(tmp_path, capsys):
+    session = GitHubSession("test-token", cache=HttpCache(str(tmp_path)))
+    session._count("api:get_repo")
+    session._count("reused:repo")
+    session._observe_rate(5000)
+    session.cache.record_miss()
+
+    before = session.snapshot()
+    session._count("api:get_repo")
+    session._count("http:GET")
+    session._observe_rate(4990)
+    session.cache.record_hit("missing-key")
+
+    job = session.report(since=before)
+    assert (job["requests"], job["reused"], job["rate_limit_used"]) == (2, 0, 10)
+    assert (job["http_cache"]["hits"], job["http_cache"]["misses"], job["http_cache"]["hit_rate"]) == (1, 0, 1.0)
+    assert "запросов 2" in capsys.readouterr().out
+
+    total = session.report()
+    assert (total["requests"], total["reused"]) == (3, 1)
@@ -0,0 +1,51 @@
+import pytest
+
+import handler
+
+PAGE = "<!doctype html>\n<html>\n<body>\n<h1>Old title</h1>\n</body>\n</html>\n"
+
+
+class FakeClient:
+    """Ответы Gemini: edit_reply — на запрос правок, full_reply — на полную генерацию"""
+
+    def __init__(self, edit_reply, full_reply):
+        self.edit_reply = edit_reply
+        self.full_reply = full_reply
+        self.prompts = []
+
+    def chat(self, provider, payload):
+        self.prompts.append(payload["prompt"])
+        reply = self.edit_reply if "SEARCH" in payload["prompt"] else self.full_reply
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(edit_reply, full_reply):
+        fake = FakeClient(edit_reply, full_reply)
+        monkeypatch.setattr(handler, "get_llm_client", lambda: fake)
+        return fake
+    return install
+
+
+def test_edits_are_applied_to_the_existing_page(client):
+    fake = client("<<<<<<< SEARCH\n<h1>Old title</h1>\n=======\n<h1>New title</h1>\n>>>>>>> REPLACE\n",
+                  RuntimeError("full rewrite must not be requested"))
+    files = handler.generate_code_with_gemini("Rename the title", existing_code=PAGE)
+    assert files["index.html"] == PAGE.replace("Old title", "New title")
+    assert len(fake.prompts) == 1
+
+
+def test_edit_api_error_falls_back_to_full_generation(client):
+    client(RuntimeError("503 from Gemini"), "<!doctype html><html><body>rewritten</body></html>")
+    files = handler.generate_code_with_gemini("Rename the title", existing_code=PAGE)
+    assert "rewritten" in files["index.html"]
+
+
+def test_placeholder_only_when_the_fallback_also_fails(client):
+    client(RuntimeError("503 from Gemini"), RuntimeError("still down"))
+    files = handler.generate_code_with_gemini("Rename the title", existing_code=PAGE)
+    assert "Auto-generation failed" in files["index.html"]
+    assert "still down" in files["index.html"]
@@ -0,0 +1,64 @@
+import os
+
+from core.http_cache import HttpCache
+
+
+class FakeResponse:
+    def __init__(self, text, headers):
+        self.text = text
+        self.headers = headers
+
+
+def test_entry_round_trip_and_conditional_headers(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=1024 * 1024)
+    key = cache.make_key("https://api.github.com/repos/o/r", "token-a")
+    cache.put(key, "https://api.github.com/repos/o/r",
+              FakeResponse('{"id": 1}', {"ETag": 'W/"abc"', "Last-Modified": "Mon", "Link": "<next>"}))
+
+    entry = cache.get(key)
+    assert entry["body"] == '{"id": 1}'
+    assert entry["link"] == "<next>"
+    assert cache.conditional_headers(entry) == {"If-None-Match": 'W/"abc"', "If-Modified-Since": "Mon"}
+
+
+def test_keys_depend_on_identity():
+    assert HttpCache.make_key("https://x", "token-a") != HttpCache.make_key("https://x", "token-b")
+
+
+def test_responses_without_validators_are_not_stored(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    key = cache.make_key("https://x")
+    cache.put(key, "https://x", FakeResponse("{}", {}))
+    assert cache.get(key) is None
+    assert cache.conditional_headers(None) == {}
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    key = cache.make_key("https://x")
+    cache.put(key, "https://x", FakeResponse("{}", {"ETag": '"1"'}))
+    cache.record_hit(key)
+    cache.record_miss()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    body = "x" * 400
+    cache = HttpCache(str(tmp_path), max_bytes=10 ** 6)
+    keys = [cache.make_key(f"https://x/{i}") for i in range(4)]
+    for age, key in enumerate(keys):
+        cache.put(key, key, FakeResponse(body, {"ETag": '"1"'}))
+        # Явные mtime, чтобы порядок LRU не зависел от точности часов файловой системы
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    os.utime(cache._path(keys[0]), (2000, 2000))
+    # Пятая запись переполняет кэш; до 90% лимита освобождают две самые старые
+    cache.max_bytes = cache.stats()["bytes"] + 10
+
+    new_key = cache.make_key("https://x/new")
+    cache.put(new_key, new_key, FakeResponse(body, {"ETag": '"1"'}))
+
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+    assert all(cache.get(key) is not None for key in (keys[0], keys[3], new_key))
+    assert cache.stats()["bytes"] <= cache.max_bytes * 0.9
+    assert cache.stats()["evictions"] == 2
@@ -0,0 +1,60 @@
+import pytest
+
+from core.job_store import STATE_DONE, STATE_FAILED, STATE_QUEUED, STATE_RUNNING, JobStore, job_key
+
+REQUEST = {"task": "t1", "round": 1, "nonce": "n1", "brief": "Build a page", "secret": "s3cr3t"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_resubmitting_the_same_job_is_a_no_op(store):
+    job, should_run = store.submit(REQUEST)
+    assert should_run and job["state"] == STATE_QUEUED
+    assert "secret" not in job["payload"]
+
+    store.start(job_key(REQUEST))
+    store.save_stage(job_key(REQUEST), "repo", {"name": "t1"})
+    job, should_run = store.submit(dict(REQUEST, brief="changed"))
+    assert not should_run
+    assert (job["state"], job["attempts"], job["stages"]) == (STATE_RUNNING, 1, {"repo": {"name": "t1"}})
+    assert job["payload"]["brief"] == "Build a page"
+
+    store.finish(job_key(REQUEST), {"pages_url": "https://example.com"})
+    job, should_run = store.submit(REQUEST)
+    assert not should_run
+    assert job["state"] == STATE_DONE and job["result"] == {"pages_url": "https://example.com"}
+
+
+def test_failed_job_can_be_resubmitted(store):
+    store.submit(REQUEST)
+    store.start(job_key(REQUEST))
+    store.save_stage(job_key(REQUEST), "repo", {"name": "t1"})
+    store.fail(job_key(REQUEST), "GitHub 502")
+    assert store.get(job_key(REQUEST))["state"] == STATE_FAILED
+
+    job, should_run = store.submit(REQUEST)
+    assert should_run
+    assert (job["state"], job["error"]) == (STATE_QUEUED, None)
+    # Завершенные стадии сохраняются для повторного запуска
+    assert job["stages"] == {"repo": {"name": "t1"}}
+
+
+def test_restart_resumes_queued_and_running_jobs(store):
+    for nonce in ("queued", "running", "done", "failed"):
+        store.submit(dict(REQUEST, nonce=nonce))
+    store.start(("t1", "1", "running"))
+    store.finish(("t1", "1", "done"), {})
+    store.fail(("t1", "1", "failed"), "boom")
+
+    restarted = JobStore(store.path)
+    assert [job["nonce"] for job in restarted.unfinished()] == ["queued", "running"]
+    assert restarted.unfinished()[0]["payload"]["brief"] == "Build a page"
+
+
+def test_different_round_or_nonce_is_a_new_job(store):
+    store.submit(REQUEST)
+    assert store.submit(dict(REQUEST, round=2))[1]
+    assert store.submit(dict(REQUEST, nonce="n2"))[1]
@@ -0,0 +1,36 @@
+import json
+
+from core.json_stream import JsonArrayStreamParser
+
+
+def feed_in_chunks(text, size):
+    parser = JsonArrayStreamParser("changes")
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+def test_items_are_emitted_as_they_close():
+    parser = JsonArrayStreamParser("changes")
+    assert parser.feed('{"summary": "s", "changes": [{"file_path": "a.py"}') == [{"file_path": "a.py"}]
+    assert parser.feed(', {"file_path": "b.py"') == []
+    assert parser.feed('}]}') == [{"file_path": "b.py"}]
+
+
+def test_any_chunking_gives_the_same_items():
+    response = {
+        "summary": "braces } and [ brackets ] in strings",
+        "changes": [
+            {"file_path": "a.py", "new_content": "def f():\n    return {\"x\": [1, 2]}\n"},
+            {"file_path": "b.py", "edits": [{"search": "\"}", "replace": "\\\\"}]},
+        ],
+    }
+    text = json.dumps(response)
+    for size in (1, 3, 7, len(text)):
+        assert feed_in_chunks(text, size) == response["changes"]
+
+
+def test_other_arrays_and_nested_keys_are_ignored():
+    text = json.dumps({"steps": [{"file_path": "x"}], "meta": {"changes": [{"a": 1}]}, "changes": [{"b": 2}]})
+    assert feed_in_chunks(text, 5) == [{"b": 2}]
@@ -0,0 +1,91 @@
+import pytest
+
+import core.llm_cache as llm_cache
+from core.llm_cache import LLMCache, cached_completion
+from core.llm_client import LLMClient
+
+REQUEST = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "привет"}], "temperature": 0.1}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), ttl=3600, max_entries=2, bypass=False)
+    monkeypatch.setattr(llm_cache, "get_llm_cache", lambda: cache)
+    return cache
+
+
+def test_key_ignores_transport_params():
+    key = LLMCache.make_key("deepseek", REQUEST)
+    assert key == LLMCache.make_key("deepseek", dict(REQUEST, stream=True, timeout=30))
+    assert key != LLMCache.make_key("deepseek", dict(REQUEST, temperature=0.7))
+    assert key != LLMCache.make_key("gemini", REQUEST)
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put("k", "deepseek", "ответ")
+    clock.now += 3599
+    assert cache.get("k") == "ответ"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_least_recently_used_entry_is_evicted(cache, clock):
+    cache.put("a", "deepseek", "A")
+    clock.now += 1
+    cache.put("b", "deepseek", "B")
+    clock.now += 1
+    assert cache.get("a") == "A"  # a использован позже b
+    clock.now += 1
+    cache.put("c", "deepseek", "C")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+
+
+def test_cached_completion_computes_once(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "ответ"
+
+    assert cached_completion("deepseek", REQUEST, compute) == "ответ"
+    assert cached_completion("deepseek", REQUEST, compute) == "ответ"
+    assert len(calls) == 1
+
+
+def test_failed_compute_is_not_cached(cache):
+    def broken():
+        raise TimeoutError("timeout")
+
+    with pytest.raises(TimeoutError):
+        cached_completion("deepseek", REQUEST, broken)
+    assert cached_completion("deepseek", REQUEST, lambda: "ответ") == "ответ"
+
+
+def test_use_cache_false_bypasses_the_cache(cache, monkeypatch):
+    answers = iter(["первый", "второй", "третий"])
+    monkeypatch.setattr(LLMClient, "_call_with_retries", lambda self, *args: next(answers))
+    client = LLMClient()
+
+    assert client.chat("deepseek", REQUEST) == "первый"
+    assert client.chat("deepseek", REQUEST, use_cache=False) == "второй"
+    # Ответ, полученный в обход кэша, не подменяет закэшированный
+    assert client.chat("deepseek", REQUEST) == "первый"
+    assert cached_completion("deepseek", REQUEST, lambda: "x", bypass=True) == "x"
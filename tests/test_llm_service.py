@@ -0,0 +1,18 @@
+import core.llm_service as llm_service
+
+
+class BrokenJsonClient:
+    def chat(self, *args, **kwargs):
+        return '{"summary": "обрезанный ответ", "changes": [{"file_path": "a.py", "new_content": "x'
+
+
+def test_invalid_json_falls_back_to_a_compilable_solution(monkeypatch):
+    monkeypatch.setattr(llm_service, "get_llm_client", lambda: BrokenJsonClient())
+
+    response = llm_service.generate_code_changes("Сложить два числа", {"summary": "сумма"}, stream=False)
+
+    assert "error" not in response
+    change, = response["changes"]
+    assert change["file_path"] == "solution.py"
+    compile(change["new_content"], change["file_path"], "exec")
+    assert "{result}" in change["new_content"]
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import git
+import pytest
+
+from core.local_repo import LocalRepo, _matches_remote
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    repo = git.Repo.init(tmp_path)
+    shas = {}
+    for i in range(6):
+        path = tmp_path / f"file{i}.txt"
+        data = str(i).encode() * (200_000 + i)
+        path.write_bytes(data)
+        shas[repo.git.hash_object("-w", str(path))] = data
+    return LocalRepo(repo), shas
+
+
+def test_truncated_reads_do_not_corrupt_concurrent_reads(blobs):
+    local, shas = blobs
+    requests = [(sha, max_bytes) for sha in shas for max_bytes in (10, 100_000, 10 ** 6)] * 5
+
+    def read(request):
+        sha, max_bytes = request
+        return local.read_blob(sha, max_bytes) == shas[sha][:max_bytes + 1]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(read, requests))
+
+
+def test_missing_blob_raises_lookup_error(blobs):
+    local, _ = blobs
+    with pytest.raises(LookupError):
+        local.read_blob("0" * 40, 10)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://github.com/foo/bar.git", True),
+    ("https://github.com/Foo/Bar/", True),
+    ("git@github.com:foo/bar.git", True),
+    ("https://x-access-token:t@github.com/foo/bar", True),
+    ("https://github.com/xfoo/bar", False),
+    ("git@github.com:xfoo/bar.git", False),
+    ("https://github.com/foo/foobar", False),
+])
+def test_only_the_exact_repository_matches(tmp_path, url, expected):
+    repo = git.Repo.init(tmp_path)
+    repo.create_remote("origin", url)
+    assert _matches_remote(repo, "foo/bar") is expected
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+import core.rate_limiter as rate_limiter
+from core.rate_limiter import PRIORITY_READ, PRIORITY_WRITE, RateLimitError, RateLimitScheduler
+
+
+def test_non_limit_responses_only_update_the_budget():
+    scheduler = RateLimitScheduler()
+    headers = {"X-RateLimit-Remaining": "4999", "X-RateLimit-Limit": "5000", "X-RateLimit-Reset": "1700000000"}
+    assert scheduler.observe(200, headers) is None
+    assert scheduler.observe(403, {}, "Resource not accessible by integration") is None
+    assert (scheduler._remaining, scheduler._limit) == (4999, 5000)
+    assert scheduler.stats["throttled"] == 0
+
+
+def test_retry_after_and_secondary_limits_return_a_delay():
+    scheduler = RateLimitScheduler()
+    assert scheduler.observe(403, {"retry-after": "7"}) == 7.0
+    assert scheduler.observe(403, {}, "You have exceeded a secondary rate limit") == 60.0
+    assert scheduler.stats["throttled"] == 2
+
+
+def test_wait_longer_than_the_maximum_raises(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "MAX_WAIT_SECONDS", 5.0)
+    scheduler = RateLimitScheduler()
+    scheduler.observe(429, {"Retry-After": "60"})
+    with pytest.raises(RateLimitError):
+        scheduler.acquire(PRIORITY_READ)
+    assert scheduler._queue == []
+
+
+def test_writes_are_paced_by_the_token_bucket():
+    scheduler = RateLimitScheduler(writes_per_minute=60 * 20, write_burst=2)
+    started = time.monotonic()
+    for _ in range(4):
+        scheduler.acquire(PRIORITY_WRITE)
+    # Две записи из запаса, еще две — по 1/20 секунды
+    assert time.monotonic() - started >= 0.08
+    assert scheduler.stats["acquired"] == 4
+
+
+def test_reads_are_not_blocked_by_a_write_waiting_for_tokens():
+    scheduler = RateLimitScheduler(writes_per_minute=6, write_burst=1)
+    scheduler.acquire(PRIORITY_WRITE)
+
+    writer = threading.Thread(target=scheduler.acquire, args=(PRIORITY_WRITE,), daemon=True)
+    writer.start()
+    deadline = time.monotonic() + 2
+    while not scheduler._queue and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scheduler._queue, "запись должна стоять в очереди"
+
+    started = time.monotonic()
+    scheduler.acquire(PRIORITY_READ)
+    assert time.monotonic() - started < 1.0
+    assert writer.is_alive()
@@ -0,0 +1,60 @@
+from core.github_client import ReviewVerdictCursor, head_from_comment, review_marker, verdict_from_comment
+
+
+class FakeSession:
+    """Отдает комментарии, обновленные не раньше since, как GitHub API"""
+
+    def __init__(self):
+        self.comments = []
+        self.requests = []
+
+    def comment(self, body, at):
+        self.comments.append({"id": len(self.comments) + 1, "body": body, "created_at": at, "updated_at": at})
+
+    def get_paginated_json(self, path, params=None, priority=None):
+        self.requests.append(params)
+        since = (params or {}).get("since", "")
+        return [c for c in self.comments if c["updated_at"] >= since]
+
+
+def test_marker_round_trip():
+    body = f"отчет\n{review_marker('REQUEST_CHANGES', 'abc123')}"
+    assert verdict_from_comment(body) == "REQUEST_CHANGES"
+    assert head_from_comment(body) == "abc123"
+    assert head_from_comment("**Вердикт:** APPROVE") is None
+    assert verdict_from_comment("🤖 AI Code Review Report\n**Вердикт:** APPROVE") == "APPROVE"
+
+
+def test_cursor_returns_the_latest_verdict_and_advances_since():
+    session = FakeSession()
+    cursor = ReviewVerdictCursor("o/r", 1, since="2024-01-01T00:00:00Z", session=session)
+    session.comment(review_marker("APPROVE"), "2023-12-31T00:00:00Z")
+    session.comment("обычный комментарий", "2024-01-01T00:01:00Z")
+    assert cursor.poll() == "PENDING"
+
+    session.comment(review_marker("REQUEST_CHANGES"), "2024-01-01T00:02:00Z")
+    session.comment(review_marker("APPROVE"), "2024-01-01T00:03:00Z")
+    assert cursor.poll() == "APPROVE"
+    assert session.requests[-1] == {"since": "2024-01-01T00:01:00Z"}
+
+    # Новых комментариев нет: запрос тот же, вердикт сохраняется
+    assert cursor.poll() == "APPROVE"
+    assert session.requests[-1] == {"since": "2024-01-01T00:03:00Z"}
+
+
+def test_cursor_ignores_verdicts_for_other_commits():
+    session = FakeSession()
+    cursor = ReviewVerdictCursor("o/r", 1, session=session, head_sha="bbbbbbbbbbbb2222")
+    session.comment(review_marker("APPROVE", "aaaaaaaaaaaa"), "2024-01-01T00:00:00Z")
+    assert cursor.poll() == "PENDING"
+
+    session.comment(review_marker("REQUEST_CHANGES", "bbbbbbbbbbbb"), "2024-01-01T00:01:00Z")
+    assert cursor.poll() == "REQUEST_CHANGES"
+
+
+def test_cursor_survives_api_errors():
+    class BrokenSession:
+        def get_paginated_json(self, *args, **kwargs):
+            raise ConnectionError("сеть недоступна")
+
+    assert ReviewVerdictCursor("o/r", 1, session=BrokenSession()).poll() == "PENDING"
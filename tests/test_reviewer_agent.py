@@ -0,0 +1,97 @@
+import pytest
+
+import core.reviewer_agent as reviewer_agent
+from core.context_packer import count_tokens
+from core.review_cache import ReviewCache
+from core.reviewer_agent import (
+    REVIEW_SHARD_TOKENS,
+    change_tokens,
+    combine_file_reviews,
+    review_pull_request,
+    split_into_shards,
+)
+
+
+def make_change(name, chars):
+    return {"filename": name, "patch": "+" + "x" * chars, "new_content": "", "old_content": ""}
+
+
+def test_shards_fit_the_budget_and_keep_file_order():
+    changes = [make_change(f"f{i}.py", 600) for i in range(10)]
+    budget = change_tokens(changes[0]) * 3
+    shards = split_into_shards(changes, budget)
+
+    assert [len(shard) for shard in shards] == [3, 3, 3, 1]
+    assert [c["filename"] for shard in shards for c in shard] == [c["filename"] for c in changes]
+    assert all(sum(change_tokens(c) for c in shard) <= budget for shard in shards)
+
+
+def test_huge_file_gets_its_own_shard():
+    changes = [make_change("small.py", 100), make_change("huge.py", REVIEW_SHARD_TOKENS * 10), make_change("tail.py", 100)]
+    shards = split_into_shards(changes)
+
+    assert [[c["filename"] for c in shard] for shard in shards] == [["small.py"], ["huge.py"], ["tail.py"]]
+    assert change_tokens(changes[1]) == REVIEW_SHARD_TOKENS < count_tokens(changes[1]["patch"])
+
+
+def test_no_changes_no_shards():
+    assert split_into_shards([]) == []
+
+
+def pr_context(**blobs):
+    return {
+        "pr_title": "Fix", "pr_body": "", "pr_author": "bot", "head_sha": "h" * 40,
+        "issue_content": "Issue", "diff_summary": "",
+        "file_changes": [dict(make_change(name, 50), sha=sha, status="modified", additions=1, deletions=0)
+                         for name, sha in blobs.items()],
+    }
+
+
+@pytest.fixture
+def reviewed(monkeypatch, tmp_path):
+    """Кэш ревью во временном файле и AI, одобряющий каждый присланный файл"""
+    cache = ReviewCache(str(tmp_path / "review.sqlite3"))
+    monkeypatch.setattr(reviewer_agent, "get_review_cache", lambda: cache)
+    seen = []
+
+    def fake_ai(context, unchanged_files=None, other_files=None, stats=None):
+        names = [change["filename"] for change in context["file_changes"]]
+        seen.extend(names)
+        return {"summary": "ok", "files": [{"filename": name, "verdict": "APPROVE", "score": 9} for name in names]}
+
+    monkeypatch.setattr(reviewer_agent, "analyze_pr_with_ai", fake_ai)
+    return seen
+
+
+def test_unchanged_blobs_are_served_from_the_cache(reviewed):
+    assert review_pull_request("o/r", 1, pr_context(a="1", b="2"))["verdict"] == "APPROVE"
+    assert sorted(reviewed) == ["a", "b"]
+
+    reviewed.clear()
+    result = review_pull_request("o/r", 1, pr_context(a="1", b="3"))
+    assert reviewed == ["b"]
+    assert result["verdict"] == "APPROVE"
+
+
+def test_cache_key_includes_the_repository(reviewed):
+    review_pull_request("o/r", 1, pr_context(a="1"))
+    reviewed.clear()
+    review_pull_request("o/other", 1, pr_context(a="1"))
+    assert reviewed == ["a"]
+
+
+def test_strictest_verdict_wins():
+    reviews = {
+        "a.py": {"verdict": "APPROVE", "score": 9},
+        "b.py": {"verdict": "COMMENT", "score": 7, "suggestions": ["rename"]},
+        "c.py": {"verdict": "REQUEST_CHANGES", "score": 3, "issues_found": ["bug"]},
+    }
+    result = combine_file_reviews(reviews, "summary")
+    assert (result["verdict"], result["score"]) == ("REQUEST_CHANGES", 3)
+    assert result["issues_found"] == ["c.py: bug"]
+    assert result["suggestions"] == ["b.py: rename"]
+
+    del reviews["c.py"]
+    assert combine_file_reviews(reviews, "")["verdict"] == "COMMENT"
+    assert combine_file_reviews({"a.py": {"verdict": "bogus"}}, "")["verdict"] == "COMMENT"
+    assert combine_file_reviews({}, "")["verdict"] == "COMMENT"
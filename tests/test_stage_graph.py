@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import core.stage_graph as stage_graph
+from core.stage_graph import StageFailed, StageGraph
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(stage_graph, "STAGE_RETRY_BACKOFF", 0.0)
+
+
+def test_stages_receive_their_dependencies_results():
+    graph = StageGraph()
+    graph.add("repo", lambda _: "repo")
+    graph.add("code", lambda _: "code")
+    graph.add("push", lambda deps: f"{deps['repo']}+{deps['code']}", deps=["repo", "code"])
+    graph.add("notify", lambda deps: deps, deps=["push"])
+
+    completed = []
+    results = graph.run(on_complete=lambda name, _: completed.append(name))
+
+    assert results["notify"] == {"push": "repo+code"}
+    assert completed.index("push") > max(completed.index("repo"), completed.index("code"))
+    assert completed[-1] == "notify"
+
+
+def test_independent_stages_run_in_parallel():
+    both_started = threading.Barrier(2, timeout=2)
+    graph = StageGraph()
+    graph.add("a", lambda _: both_started.wait())
+    graph.add("b", lambda _: both_started.wait())
+    graph.run()  # последовательный запуск упал бы на таймауте барьера
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        StageGraph().add("push", lambda _: None, deps=["missing"])
+
+
+def test_done_stages_and_unneeded_non_checkpoint_stages_are_skipped():
+    calls = []
+
+    def stage(name):
+        return lambda deps: calls.append(name) or name
+
+    graph = StageGraph()
+    graph.add("clone", stage("clone"), checkpoint=False)
+    graph.add("push", stage("push"), deps=["clone"])
+    graph.add("pages", stage("pages"), deps=["push"])
+
+    results = graph.run(done={"push": "restored"})
+    assert calls == ["pages"]
+    assert results["pages"] == "pages"
+
+    calls.clear()
+    graph.run(done={})
+    assert calls == ["clone", "push", "pages"]
+
+
+def test_failed_stage_is_retried_on_its_own():
+    attempts = {"flaky": 0, "stable": 0}
+
+    def flaky(_):
+        attempts["flaky"] += 1
+        if attempts["flaky"] < 3:
+            raise ConnectionError("502")
+        return "ok"
+
+    def stable(_):
+        attempts["stable"] += 1
+
+    graph = StageGraph()
+    graph.add("stable", stable)
+    graph.add("flaky", flaky, deps=["stable"], retries=2)
+    assert graph.run()["flaky"] == "ok"
+    assert attempts == {"flaky": 3, "stable": 1}
+    assert graph.timings["flaky"]["attempts"] == 3
+
+
+def test_exhausted_retries_stop_dependents():
+    ran = []
+    graph = StageGraph()
+    graph.add("broken", lambda _: 1 / 0, retries=1)
+    graph.add("slow", lambda _: time.sleep(0.05) or ran.append("slow"))
+    graph.add("after", lambda _: ran.append("after"), deps=["broken"])
+
+    with pytest.raises(StageFailed) as error:
+        graph.run()
+    assert error.value.stage == "broken"
+    assert isinstance(error.value.error, ZeroDivisionError)
+    # Уже запущенная независимая стадия доработала, зависимая не запускалась
+    assert ran == ["slow"]
+    assert graph.timings["broken"]["attempts"] == 2
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from core.worker_pool import PoolClosed, PoolSaturated, WorkerPool
+
+
+def test_at_most_workers_tasks_run_at_once():
+    pool = WorkerPool(workers=2, queue_size=10)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def task():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    for _ in range(6):
+        pool.submit(task)
+    assert pool.shutdown(timeout=5)
+    assert peak[0] == 2
+    assert pool.stats()["completed"] == 6
+
+
+def test_full_queue_rejects_with_retry_after():
+    pool = WorkerPool(workers=1, queue_size=1)
+    release = threading.Event()
+    pool.submit(release.wait)
+    deadline = time.monotonic() + 2
+    while pool.stats()["in_flight"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.submit(release.wait)  # ждет в очереди
+
+    with pytest.raises(PoolSaturated) as error:
+        pool.submit(release.wait)
+    assert error.value.retry_after >= 1
+    assert pool.stats()["rejected"] == 1
+
+    release.set()
+    assert pool.shutdown(timeout=5)
+
+
+def test_failing_task_is_counted_and_does_not_stop_the_worker(capsys):
+    pool = WorkerPool(workers=1, queue_size=5)
+    done = []
+    pool.submit(lambda: 1 / 0)
+    pool.submit(done.append, "after")
+    assert pool.shutdown(timeout=5)
+
+    stats = pool.stats()
+    assert (stats["completed"], stats["failed"]) == (2, 1)
+    assert done == ["after"]
+    assert "ZeroDivisionError" in capsys.readouterr().err
+
+
+def test_closed_pool_rejects_new_tasks():
+    pool = WorkerPool(workers=1, queue_size=1)
+    assert pool.shutdown(timeout=5)
+    with pytest.raises(PoolClosed):
+        pool.submit(print)